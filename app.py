@@ -3,59 +3,135 @@
 import streamlit as st
 import pandas as pd
 import os
-from src.core_logic import run_analysis, run_update, run_backtest_logic, run_review_predictions, run_financial_backtest_logic, run_flat_backtest_logic
+from src.core_logic import run_analysis, run_update, run_backtest_logic, run_review_predictions, run_financial_backtest_logic, run_flat_backtest_logic, run_strategy_sweep_logic, run_season_simulation_logic
+from src.data_fetcher import get_api_metrics
+from src.task_runner import submit_task, get_task, pop_task
+from src.prediction_journal import load_predictions
+from src.instrumentation import get_last_trace, timing_rows, profiling
+from src.league_models import model_label, LEGACY_MODEL_LABEL
+from config import settings
     
 # --- Configuración de la Página ---
 st.set_page_config(page_title="IA de Apuestas de Fútbol", layout="wide")
 st.title("🤖 Asistente de IA para Apuestas de Fútbol")
 st.write("Esta aplicación utiliza un modelo estadístico entrenado con datos históricos para encontrar oportunidades de valor en los próximos partidos.")
+
+@st.cache_data
+def load_log(path: str, mtime_ns: int) -> pd.DataFrame:
+    """Lee un CSV de log; el mtime forma parte de la clave, así que se vuelve a leer solo cuando cambia el archivo."""
+    return pd.read_csv(path)
+
+def read_log(path: str) -> pd.DataFrame:
+    return load_log(path, os.stat(path).st_mtime_ns).copy()
+
+def read_model_log(path: str) -> pd.DataFrame:
+    """Filas de un log de backtest del modelo que alimenta las gráficas (el de medias, con la partición por liga actual)."""
+    log_df = read_log(path)
+    if 'model' not in log_df:
+        log_df['model'] = LEGACY_MODEL_LABEL
+    return log_df[log_df['model'] == model_label('ratios')]
+
+def run_with_timings(func):
+    """Ejecuta un análisis en el propio script y guarda sus tiempos por etapa para la tabla de tiempos."""
+    previous_trace = get_last_trace()
+    with profiling(st.session_state.get('profile_mode', settings.PROFILE_MODE)):
+        report = func()
+    trace = get_last_trace()
+    st.session_state.last_trace = trace if trace is not previous_trace else None
+    return report
+
+def start_background_task(title: str, func, **kwargs):
+    """Lanza un backtest en segundo plano; su informe aparece al terminar con el título `title`."""
+    with profiling(st.session_state.get('profile_mode', settings.PROFILE_MODE)):
+        submit_task(title, func, **kwargs)
+    st.session_state.pending_task = title
     
 # --- Barra Lateral con Acciones ---
 st.sidebar.header("Acciones Principales")
     
 if st.sidebar.button("💎 Buscar Apuestas de Valor"):
     with st.spinner('Entrenando modelo y buscando oportunidades...'):
-        st.session_state.last_report = run_analysis()
+        st.session_state.last_report = run_with_timings(run_analysis)
         st.session_state.report_title = "Análisis de Próximos Partidos:"
         
 st.sidebar.header("Mantenimiento y Aprendizaje")
 
 if st.sidebar.button("📖 Revisar y Aprender de Predicciones"):
     with st.spinner('Consultando resultados y actualizando diario...'):
-        st.session_state.last_report = run_review_predictions()
+        st.session_state.last_report = run_with_timings(run_review_predictions)
         st.session_state.report_title = "Informe de Revisión de Predicciones:"
     
 if st.sidebar.button("🧠 Actualizar Base de Conocimiento"):
     with st.spinner('Añadiendo últimos resultados a la memoria a largo plazo...'):
-        st.session_state.last_report = run_update()
+        st.session_state.last_report = run_with_timings(run_update)
         st.session_state.report_title = "Resultado de la Actualización:"
             
 st.sidebar.header("Evaluación del Modelo")
+walk_forward = st.sidebar.checkbox("Modo walk-forward (actualizar tras cada jornada)", value=False)
+model = st.sidebar.selectbox("Modelo de fuerzas", ['ratios', 'dixon_coles'], format_func={'ratios': 'Medias de goles', 'dixon_coles': 'Dixon-Coles (máxima verosimilitud)'}.get)
 
 if st.sidebar.button("📊 Evaluar Precisión Histórica"):
-    with st.spinner('Ejecutando backtest de precisión...'):
-        st.session_state.last_report = run_backtest_logic()
-        st.session_state.report_title = "Resultado del Backtest de Precisión:"
-        st.rerun()
+    start_background_task("Resultado del Backtest de Precisión:", run_backtest_logic, walk_forward=walk_forward, model=model)
 
 if st.sidebar.button("📈 Simular Rentabilidad (Kelly)"):
-    with st.spinner('Simulando temporada (Kelly)... Esto puede tardar un poco.'):
-        st.session_state.last_report = run_financial_backtest_logic()
-        st.session_state.report_title = "Resultado del Backtest Financiero (Kelly):"
-        st.rerun()
+    start_background_task("Resultado del Backtest Financiero (Kelly):", run_financial_backtest_logic, walk_forward=walk_forward, model=model)
         
 if st.sidebar.button("⚖️ Comparar con Apuesta Fija (Flat)"):
-    with st.spinner('Simulando temporada (Apuesta Fija)...'):
-        st.session_state.last_report = run_flat_backtest_logic()
-        st.session_state.report_title = "Resultado del Backtest (Apuesta Fija):"
-        st.rerun()
+    start_background_task("Resultado del Backtest (Apuesta Fija):", run_flat_backtest_logic, walk_forward=walk_forward, model=model)
+
+if st.sidebar.button("🧪 Barrido de Estrategias (Kelly / Edge / Stake)"):
+    start_background_task("Resultado del Barrido de Estrategias:", run_strategy_sweep_logic, walk_forward=walk_forward, model=model)
+
+st.sidebar.header("Temporada en Curso")
+
+if st.sidebar.button("🏆 Simular Temporada (Monte Carlo)"):
+    start_background_task("Simulación de la Temporada:", run_season_simulation_logic)
+
+# --- Estado de The Odds API ---
+st.sidebar.header("The Odds API")
+api_metrics = get_api_metrics()
+remaining = api_metrics['requests_remaining']
+st.sidebar.caption(f"Peticiones restantes: {remaining if remaining is not None else 'desconocido'} | "
+                   f"Caché: {api_metrics['cache_hits']} aciertos, {api_metrics['stale_hits']} revalidadas, {api_metrics['cache_misses']} fallos")
+
+# --- Diagnóstico de rendimiento ---
+st.sidebar.header("Diagnóstico")
+# Perfilado opcional de las próximas ejecuciones de esta sesión (el perfil se guarda en settings.PROFILE_DIR)
+st.sidebar.selectbox("Perfilar ejecuciones", [None, 'cprofile', 'sampling'], key='profile_mode',
+                     index=[None, 'cprofile', 'sampling'].index(settings.PROFILE_MODE),
+                     format_func={None: 'Desactivado', 'cprofile': 'cProfile (completo)', 'sampling': 'Muestreo (ligero)'}.get)
 
 # --- ÁREA PRINCIPAL DE RESULTADOS ---
 st.header("📋 Informes de la IA")
 
+@st.fragment(run_every=1)
+def show_task_progress():
+    """Muestra el progreso de la tarea en segundo plano y, al terminar, su informe."""
+    title = st.session_state.get('pending_task')
+    task = get_task(title) if title else None
+    if task is None:
+        return
+    if task['status'] == 'running':
+        st.progress(task["progress"], text=f"⏳ {task['message']}")
+        return
+    pop_task(title)
+    del st.session_state['pending_task']
+    st.session_state.last_report = task['result'] if task['status'] == 'done' else f"❌ Error en la tarea: {task['error']}"
+    st.session_state.last_trace = task.get('trace')
+    st.session_state.report_title = title
+    st.rerun()
+
+show_task_progress()
+
 if 'last_report' in st.session_state:
     st.subheader(st.session_state.get('report_title', 'Resultados:'))
     st.text(st.session_state.last_report)
+    trace = st.session_state.get('last_trace')
+    if trace:
+        with st.expander(f"⏱️ Tiempos por etapa ({trace['seconds']:.2f} s)"):
+            st.dataframe(pd.DataFrame(timing_rows(trace)), hide_index=True, use_container_width=True)
+            if trace['profile_file']:
+                st.caption(f"Perfil guardado en {trace['profile_file']}")
 
 # --- Visualización del Aprendizaje ---
 st.header("🧠 Curva de Aprendizaje del Modelo (Precisión)")
@@ -63,14 +139,15 @@ st.header("🧠 Curva de Aprendizaje del Modelo (Precisión)")
 performance_log_path = 'performance_log.csv'
 if os.path.exists(performance_log_path):
     try:
-        log_df = pd.read_csv(performance_log_path)
+        log_df = read_model_log(performance_log_path)
+        st.caption(f"Modelo: {model_label('ratios')}")
         if not log_df.empty:
             log_df.set_index('season_tested', inplace=True)
             chart_data = log_df[['accuracy', 'hc_accuracy']]
             chart_data.rename(columns={'accuracy': 'Precisión General', 'hc_accuracy': 'Precisión en Alta Confianza'}, inplace=True)
             st.line_chart(chart_data)
         else:
-            st.info("El registro de rendimiento está vacío.")
+            st.info("El registro de rendimiento no tiene resultados de este modelo. Presiona 'Evaluar Precisión Histórica'.")
     except Exception as e:
         st.error(f"No se pudo cargar la gráfica: {e}")
 else:
@@ -82,13 +159,14 @@ st.header("📈 Evolución de la Rentabilidad (Simulación)")
 financial_log_path = 'financial_log.csv'
 if os.path.exists(financial_log_path):
     try:
-        log_df = pd.read_csv(financial_log_path)
+        log_df = read_model_log(financial_log_path)
+        st.caption(f"Modelo: {model_label('ratios')}")
         if not log_df.empty:
             log_df.set_index('season_simulated', inplace=True)
             st.subheader("Beneficio / Pérdida por Temporada (en Unidades)")
             st.bar_chart(log_df['profit_loss'])
         else:
-            st.info("El registro de rentabilidad está vacío.")
+            st.info("El registro de rentabilidad no tiene resultados de este modelo. Presiona 'Simular Rentabilidad'.")
     except Exception as e:
         st.error(f"No se pudo cargar la gráfica de rentabilidad: {e}")
 else:
@@ -97,14 +175,10 @@ else:
 
 # --- Diario de Predicciones ---
 st.header("📖 Diario de Predicciones de la IA")
-# ... (código del diario sin cambios)
-log_file = 'predictions_log.csv'
-if os.path.exists(log_file):
-    try:
-        log_df = pd.read_csv(log_file)
-        st.dataframe(log_df.tail(30))
-    except Exception as e:
-        st.error(f"No se pudo cargar el diario de predicciones: {e}")
+# Solo las últimas 30 predicciones: no hace falta leer el diario entero
+log_df = load_predictions(limit=30)
+if not log_df.empty:
+    st.dataframe(log_df)
 else:
     st.info("Aún no se ha generado un diario. Presiona 'Buscar Apuestas de Valor'.")
 
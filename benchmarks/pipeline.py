@@ -0,0 +1,377 @@
+# benchmarks/pipeline.py
+
+"""
+Benchmark de las etapas del pipeline con datos sintéticos.
+
+Para cada escala de `settings.BENCHMARK_SCALES` (ligas x temporadas) se genera un conjunto de datos
+con `benchmarks.synthetic_data` y se mide cada etapa: la carga de los CSV (sin caché, desde la caché
+Feather y desde memoria), `calculate_team_strengths`, `predict_outcome` partido a partido y
+`predict_fixtures` por lotes, los tres backtests, la carga del modelo del análisis, `run_analysis` y
+`run_review_predictions`.
+
+Todo funciona sin red: `settings` apunta a una carpeta temporal (base de datos, diario, cachés y los
+logs que escriben los backtests) y las respuestas grabadas de The Odds API se instalan en su caché;
+cualquier petición que no esté grabada falla en lugar de salir a internet.
+
+El resultado se puede guardar en JSON y comparar con el de otro commit: con `--compare` el proceso
+termina con código 1 si alguna etapa es más lenta que la referencia más allá de
+`settings.BENCHMARK_REGRESSION_THRESHOLD`.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.pipeline [--scales small,medium] [--repeat 3] [--json bench.json] [--compare base.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from config import settings
+from benchmarks.synthetic_data import write_synthetic_dataset
+from src import core_logic, data_fetcher, utils
+from src.backtester import run_backtest_sequential, run_financial_backtest_by_league, run_flat_betting_backtest
+from src.data_analyzer import calculate_team_strengths, calculate_expected_goals
+from src.prediction_journal import prediction_entry, save_predictions
+from src.prediction_model import predict_outcome, predict_fixtures
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Por debajo de esta diferencia (segundos) no se considera regresión: es ruido de medida
+MIN_REGRESSION_SECONDS = 0.005
+# Probabilidades de las predicciones del diario que se revisan (solo importa el favorito)
+REVIEW_PREDICTION = {'home_win': 0.45, 'draw': 0.27, 'away_win': 0.28}
+
+def _offline_get_json(uri: str, params: dict, error_label: str):
+    """Sustituye a las peticiones reales: en el benchmark solo valen las respuestas grabadas."""
+    print(f"Benchmark sin red: no hay respuesta grabada para {uri} ({error_label}).")
+    return None
+
+def _shift_times(payload: list, delta: timedelta) -> list:
+    """Copia de una respuesta de cuotas con las horas de inicio y de actualización movidas `delta`."""
+    def shift(value):
+        if not value:
+            return value
+        return (datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ') + delta).strftime('%Y-%m-%dT%H:%M:%SZ')
+    shifted = []
+    for match in payload:
+        bookmakers = [{**bookmaker, 'last_update': shift(bookmaker.get('last_update')),
+                       'markets': [{**market, 'last_update': shift(market.get('last_update'))} for market in bookmaker.get('markets', [])]}
+                      for bookmaker in match.get('bookmakers', [])]
+        shifted.append({**match, 'commence_time': shift(match['commence_time']), 'bookmakers': bookmakers})
+    return shifted
+
+def _read_payload(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def install_api_fixtures(dataset: dict):
+    """
+    Copia las respuestas grabadas de The Odds API a su caché, con las claves que usará `data_fetcher`.
+    Las cuotas se mueven en el tiempo para que la jornada empiece dentro de una hora (las que ya han
+    empezado se descartan al leerlas); los resultados se dejan como están.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    for league_key, odds_file, scores_file in zip(dataset['sport_keys'], dataset['odds_files'], dataset['scores_files']):
+        odds = _read_payload(odds_file)
+        if odds:
+            first_start = min(datetime.strptime(match['commence_time'], '%Y-%m-%dT%H:%M:%SZ') for match in odds)
+            odds = _shift_times(odds, now + timedelta(hours=1) - first_start)
+        scores = _read_payload(scores_file)
+        # Las claves llevan el tramo horario y el día: se graban también las del tramo siguiente por si el benchmark lo cruza
+        for moment in [now, now + timedelta(seconds=settings.API_CACHE_WINDOW_SECONDS)]:
+            moment = moment.replace(tzinfo=timezone.utc)
+            odds_key = data_fetcher.odds_cache_key(league_key, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD, moment)
+            data_fetcher._write_json_atomic(data_fetcher._cache_path('odds', odds_key), {'fetched_at': time.time(), 'data': odds})
+            scores_key = data_fetcher.scores_cache_key(league_key, 3, moment)
+            data_fetcher._write_json_atomic(data_fetcher._cache_path('scores', scores_key), {'fetched_at': time.time(), 'data': scores})
+
+def review_entries(dataset: dict) -> list:
+    """Predicciones pendientes de los partidos de las respuestas de resultados (terminados y por jugar)."""
+    return [prediction_entry(match, REVIEW_PREDICTION) for scores_file in dataset['scores_files'] for match in _read_payload(scores_file)]
+
+def reset_caches():
+    """Vacía las cachés en memoria de los datos preparados y del modelo del análisis."""
+    utils._prepared_data_cache.clear()
+    core_logic._analysis_model.update(signature=None, model=None)
+
+@contextlib.contextmanager
+def benchmark_environment(work_dir: str, dataset: dict, model: str = None):
+    """
+    Apunta `settings` a los datos sintéticos y a `work_dir`, sin red, y lo deja todo como estaba al salir.
+    El directorio de trabajo también pasa a ser `work_dir`, porque los backtests escriben performance_log.csv
+    y financial_log.csv en el directorio actual.
+    """
+    cache_dir = os.path.join(work_dir, 'cache')
+    overrides = {
+        'HISTORICAL_DATA_FILES': dataset['historical_files'],
+        'CURRENT_SEASON_FILES': dataset['current_season_files'],
+        'MATCH_DB_FILE': os.path.join(work_dir, 'matches.db'),
+        'TEAM_REGISTRY_FILE': os.path.join(PROJECT_DIR, settings.TEAM_REGISTRY_FILE),
+        'PREDICTION_JOURNAL_FILE': os.path.join(work_dir, 'predictions.db'),
+        'LEGACY_PREDICTIONS_LOG': os.path.join(work_dir, 'predictions_log.csv'),
+        'DATA_CACHE_DIR': cache_dir,
+        'STRENGTH_STORE_FILE': os.path.join(cache_dir, 'team_strengths.pkl'),
+        'DC_FIT_FILE': os.path.join(cache_dir, 'dixon_coles_fit.pkl'),
+        'API_CACHE_DIR': os.path.join(cache_dir, 'api'),
+        # Las respuestas grabadas no caducan durante el benchmark
+        'API_CACHE_TTL': {'odds': 10**9, 'scores': 10**9},
+        'ODDS_API_LEAGUES': list(dataset['sport_keys']),
+        'ODDS_API_LEAGUE_CODES': dict(dataset['sport_keys']),
+        'SWEEP_LOG_FILE': os.path.join(work_dir, 'strategy_sweep_log.csv'),
+        'SEASON_FIXTURE_FILES': {},
+        'STRENGTH_MODEL': model or settings.STRENGTH_MODEL,
+    }
+    saved = {name: getattr(settings, name) for name in overrides}
+    previous_dir, real_get_json = os.getcwd(), data_fetcher._get_json
+    try:
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        data_fetcher._get_json = _offline_get_json
+        os.makedirs(work_dir, exist_ok=True)
+        os.chdir(work_dir)
+        reset_caches()
+        install_api_fixtures(dataset)
+        yield
+    finally:
+        os.chdir(previous_dir)
+        data_fetcher._get_json = real_get_json
+        for name, value in saved.items():
+            setattr(settings, name, value)
+        reset_caches()
+
+def time_stage(run, setup=None, repeat: int = 1) -> dict:
+    """
+    Mide `run(*setup())` `repeat` veces; `setup` (sin medir) deja el estado de partida de cada repetición.
+    La salida por pantalla de la etapa se descarta.
+
+    Returns:
+        dict: {'seconds' (la más rápida), 'runs' (todas)}.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run(*args)
+            timings.append(time.perf_counter() - start)
+    return {'seconds': min(timings), 'runs': timings}
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def pipeline_stages(dataset: dict) -> list:
+    """
+    Etapas del benchmark, en el orden en que se ejecutan (algunas dependen del estado que deja la anterior).
+
+    Returns:
+        list: Tuplas (nombre, setup, run, elementos procesados o None).
+    """
+    files = dataset['historical_files']
+    full_df = utils.load_and_prepare_data(files)
+    season_start_years = sorted(full_df[full_df['utc_date'].dt.month > 7]['utc_date'].dt.year.unique())
+    latest_season = int(season_start_years[-1])
+    # Los partidos de la última temporada se predicen con las fuerzas de las anteriores
+    train_df = full_df[full_df['utc_date'] < f'{latest_season}-08-01']
+    test_df = full_df[full_df['utc_date'] >= f'{latest_season}-08-01']
+    stats = calculate_team_strengths(train_df.copy())
+    expected_home, expected_away, known = calculate_expected_goals(stats, test_df['home_team_name'], test_df['away_team_name'])
+    expected_home, expected_away = expected_home[known], expected_away[known]
+    entries = review_entries(dataset)
+
+    def clear_memory():
+        utils._prepared_data_cache.clear()
+        return (files,)
+    def clear_all_caches():
+        # Las copias Feather de los CSV viven sueltas en DATA_CACHE_DIR, junto al almacén de fuerzas
+        for name in os.listdir(settings.DATA_CACHE_DIR) if os.path.isdir(settings.DATA_CACHE_DIR) else []:
+            if name.endswith('.feather'):
+                os.remove(os.path.join(settings.DATA_CACHE_DIR, name))
+        return clear_memory()
+    def predict_one_by_one():
+        for home_goals, away_goals in zip(expected_home, expected_away):
+            predict_outcome(home_goals, away_goals)
+    def cold_analysis_model():
+        # Con un modelo por liga, el almacén y el ajuste de Dixon-Coles tienen un archivo por liga
+        league_codes = [None] + sorted(full_df['league_code'].unique())
+        for path in [settings.MATCH_DB_FILE] + [utils.league_file_path(file_path, league_code) for file_path in [settings.STRENGTH_STORE_FILE, settings.DC_FIT_FILE]
+                                                 for league_code in league_codes]:
+            _remove(path)
+        reset_caches()
+        return ()
+    def pending_journal():
+        _remove(settings.PREDICTION_JOURNAL_FILE)
+        save_predictions(entries)
+        return ()
+
+    return [
+        ('load_and_prepare_data_csv', clear_all_caches, utils.load_and_prepare_data, len(full_df)),
+        ('load_and_prepare_data_feather', clear_memory, utils.load_and_prepare_data, len(full_df)),
+        ('load_and_prepare_data_memory', lambda: (files,), utils.load_and_prepare_data, len(full_df)),
+        ('calculate_team_strengths', lambda: (full_df.copy(),), calculate_team_strengths, len(full_df)),
+        ('predict_outcome', None, predict_one_by_one, len(expected_home)),
+        ('predict_fixtures', lambda: (test_df, stats), predict_fixtures, len(test_df)),
+        ('backtest_precision', None, lambda: run_backtest_sequential(files, season_start_years[1:]), len(full_df)),
+        ('backtest_financial', None, lambda: run_financial_backtest_by_league(files, latest_season), len(test_df)),
+        ('backtest_flat', None, lambda: run_flat_betting_backtest(files, latest_season), len(test_df)),
+        ('load_analysis_model', cold_analysis_model, core_logic.load_analysis_model, dataset['num_matches']),
+        ('run_analysis', None, core_logic.run_analysis, None),
+        ('run_review_predictions', pending_journal, core_logic.run_review_predictions, len(entries)),
+    ]
+
+def load_or_generate_dataset(data_dir: str, num_leagues: int, num_seasons: int, seed: int) -> tuple:
+    """
+    Datos sintéticos de una escala; si `data_dir` ya tiene unos generados con los mismos parámetros se reutilizan.
+
+    Returns:
+        tuple: (dataset, segundos que ha costado generarlo; 0 si se ha reutilizado).
+    """
+    dataset_file = os.path.join(data_dir, 'dataset.json')
+    if os.path.exists(dataset_file):
+        with open(dataset_file, encoding='utf-8') as f:
+            dataset = json.load(f)
+        params = dataset.get('params', {})
+        if (params.get('num_leagues'), params.get('num_seasons'), params.get('seed')) == (num_leagues, num_seasons, seed):
+            return dataset, 0.0
+    start = time.perf_counter()
+    dataset = write_synthetic_dataset(data_dir, num_leagues, num_seasons, seed=seed)
+    return dataset, time.perf_counter() - start
+
+def benchmark_scale(work_dir: str, num_leagues: int, num_seasons: int, repeat: int = 1, seed: int = None,
+                    model: str = None, stages: list = None) -> dict:
+    """
+    Genera (o reutiliza) los datos de una escala en `work_dir` y mide cada etapa.
+
+    Args:
+        stages (list): Nombres de las etapas a medir. None = todas.
+
+    Returns:
+        dict: {'leagues', 'seasons', 'matches', 'generation_seconds', 'stages': {etapa: {'seconds', 'runs', 'items'}}}.
+    """
+    seed = settings.BENCHMARK_SEED if seed is None else seed
+    dataset, generation_seconds = load_or_generate_dataset(os.path.join(work_dir, 'synthetic'), num_leagues, num_seasons, seed)
+    result = {'leagues': num_leagues, 'seasons': num_seasons, 'matches': dataset['num_matches'],
+              'generation_seconds': generation_seconds, 'stages': {}}
+    with benchmark_environment(os.path.join(work_dir, 'run'), dataset, model):
+        with contextlib.redirect_stdout(io.StringIO()):
+            stage_list = pipeline_stages(dataset)
+        for name, setup, run, items in stage_list:
+            if stages and name not in stages:
+                continue
+            result['stages'][name] = {**time_stage(run, setup, repeat), 'items': items}
+    return result
+
+def _git_commit() -> str:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_pipeline_benchmark(scales: dict = None, repeat: int = 1, seed: int = None, model: str = None,
+                           stages: list = None, work_dir: str = None) -> dict:
+    """
+    Mide todas las escalas de `scales` ({nombre: {'leagues', 'seasons'}}; None = `settings.BENCHMARK_SCALES`).
+    Los datos se generan en `work_dir` (None = una carpeta temporal que se borra al terminar).
+
+    Returns:
+        dict: {'commit', 'created_at', 'python', 'platform', 'cpu_count', 'numpy', 'pandas', 'seed', 'model',
+        'repeat', 'scales': {nombre: salida de `benchmark_scale`}}.
+    """
+    scales = scales or settings.BENCHMARK_SCALES
+    seed = settings.BENCHMARK_SEED if seed is None else seed
+    report = {'commit': _git_commit(), 'created_at': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+              'seed': seed, 'model': model or settings.STRENGTH_MODEL, 'repeat': repeat, 'scales': {}}
+    root_dir = work_dir or tempfile.mkdtemp(prefix='pipeline-benchmark-')
+    try:
+        for name, scale in scales.items():
+            report['scales'][name] = benchmark_scale(os.path.join(root_dir, name), scale['leagues'], scale['seasons'], repeat, seed, model, stages)
+    finally:
+        if work_dir is None:
+            shutil.rmtree(root_dir, ignore_errors=True)
+    return report
+
+def compare_reports(report: dict, baseline: dict, threshold: float = None) -> list:
+    """
+    Compara cada etapa con la misma etapa y escala de `baseline`.
+
+    Returns:
+        list: Dicts {'scale', 'stage', 'baseline', 'current', 'ratio', 'regression'}; es regresión si tarda más de
+        `threshold` veces lo de la referencia (y al menos `MIN_REGRESSION_SECONDS` más).
+    """
+    threshold = threshold or settings.BENCHMARK_REGRESSION_THRESHOLD
+    rows = []
+    for scale_name, scale in report['scales'].items():
+        baseline_stages = baseline.get('scales', {}).get(scale_name, {}).get('stages', {})
+        for stage_name, stage in scale['stages'].items():
+            if stage_name not in baseline_stages:
+                continue
+            current, previous = stage['seconds'], baseline_stages[stage_name]['seconds']
+            ratio = current / previous if previous > 0 else float('inf')
+            rows.append({'scale': scale_name, 'stage': stage_name, 'baseline': previous, 'current': current, 'ratio': ratio,
+                         'regression': ratio > threshold and current - previous > MIN_REGRESSION_SECONDS})
+    return rows
+
+def format_report(report: dict, comparison: list = None) -> str:
+    lines = ["="*50, "⏱️ BENCHMARK DEL PIPELINE ⏱️", "="*50,
+             f"Commit: {report['commit']} | Python {report['python']} | {report['cpu_count']} CPU | Modelo: {report['model']}"]
+    compared = {(row['scale'], row['stage']): row for row in comparison or []}
+    for scale_name, scale in report['scales'].items():
+        lines.append(f"\n--- {scale_name}: {scale['leagues']} ligas x {scale['seasons']} temporadas ({scale['matches']} partidos) ---")
+        for stage_name, stage in scale['stages'].items():
+            line = f"   {stage_name:<32} {stage['seconds']*1000:10.1f} ms"
+            if stage['items']:
+                line += f" {stage['seconds'] / stage['items'] * 1e6:10.1f} µs/partido"
+            row = compared.get((scale_name, stage_name))
+            if row:
+                line += f"   {'❌' if row['regression'] else '✅'} x{row['ratio']:.2f} (antes {row['baseline']*1000:.1f} ms)"
+            lines.append(line)
+    if comparison is not None:
+        regressions = [row for row in comparison if row['regression']]
+        lines.append(f"\n{'❌' if regressions else '✅'} {len(regressions)} regresiones de {len(comparison)} etapas comparadas.")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide cada etapa del pipeline con datos sintéticos a varias escalas, sin red.")
+    parser.add_argument('--scales', help=f"Escalas a medir, separadas por comas (por defecto todas: {', '.join(settings.BENCHMARK_SCALES)}).")
+    parser.add_argument('--stages', help="Etapas a medir, separadas por comas (por defecto todas).")
+    parser.add_argument('--repeat', type=int, default=1, help="Repeticiones por etapa (se queda la más rápida).")
+    parser.add_argument('--seed', type=int, help="Semilla de los datos sintéticos.")
+    parser.add_argument('--model', choices=['ratios', 'dixon_coles'], help="Modelo de fuerzas (por defecto settings.STRENGTH_MODEL).")
+    parser.add_argument('--data-dir', help="Carpeta donde generar (y reutilizar) los datos; por defecto una temporal.")
+    parser.add_argument('--json', help="Archivo donde guardar el resultado en JSON.")
+    parser.add_argument('--compare', help="JSON de otra ejecución con el que comparar.")
+    parser.add_argument('--threshold', type=float, help="Cuántas veces más lenta tiene que ser una etapa para contar como regresión.")
+    args = parser.parse_args()
+
+    scales = settings.BENCHMARK_SCALES
+    if args.scales:
+        unknown = [name for name in args.scales.split(',') if name not in scales]
+        if unknown:
+            parser.error(f"Escalas desconocidas: {', '.join(unknown)}")
+        scales = {name: scales[name] for name in args.scales.split(',')}
+    stages = args.stages.split(',') if args.stages else None
+    report = run_pipeline_benchmark(scales, args.repeat, args.seed, args.model, stages, args.data_dir)
+    comparison = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            comparison = compare_reports(report, json.load(f), args.threshold)
+    print(format_report(report, comparison))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 1 if comparison and any(row['regression'] for row in comparison) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# benchmarks/startup.py
+
+"""
+Benchmark de arranque de los scripts que lanza n8n.
+
+Para cada script se mide el tiempo de arrancar un intérprete nuevo e importarlo (lo que paga cada
+ejecución antes de hacer nada útil) y, con `python -X importtime`, cuánto cuesta cada módulo que
+importa. Si algún script pasa de su presupuesto (`settings.STARTUP_BUDGET_SECONDS`) el proceso
+termina con código 1, así que sirve como comprobación antes de subir un cambio.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.startup [--repeat 5] [--top 10] [--json startup.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from config import settings
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run_python(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=PROJECT_DIR, capture_output=True, text=True)
+
+def time_import(module: str, repeat: int = 5) -> float:
+    """Segundos (el mejor de `repeat`) de arrancar Python e importar `module` en un proceso nuevo."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _run_python(['-c', f'import {module}'])
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"No se pudo importar {module}: {result.stderr.strip().splitlines()[-1]}")
+    return min(timings)
+
+def import_breakdown(module: str) -> list:
+    """
+    Coste de cada import de `module` según `python -X importtime`.
+
+    Returns:
+        list: Dicts {'module', 'self_ms', 'cumulative_ms', 'depth'} en el orden en que se importaron
+        (depth 0 = importado directamente por el script o por el intérprete).
+    """
+    result = _run_python(['-X', 'importtime', '-c', f'import {module}'])
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({'module': name.strip(), 'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000,
+                        'depth': (len(name) - len(name.lstrip()) - 1) // 2})
+    return entries
+
+def run_startup_benchmark(budgets: dict = None, repeat: int = 5, top: int = 10) -> dict:
+    """
+    Mide el arranque de cada script de `budgets` ({módulo: segundos}).
+
+    Returns:
+        dict: {'python_seconds' (arrancar un intérprete vacío), 'scripts': {módulo: {'seconds', 'budget',
+        'within_budget', 'top_imports'}}, 'within_budget'}.
+    """
+    budgets = budgets or settings.STARTUP_BUDGET_SECONDS
+    report = {'python_seconds': time_import('sys', repeat), 'scripts': {}}
+    for module, budget in budgets.items():
+        seconds = time_import(module, repeat)
+        # Los imports más caros de los que hace el propio script (o sus módulos de src)
+        breakdown = [entry for entry in import_breakdown(module) if entry['depth'] <= 1]
+        top_imports = sorted(breakdown, key=lambda entry: entry['cumulative_ms'], reverse=True)[:top]
+        report['scripts'][module] = {'seconds': seconds, 'budget': budget, 'within_budget': seconds <= budget, 'top_imports': top_imports}
+    report['within_budget'] = all(script['within_budget'] for script in report['scripts'].values())
+    return report
+
+def format_report(report: dict) -> str:
+    lines = ["="*50, "⏱️ ARRANQUE DE LOS SCRIPTS ⏱️", "="*50, f"Intérprete vacío: {report['python_seconds']*1000:.0f} ms"]
+    for module, script in report['scripts'].items():
+        status = "✅" if script['within_budget'] else "❌"
+        lines.append(f"\n{status} {module}: {script['seconds']*1000:.0f} ms (presupuesto {script['budget']*1000:.0f} ms)")
+        for entry in script['top_imports']:
+            lines.append(f"   - {entry['module']:<40} {entry['cumulative_ms']:8.1f} ms")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque de los scripts y falla si alguno pasa de su presupuesto.")
+    parser.add_argument('--repeat', type=int, default=5, help="Arranques por script (se queda el más rápido).")
+    parser.add_argument('--top', type=int, default=10, help="Imports más caros que se muestran por script.")
+    parser.add_argument('--json', help="Archivo donde guardar el resultado en JSON.")
+    args = parser.parse_args()
+    report = run_startup_benchmark(repeat=args.repeat, top=args.top)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['within_budget'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
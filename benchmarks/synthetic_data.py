@@ -0,0 +1,339 @@
+# benchmarks/synthetic_data.py
+
+"""
+Generador de datos sintéticos para los benchmarks.
+
+Escribe CSV con el formato de football-data.co.uk (mismas columnas de resultado y de cuotas:
+B365, Pinnacle, Max, Avg, más/menos 2.5 y hándicap asiático) para N ligas x M temporadas, más la
+temporada en curso a medias, y las respuestas de The Odds API que necesita el pipeline sin red:
+las cuotas de la próxima jornada de cada liga y los resultados de la última jugada.
+
+Los goles salen de un Poisson con fuerzas de ataque y defensa por equipo (que cambian un poco cada
+temporada, con ascensos y descensos) y las cuotas de esas mismas probabilidades con ruido y el
+margen de cada casa, así que los modelos y los backtests trabajan con datos verosímiles. Con la
+misma semilla el resultado es idéntico, para poder comparar commits.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.synthetic_data --leagues 5 --seasons 4 --out /tmp/synthetic
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# Códigos de football-data para las ligas sintéticas (después se numeran: X19, X20...)
+LEAGUE_CODES = ['SP1', 'E0', 'D1', 'I1', 'F1', 'SP2', 'E1', 'D2', 'I2', 'F2', 'N1', 'B1', 'P1', 'T1', 'G1', 'SC0', 'E2', 'E3']
+# Casas de los CSV: (prefijo de columna, margen)
+CSV_BOOKMAKERS = [('B365', 0.05), ('BW', 0.06), ('PS', 0.025), ('WH', 0.065), ('1XB', 0.045)]
+# Casas de las respuestas de The Odds API: (clave, nombre, margen)
+API_BOOKMAKERS = [('bet365', 'Bet365', 0.05), ('pinnacle', 'Pinnacle', 0.025), ('williamhill', 'William Hill', 0.065),
+                  ('unibet_eu', 'Unibet', 0.055), ('betfair_ex_eu', 'Betfair', 0.02), ('marathonbet', 'Marathon Bet', 0.045)]
+API_TOTALS_LINES = [1.5, 2.5, 3.5]
+MAX_GOALS = 10
+BASE_GOALS = 1.3
+HOME_ADVANTAGE = 0.25 # En escala logarítmica: el local marca exp(0.25) ~ 1.28 veces más
+
+def league_codes(num_leagues: int) -> list:
+    """Los `num_leagues` primeros códigos de liga."""
+    return (LEAGUE_CODES + [f"X{number}" for number in range(len(LEAGUE_CODES) + 1, num_leagues + 1)])[:num_leagues]
+
+def sport_key(league_code: str) -> str:
+    """Clave de The Odds API de una liga sintética."""
+    return f"soccer_synthetic_{league_code.lower()}"
+
+def round_robin(num_teams: int) -> list:
+    """
+    Calendario de doble vuelta por el método del círculo.
+
+    Returns:
+        list: Una lista de pares (local, visitante) por jornada, con índices de equipo.
+    """
+    teams = list(range(num_teams))
+    rounds = []
+    for round_index in range(num_teams - 1):
+        pairs = [(teams[i], teams[num_teams - 1 - i]) for i in range(num_teams // 2)]
+        # Alternamos quién juega en casa para que nadie encadene toda la primera vuelta fuera
+        rounds.append([(home, away) if round_index % 2 == 0 else (away, home) for home, away in pairs])
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+    return rounds + [[(away, home) for home, away in pairs] for pairs in rounds]
+
+def _poisson_matrices(home_goals: np.ndarray, away_goals: np.ndarray) -> np.ndarray:
+    """Matrices (n, MAX_GOALS+1, MAX_GOALS+1) de marcadores con goles Poisson independientes."""
+    goals = np.arange(MAX_GOALS + 1)
+    log_factorial = np.cumsum(np.log(np.maximum(goals, 1)))
+    home = np.exp(goals * np.log(home_goals[:, None]) - home_goals[:, None] - log_factorial)
+    away = np.exp(goals * np.log(away_goals[:, None]) - away_goals[:, None] - log_factorial)
+    return home[:, :, None] * away[:, None, :]
+
+def market_probabilities(home_goals: np.ndarray, away_goals: np.ndarray, totals_line: float = 2.5, handicaps: np.ndarray = None) -> dict:
+    """
+    Probabilidades justas de 1X2, más/menos `totals_line` y, si se pasa `handicaps`, del hándicap del local.
+
+    Returns:
+        dict: {'1x2' (n, 3), 'over' (n,), 'home_cover' (n,)} (la devolución de las líneas enteras se reparte a medias).
+    """
+    matrices = _poisson_matrices(home_goals, away_goals)
+    home_index, away_index = np.indices(matrices.shape[1:])
+    probs = {'1x2': np.stack([(matrices * (home_index > away_index)).sum(axis=(1, 2)), (matrices * (home_index == away_index)).sum(axis=(1, 2)),
+                              (matrices * (home_index < away_index)).sum(axis=(1, 2))], axis=1),
+             'over': (matrices * (home_index + away_index > totals_line)).sum(axis=(1, 2))}
+    if handicaps is not None:
+        margin = (home_index - away_index)[None, :, :] + handicaps[:, None, None]
+        probs['home_cover'] = (matrices * ((margin > 0) + 0.5 * (margin == 0))).sum(axis=(1, 2))
+    return probs
+
+def book_prices(rng: np.random.Generator, fair_probs: np.ndarray, margin: float, noise: float = 0.04) -> np.ndarray:
+    """Cuotas de una casa: las probabilidades justas con ruido, normalizadas y con su margen (2 decimales, mínimo 1.01)."""
+    book_probs = fair_probs * np.exp(rng.normal(0.0, noise, fair_probs.shape))
+    book_probs = book_probs / book_probs.sum(axis=-1, keepdims=True) * (1 + margin)
+    return np.maximum(np.round(1.0 / book_probs, 2), 1.01)
+
+def _price_columns(rng: np.random.Generator, fair_probs: np.ndarray, columns_by_book: dict, margins: dict) -> dict:
+    """Columnas de cuotas de varias casas más Max y Avg. `columns_by_book` = {casa: [columna de cada selección]}."""
+    prices = {book: book_prices(rng, fair_probs, margins[book]) for book in columns_by_book if book not in ('Max', 'Avg')}
+    stacked = np.stack(list(prices.values()))
+    prices['Max'], prices['Avg'] = stacked.max(axis=0), np.round(stacked.mean(axis=0), 2)
+    return {column: prices[book][:, selection] for book, columns in columns_by_book.items() for selection, column in enumerate(columns)}
+
+def expected_goals(attack: np.ndarray, defense: np.ndarray, home: np.ndarray, away: np.ndarray) -> tuple:
+    """Goles esperados del local y del visitante de cada partido."""
+    return (BASE_GOALS * np.exp(HOME_ADVANTAGE + attack[home] - defense[away]),
+            BASE_GOALS * np.exp(attack[away] - defense[home]))
+
+def season_dates(season_start_year: int, num_rounds: int) -> list:
+    """Sábado de cada jornada: una por semana desde el segundo fin de semana de agosto."""
+    first_day = datetime(season_start_year, 8, 8)
+    first_saturday = first_day + timedelta(days=(5 - first_day.weekday()) % 7)
+    return [first_saturday + timedelta(weeks=round_index) for round_index in range(num_rounds)]
+
+def generate_season(rng: np.random.Generator, league_code: str, season_start_year: int, teams: list,
+                    attack: np.ndarray, defense: np.ndarray, missing_odds_rate: float = 0.002) -> pd.DataFrame:
+    """
+    Juega una temporada completa de una liga.
+
+    Returns:
+        pd.DataFrame: Un partido por fila, con las columnas de football-data (Date en dd/mm/yyyy) y 'Round'
+        (la jornada, que no se escribe en el CSV).
+    """
+    rounds = round_robin(len(teams))
+    dates = season_dates(season_start_year, len(rounds))
+    fixtures = [(round_index, slot, home, away) for round_index, pairs in enumerate(rounds) for slot, (home, away) in enumerate(pairs)]
+    round_index, slot, home, away = (np.array(column) for column in zip(*fixtures))
+    home_expected, away_expected = expected_goals(attack, defense, home, away)
+    home_goals, away_goals = rng.poisson(home_expected), rng.poisson(away_expected)
+    half_home, half_away = rng.binomial(home_goals, 0.45), rng.binomial(away_goals, 0.45)
+    # La mitad de cada jornada se juega en sábado y la otra mitad en domingo
+    match_days = [dates[r] + timedelta(days=int(s % 2)) for r, s in zip(round_index, slot)]
+    kick_offs = np.array(['14:00', '16:15', '18:30', '21:00'])[slot % 4]
+    results = np.array(['H', 'D', 'A'])
+
+    season_df = pd.DataFrame({
+        'Div': league_code,
+        'Date': [day.strftime('%d/%m/%Y') for day in match_days],
+        'Time': kick_offs,
+        'HomeTeam': np.array(teams, dtype=object)[home],
+        'AwayTeam': np.array(teams, dtype=object)[away],
+        'FTHG': home_goals, 'FTAG': away_goals,
+        'FTR': results[np.sign(away_goals - home_goals) + 1],
+        'HTHG': half_home, 'HTAG': half_away,
+        'HTR': results[np.sign(half_away - half_home) + 1],
+    })
+    margins = dict(CSV_BOOKMAKERS)
+    # Las casas ven las mismas fuerzas con su propio error; el hándicap es la diferencia esperada redondeada a cuartos
+    handicaps = -np.round((home_expected - away_expected) * 4) / 4
+    probs = market_probabilities(home_expected * np.exp(rng.normal(0, 0.05, len(home))), away_expected * np.exp(rng.normal(0, 0.05, len(home))),
+                                 handicaps=handicaps)
+    over_under = np.stack([probs['over'], 1 - probs['over']], axis=1)
+    asian = np.stack([probs['home_cover'], 1 - probs['home_cover']], axis=1)
+    columns = {}
+    columns.update(_price_columns(rng, probs['1x2'], {book: [f'{book}H', f'{book}D', f'{book}A'] for book, _ in CSV_BOOKMAKERS} |
+                                  {'Max': ['MaxH', 'MaxD', 'MaxA'], 'Avg': ['AvgH', 'AvgD', 'AvgA']}, margins))
+    columns.update(_price_columns(rng, over_under, {'B365': ['B365>2.5', 'B365<2.5'], 'PS': ['P>2.5', 'P<2.5'],
+                                                    'Max': ['Max>2.5', 'Max<2.5'], 'Avg': ['Avg>2.5', 'Avg<2.5']}, margins))
+    columns['AHh'] = handicaps
+    columns.update(_price_columns(rng, asian, {'B365': ['B365AHH', 'B365AHA'], 'PS': ['PAHH', 'PAHA'],
+                                               'Max': ['MaxAHH', 'MaxAHA'], 'Avg': ['AvgAHH', 'AvgAHA']}, margins))
+    # Cuotas de cierre: las de apertura con un poco más de ruido
+    columns.update(_price_columns(rng, probs['1x2'], {'B365': ['B365CH', 'B365CD', 'B365CA'], 'PS': ['PSCH', 'PSCD', 'PSCA'],
+                                                      'Max': ['MaxCH', 'MaxCD', 'MaxCA'], 'Avg': ['AvgCH', 'AvgCD', 'AvgCA']}, margins))
+    season_df = pd.concat([season_df, pd.DataFrame(columns)], axis=1)
+    # Como en los CSV reales, a algún partido le faltan las cuotas
+    season_df.loc[rng.random(len(season_df)) < missing_odds_rate, ['B365H', 'B365D', 'B365A']] = np.nan
+    season_df['Round'] = round_index
+    return season_df
+
+def _standings(season_df: pd.DataFrame, teams: list) -> list:
+    """Equipos de la temporada ordenados por puntos y diferencia de goles (de primero a último)."""
+    home_points = np.select([season_df['FTHG'] > season_df['FTAG'], season_df['FTHG'] == season_df['FTAG']], [3, 1], 0)
+    away_points = np.select([season_df['FTAG'] > season_df['FTHG'], season_df['FTHG'] == season_df['FTAG']], [3, 1], 0)
+    table = pd.DataFrame({'team': pd.concat([season_df['HomeTeam'], season_df['AwayTeam']], ignore_index=True),
+                          'points': np.concatenate([home_points, away_points]),
+                          'goal_diff': np.concatenate([season_df['FTHG'] - season_df['FTAG'], season_df['FTAG'] - season_df['FTHG']])})
+    table = table.groupby('team').sum().reindex(teams).sort_values(['points', 'goal_diff'], ascending=False)
+    return table.index.tolist()
+
+def generate_league(rng: np.random.Generator, league_code: str, first_season: int, num_seasons: int,
+                    num_teams: int = 20, relegated: int = 3) -> list:
+    """
+    Genera las temporadas completas de una liga más la temporada siguiente entera (la "en curso").
+    Los `relegated` últimos de cada temporada bajan y suben otros tantos equipos nuevos, más flojos.
+
+    Returns:
+        list: Un DataFrame de `generate_season` por temporada (num_seasons + 1).
+    """
+    next_team = num_teams
+    teams = [f"{league_code} Team {number:02d}" for number in range(1, num_teams + 1)]
+    ratings = {team: rng.normal(0.0, 0.25, 2) for team in teams}
+    seasons = []
+    for season_start_year in range(first_season, first_season + num_seasons + 1):
+        attack = np.array([ratings[team][0] for team in teams])
+        defense = np.array([ratings[team][1] for team in teams])
+        season_df = generate_season(rng, league_code, season_start_year, teams, attack, defense)
+        seasons.append(season_df)
+        # Cambios de verano: las fuerzas varían un poco y los últimos se cambian por equipos recién ascendidos
+        standings = _standings(season_df, teams)
+        for team in standings[len(standings) - relegated:]:
+            ratings.pop(team)
+            next_team += 1
+            new_team = f"{league_code} Team {next_team:02d}"
+            ratings[new_team] = rng.normal(-0.15, 0.15, 2)
+            teams[teams.index(team)] = new_team
+        for team in teams:
+            ratings[team] = ratings[team] + rng.normal(0.0, 0.08, 2)
+    return seasons
+
+def _match_id(league_code: str, home_team: str, away_team: str, day: str) -> str:
+    return hashlib.md5(f"{league_code}|{home_team}|{away_team}|{day}".encode('utf-8')).hexdigest()
+
+def _iso_time(date: str, time: str) -> str:
+    return datetime.strptime(f"{date} {time}", '%d/%m/%Y %H:%M').strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def odds_api_payload(rng: np.random.Generator, league_code: str, fixtures_df: pd.DataFrame, num_bookmakers: int = 4) -> list:
+    """
+    Respuesta de /sports/{liga}/odds para unos partidos: 1X2, más/menos de `API_TOTALS_LINES` y hándicap asiático
+    de `num_bookmakers` casas, con las cuotas calculadas como las de los CSV.
+    `fixtures_df` necesita, además de las columnas de football-data, 'home_expected' y 'away_expected'.
+    """
+    if fixtures_df.empty:
+        return []
+    home_expected, away_expected = fixtures_df['home_expected'].to_numpy(), fixtures_df['away_expected'].to_numpy()
+    handicaps = -np.round((home_expected - away_expected) * 4) / 4
+    # Probabilidades justas de cada mercado y, con ellas, las cuotas de cada casa para todos los partidos a la vez
+    probs = market_probabilities(home_expected, away_expected, handicaps=handicaps)
+    fair_probs = {'h2h': probs['1x2'], 'spreads': np.stack([probs['home_cover'], 1 - probs['home_cover']], axis=1)}
+    for line in API_TOTALS_LINES:
+        over = market_probabilities(home_expected, away_expected, totals_line=line)['over']
+        fair_probs[line] = np.stack([over, 1 - over], axis=1)
+    book_markets = [(book_key, book_title, {market: book_prices(rng, market_probs, margin) for market, market_probs in fair_probs.items()})
+                    for book_key, book_title, margin in API_BOOKMAKERS[:num_bookmakers]]
+
+    payload = []
+    for index, fixture in enumerate(fixtures_df.itertuples(index=False)):
+        commence_time = _iso_time(fixture.Date, fixture.Time)
+        last_update = (datetime.strptime(commence_time, '%Y-%m-%dT%H:%M:%SZ') - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        bookmakers = []
+        for book_key, book_title, markets in book_markets:
+            h2h, spreads = markets['h2h'][index], markets['spreads'][index]
+            totals = [{'name': name, 'price': float(markets[line][index][side]), 'point': line}
+                      for line in API_TOTALS_LINES for side, name in enumerate(['Over', 'Under'])]
+            bookmakers.append({'key': book_key, 'title': book_title, 'last_update': last_update, 'markets': [
+                {'key': 'h2h', 'last_update': last_update, 'outcomes': [{'name': fixture.HomeTeam, 'price': float(h2h[0])},
+                                                                       {'name': fixture.AwayTeam, 'price': float(h2h[2])},
+                                                                       {'name': 'Draw', 'price': float(h2h[1])}]},
+                {'key': 'totals', 'last_update': last_update, 'outcomes': totals},
+                {'key': 'spreads', 'last_update': last_update, 'outcomes': [
+                    {'name': fixture.HomeTeam, 'price': float(spreads[0]), 'point': float(handicaps[index])},
+                    {'name': fixture.AwayTeam, 'price': float(spreads[1]), 'point': float(-handicaps[index])}]}]})
+        payload.append({'id': _match_id(league_code, fixture.HomeTeam, fixture.AwayTeam, fixture.Date), 'sport_key': sport_key(league_code),
+                        'sport_title': league_code, 'commence_time': commence_time, 'home_team': fixture.HomeTeam,
+                        'away_team': fixture.AwayTeam, 'bookmakers': bookmakers})
+    return payload
+
+def scores_api_payload(league_code: str, played_df: pd.DataFrame, upcoming_df: pd.DataFrame) -> list:
+    """Respuesta de /sports/{liga}/scores: los partidos jugados, terminados y con marcador, y los próximos sin él."""
+    payload = []
+    for fixture, completed in [(fixture, True) for fixture in played_df.itertuples(index=False)] + [(fixture, False) for fixture in upcoming_df.itertuples(index=False)]:
+        commence_time = _iso_time(fixture.Date, fixture.Time)
+        payload.append({'id': _match_id(league_code, fixture.HomeTeam, fixture.AwayTeam, fixture.Date), 'sport_key': sport_key(league_code),
+                        'sport_title': league_code, 'commence_time': commence_time, 'completed': completed,
+                        'home_team': fixture.HomeTeam, 'away_team': fixture.AwayTeam,
+                        'scores': [{'name': fixture.HomeTeam, 'score': str(fixture.FTHG)}, {'name': fixture.AwayTeam, 'score': str(fixture.FTAG)}] if completed else None,
+                        'last_update': commence_time if completed else None})
+    return payload
+
+def write_synthetic_dataset(out_dir: str, num_leagues: int, num_seasons: int, first_season: int = 2010, num_teams: int = 20,
+                            played_fraction: float = 0.5, num_bookmakers: int = 4, seed: int = 0) -> dict:
+    """
+    Escribe un conjunto de datos sintético completo en `out_dir`.
+
+    - `data/{liga}_{año}_{año+1}.csv`: `num_seasons` temporadas completas por liga.
+    - `data/{liga}_{año}_{año+1}.csv` de la temporada en curso: solo las primeras jornadas (`played_fraction`).
+    - `odds_api/odds_{clave}.json`: cuotas de la jornada siguiente.
+    - `odds_api/scores_{clave}.json`: resultados de la última jornada jugada y los partidos de la siguiente.
+
+    Returns:
+        dict: {'params' (los argumentos), 'historical_files', 'current_season_files', 'league_codes',
+        'sport_keys' ({clave: liga}), 'odds_files', 'scores_files', 'num_matches'} (rutas absolutas).
+        También se guarda en `out_dir/dataset.json`.
+    """
+    params = {'num_leagues': num_leagues, 'num_seasons': num_seasons, 'first_season': first_season, 'num_teams': num_teams,
+              'played_fraction': played_fraction, 'num_bookmakers': num_bookmakers, 'seed': seed}
+    rng = np.random.default_rng(seed)
+    data_dir, api_dir = os.path.join(out_dir, 'data'), os.path.join(out_dir, 'odds_api')
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(api_dir, exist_ok=True)
+    dataset = {'params': params, 'historical_files': [], 'current_season_files': [], 'league_codes': league_codes(num_leagues), 'sport_keys': {},
+               'odds_files': [], 'scores_files': [], 'num_matches': 0}
+    for league_code in dataset['league_codes']:
+        seasons = generate_league(rng, league_code, first_season, num_seasons, num_teams)
+        played_rounds = max(1, int((seasons[-1]['Round'].max() + 1) * played_fraction))
+        for season_start_year, season_df in zip(range(first_season, first_season + num_seasons + 1), seasons):
+            file_path = os.path.abspath(os.path.join(data_dir, f"{league_code}_{season_start_year}_{season_start_year + 1}.csv"))
+            is_current = season_start_year == first_season + num_seasons
+            if is_current:
+                season_df = season_df[season_df['Round'] < played_rounds]
+            season_df.drop(columns='Round').to_csv(file_path, index=False)
+            dataset['current_season_files' if is_current else 'historical_files'].append(file_path)
+            dataset['num_matches'] += len(season_df)
+
+        # Respuestas de The Odds API alrededor de la última jornada jugada de la temporada en curso
+        current_df = seasons[-1]
+        last_round_df = current_df[current_df['Round'] == played_rounds - 1]
+        next_round_df = current_df[current_df['Round'] == played_rounds].copy()
+        # Las casas ven las fuerzas de la temporada con un poco de ruido (el mismo modelo que los CSV)
+        team_goals = pd.concat([current_df.rename(columns={'HomeTeam': 'team', 'FTHG': 'scored', 'FTAG': 'conceded'}),
+                                current_df.rename(columns={'AwayTeam': 'team', 'FTAG': 'scored', 'FTHG': 'conceded'})])
+        team_rates = team_goals.groupby('team')[['scored', 'conceded']].mean()
+        next_round_df['home_expected'] = np.maximum(team_rates.loc[next_round_df['HomeTeam'], 'scored'].to_numpy() * 1.1, 0.2)
+        next_round_df['away_expected'] = np.maximum(team_rates.loc[next_round_df['AwayTeam'], 'scored'].to_numpy() * 0.9, 0.2)
+        key = sport_key(league_code)
+        dataset['sport_keys'][key] = league_code
+        for kind, payload in [('odds', odds_api_payload(rng, league_code, next_round_df, num_bookmakers)),
+                              ('scores', scores_api_payload(league_code, last_round_df, next_round_df))]:
+            file_path = os.path.abspath(os.path.join(api_dir, f"{kind}_{key}.json"))
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+            dataset[f'{kind}_files'].append(file_path)
+    with open(os.path.join(out_dir, 'dataset.json'), 'w', encoding='utf-8') as f:
+        json.dump(dataset, f, indent=2)
+    return dataset
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera CSV de football-data y respuestas de The Odds API sintéticos.")
+    parser.add_argument('--out', required=True, help="Carpeta de salida.")
+    parser.add_argument('--leagues', type=int, default=5, help="Número de ligas.")
+    parser.add_argument('--seasons', type=int, default=3, help="Temporadas completas por liga (más la temporada en curso).")
+    parser.add_argument('--teams', type=int, default=20, help="Equipos por liga (par).")
+    parser.add_argument('--first-season', type=int, default=2010, help="Año de inicio de la primera temporada.")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla.")
+    args = parser.parse_args()
+    dataset = write_synthetic_dataset(args.out, args.leagues, args.seasons, args.first_season, args.teams, seed=args.seed)
+    print(f"✅ {dataset['num_matches']} partidos en {len(dataset['historical_files']) + len(dataset['current_season_files'])} CSV, "
+          f"{len(dataset['odds_files'])} ligas con cuotas y resultados en {os.path.join(args.out, 'odds_api')}.")
+
+if __name__ == "__main__":
+    main()
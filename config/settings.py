@@ -29,6 +29,26 @@ HISTORICAL_DATA_FILES = [
     'data/D1_2024_2025.csv'
 ]
 
+# Partidos de la temporada en curso (los va completando el actualizador)
+CURRENT_SEASON_FILES = [
+    'data/SP1_2025_2026.csv',
+    'data/E0_2025_2026.csv',
+    'data/D1_2025_2026.csv',
+    'data/I1_2025_2026.csv',
+    'data/F1_2025_2026.csv'
+]
+
+# Base de datos de partidos (los CSV se importan en ella una sola vez; se reconstruye a partir de ellos si no existe)
+MATCH_DB_FILE = 'data/cache/matches.db'
+
+# Registro de equipos: variantes de cada nombre, nombre estándar e id entero
+TEAM_REGISTRY_FILE = 'data/team_registry.csv'
+
+# Diario de predicciones (SQLite). El antiguo predictions_log.csv se importa la primera vez
+PREDICTION_JOURNAL_FILE = 'data/predictions.db'
+LEGACY_PREDICTIONS_LOG = 'predictions_log.csv'
+REVIEW_DATE_TOLERANCE_DAYS = 1 # Días de margen al cruzar una predicción con su resultado (partidos que cambian de hora o de día)
+
 # --- Configuración de The Odds API ---
 ODDS_API_LEAGUES = [
     'soccer_spain_la_liga',
@@ -37,6 +57,84 @@ ODDS_API_LEAGUES = [
     'soccer_italy_serie_a',
     'soccer_france_ligue_one'
 ]
+# Código de football-data de cada liga de The Odds API
+ODDS_API_LEAGUE_CODES = {
+    'soccer_spain_la_liga': 'SP1',
+    'soccer_epl': 'E0',
+    'soccer_germany_bundesliga': 'D1',
+    'soccer_italy_serie_a': 'I1',
+    'soccer_france_ligue_one': 'F1'
+}
 REGIONS = 'eu'
-MARKETS = 'h2h,totals'
+MARKETS = 'h2h,totals,spreads' # 1X2, goles y hándicap asiático ('double_chance' y las líneas alternativas también se valoran si se piden)
 HOURS_AHEAD = 72 # Ventana de tiempo para buscar partidos (en horas)
+
+# --- Barrido de estrategias de staking ---
+SWEEP_KELLY_FRACTIONS = [0.1, 0.25, 0.5, 0.75, 1.0]
+SWEEP_MIN_EDGES = [0.0, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3]
+SWEEP_STAKES = [1.0, 2.0, 5.0] # Apuesta fija en unidades
+SWEEP_LOG_FILE = 'data/cache/strategy_sweep_log.csv' # Resultados del último barrido (se reescribe en cada uno)
+
+# --- Caché de datos históricos ---
+DATA_CACHE_DIR = 'data/cache' # Copias en formato Feather de los CSV ya preparados
+STRENGTH_STORE_FILE = 'data/cache/team_strengths.pkl' # Sumas por equipo para calcular fuerzas sin recorrer todo el histórico
+
+# --- Conexión con The Odds API ---
+ODDS_API_URL = 'https://api.the-odds-api.com/v4'
+API_TIMEOUT = 10 # Segundos por petición
+API_MAX_RETRIES = 3 # Reintentos ante errores de conexión o respuestas 429/5xx
+API_MAX_WORKERS = 5 # Peticiones simultáneas (una por liga)
+
+# --- Caché de respuestas de The Odds API ---
+API_CACHE_DIR = 'data/cache/api'
+API_CACHE_TTL = {'odds': 600, 'scores': 1800} # Segundos en los que una respuesta se usa sin volver a pedirla (0 = sin caché)
+API_CACHE_STALE = {'odds': 3600, 'scores': 6 * 3600} # Tras el TTL, se sigue sirviendo la copia mientras se refresca en segundo plano
+API_CACHE_WINDOW_SECONDS = 3600 # Las cuotas se guardan por tramos de una hora; cada petición pide la ventana hasta el final de su tramo
+
+# --- Cara a cara ---
+H2H_LAST_N = None # Número de enfrentamientos recientes que se muestran en los informes (None = todos)
+
+# --- Modelo de fuerzas ---
+STRENGTH_MODEL = 'ratios' # 'ratios' (medias de goles) o 'dixon_coles' (Poisson ajustado por máxima verosimilitud)
+DC_TIME_DECAY = 0.0019 # xi de los pesos exp(-xi * días): la mitad de peso al año aprox. (0 = todos los partidos igual)
+DC_USE_RHO = True # Corrección de Dixon-Coles para los marcadores 0-0, 0-1, 1-0 y 1-1
+DC_L2_PENALTY = 1e-4 # Penalización L2 de ataque/defensa (fija el nivel relativo de cada liga)
+DC_FIT_FILE = 'data/cache/dixon_coles_fit.pkl' # Último ajuste, para arrancar desde él en el siguiente
+PARTITION_BY_LEAGUE = True # Un modelo por liga, con sus propias medias de goles (False = todas las ligas juntas)
+LEAGUE_FIT_WORKERS = None # Procesos para ajustar las ligas en paralelo (None = uno por CPU, 1 = en serie)
+LEAGUE_FIT_PARALLEL_MODELS = ['dixon_coles'] # Modelos que se ajustan liga a liga en el pool de procesos (el de medias es más rápido en serie)
+
+# --- Simulación Monte Carlo de la temporada en curso ---
+SEASON_SIM_NUM_SIMULATIONS = 100000
+SEASON_SIM_BATCH_SIZE = 5000 # Temporadas simuladas por bloque (limita la memoria: bloque x partidos pendientes)
+SEASON_SIM_SEED = 42 # Semilla de las simulaciones (None = distinta en cada ejecución)
+SEASON_SIM_TOP_PLACES = 4 # Plazas de Champions
+SEASON_SIM_RELEGATION_PLACES = {'SP1': 3, 'E0': 3, 'I1': 3, 'D1': 2, 'F1': 2} # Descensos directos de cada liga
+SEASON_FIXTURE_FILES = {} # {league_code: CSV con Date, HomeTeam y AwayTeam}; sin calendario se usa la doble vuelta completa
+
+# --- Servicio de predicciones (prediction_service.py) ---
+PREDICTION_SERVICE_HOST = '127.0.0.1'
+PREDICTION_SERVICE_PORT = 8765
+PREDICTION_SERVICE_TIMEOUT = 60 # Segundos que espera reporter_client.py antes de generar el informe él mismo
+PREDICTION_SERVICE_POLL_SECONDS = 30 # Cada cuánto se comprueba si han cambiado los datos
+
+# --- Tiempos por etapa y perfilado (src/instrumentation.py) ---
+TIMING_ENABLED = True # Mide cada etapa de los análisis y los backtests (False = sin medir; el coste es despreciable)
+TIMING_LOG_FILE = 'data/cache/timings.jsonl' # Una línea JSON por etapa de cada ejecución (None = no se guarda)
+TIMING_LOG_MAX_BYTES = 5 * 1024 * 1024 # Al pasar de este tamaño el registro pasa a '<archivo>.1' y se empieza otro (0 = sin límite)
+PROFILE_MODE = None # None, 'cprofile' o 'sampling': perfila cada ejecución completa y guarda el perfil en PROFILE_DIR (la app lo elige por sesión)
+PROFILE_DIR = 'data/cache/profiles'
+PROFILE_SAMPLING_INTERVAL = 0.005 # Segundos entre muestras del modo 'sampling'
+
+# --- Arranque de los scripts (benchmarks/startup.py) ---
+# Segundos máximos para arrancar Python e importar cada script; el benchmark falla si alguno se pasa
+STARTUP_BUDGET_SECONDS = {'reporter': 0.6, 'main': 0.6, 'reporter_client': 0.15, 'prediction_service': 0.6}
+
+# --- Benchmark del pipeline con datos sintéticos (benchmarks/pipeline.py) ---
+BENCHMARK_SCALES = {
+    'small': {'leagues': 2, 'seasons': 3},
+    'medium': {'leagues': 5, 'seasons': 6},   # El tamaño de los datos reales, con el doble de temporadas
+    'large': {'leagues': 10, 'seasons': 12}
+}
+BENCHMARK_SEED = 0
+BENCHMARK_REGRESSION_THRESHOLD = 1.25 # Una etapa es regresión si tarda más de 1.25 veces lo de la referencia
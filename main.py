@@ -3,9 +3,10 @@ from config import settings
 from datetime import datetime
 # Importamos las nuevas funciones
 from src.utils import load_and_prepare_data, normalize_team_name
-from src.data_analyzer import calculate_team_strengths, get_h2h_stats
-from src.prediction_model import predict_outcome, find_value_bets
-from src.data_fetcher import get_future_odds_from_api
+from src.data_analyzer import calculate_team_strengths, build_h2h_index, get_h2h_stats
+from src.prediction_model import predict_outcome
+from src.odds_table import build_odds_table, price_summary, model_probs_rows, model_probs_table, find_best_value_bets, value_bets_by_match, match_key
+from src.data_fetcher import fetch_odds_for_leagues
 from src.explanation_generator import generar_analisis_completo
 
 def main():
@@ -17,10 +18,13 @@ def main():
     print(f"✅ Modelo entrenado con {len(matches_df)} partidos históricos.")
     stats = calculate_team_strengths(matches_df)
     if not stats: return
+    h2h_index = build_h2h_index(matches_df) # load_and_prepare_data ya devuelve los nombres normalizados
 
     print(f"\n📡 Obteniendo cuotas para partidos en las próximas {settings.HOURS_AHEAD} horas...")
-    for league_key in settings.ODDS_API_LEAGUES:
-        upcoming_matches = get_future_odds_from_api(settings.ODDS_API_KEY, league_key, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD)
+    odds_by_league = fetch_odds_for_leagues(settings.ODDS_API_KEY, settings.ODDS_API_LEAGUES, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD)
+    # Cuotas de todas las casas en una sola tabla; el valor se busca contra la mejor cuota de cada selección
+    prices = price_summary(build_odds_table([match for upcoming_matches in odds_by_league.values() for match in upcoming_matches]))
+    for league_key, upcoming_matches in odds_by_league.items():
         league_name = league_key.replace('_', ' ').replace('soccer', '').replace('epl', 'Premier League').title()
         if not upcoming_matches:
             print(f"\nNo se encontraron próximos partidos con cuotas para {league_name}.")
@@ -35,16 +39,11 @@ def main():
 
             team_strengths = stats['team_strengths']
             if home_team_norm in team_strengths and away_team_norm in team_strengths:
-                bookmaker, market = match['bookmakers'][0], match['bookmakers'][0]['markets'][0]
-                home_odds = next((p['price'] for p in market['outcomes'] if p['name'] == home_team_original), None)
-                away_odds = next((p['price'] for p in market['outcomes'] if p['name'] == away_team_original), None)
-                draw_odds = next((p['price'] for p in market['outcomes'] if p['name'] == 'Draw'), None)
-                if not all((home_odds, away_odds, draw_odds)): continue
-
                 expected_home = team_strengths[home_team_norm]['attack_strength_home'] * team_strengths[away_team_norm]['defense_strength_away'] * stats['league_avg_home_goals']
                 expected_away = team_strengths[away_team_norm]['attack_strength_away'] * team_strengths[home_team_norm]['defense_strength_home'] * stats['league_avg_away_goals']
                 prediction = predict_outcome(expected_home, expected_away)
-                value_bets = find_value_bets(prediction, {'home_odds': home_odds, 'draw_odds': draw_odds, 'away_odds': away_odds})
+                model_probs = model_probs_table(model_probs_rows(match_key(match), {'1x2': prediction, 'totals': {}}))
+                value_bets = value_bets_by_match(find_best_value_bets(prices, model_probs)).get(match_key(match), [])
 
                 if value_bets:
                     match_time = datetime.fromisoformat(match['commence_time'].replace('Z', '+00:00'))
@@ -53,7 +52,7 @@ def main():
                     print(f"   🗓️  {match_time.strftime('%A, %d de %B - %H:%M')}")
 
                     # Obtenemos las estadísticas H2H y generamos el informe
-                    h2h = get_h2h_stats(matches_df, home_team_norm, away_team_norm)
+                    h2h = get_h2h_stats(h2h_index, home_team_norm, away_team_norm, last_n=settings.H2H_LAST_N)
                     expected_goals = {'home': expected_home, 'away': expected_away}
                     informe = generar_analisis_completo(prediction, value_bets, h2h, home_team_original, away_team_original, expected_goals)
 
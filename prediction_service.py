@@ -0,0 +1,131 @@
+# prediction_service.py
+
+"""
+Servicio HTTP local que mantiene el modelo cargado en memoria.
+
+`reporter.py` carga todos los datos y recalcula las fuerzas en cada ejecución. Este
+servicio lo hace una sola vez al arrancar y vuelve a hacerlo solo cuando cambian los
+archivos de datos (se comprueba en segundo plano), así que cada petición solo tiene que
+pedir las cuotas (normalmente desde la caché) y aplicar el modelo.
+
+Rutas:
+    GET  /report   -> el mismo JSON que imprime `reporter.py`.
+    GET  /health   -> estado del servicio y del modelo cargado.
+    POST /refresh  -> fuerza la recarga de los datos.
+
+Uso:
+    python prediction_service.py
+    python reporter_client.py   (cliente para n8n; mantiene la salida de reporter.py)
+"""
+
+import json
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+from config import settings
+import reporter
+
+_state = {'stats': None, 'error_report': None, 'signature': None, 'loaded_at': None}
+_state_lock = threading.Lock()
+
+def _data_signature() -> tuple:
+    """Ruta, mtime y tamaño de cada archivo de datos; si cambia algo, hay que recargar."""
+    signature = []
+    for path in settings.HISTORICAL_DATA_FILES + settings.CURRENT_SEASON_FILES + [settings.MATCH_DB_FILE]:
+        try:
+            file_stat = os.stat(path)
+            signature.append((path, file_stat.st_mtime_ns, file_stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+def refresh_model(force: bool = False) -> bool:
+    """
+    Recarga los datos y las fuerzas si los archivos han cambiado (o si `force` es True).
+
+    Returns:
+        bool: True si se ha recargado.
+    """
+    if not force and _data_signature() == _state['signature']:
+        return False
+    with _state_lock:
+        if not force and _data_signature() == _state['signature']:
+            return False
+        stats, error_report = reporter.load_report_model()
+        # La firma se toma después de cargar: la carga puede importar CSV a la base de datos
+        _state.update(stats=stats, error_report=error_report, signature=_data_signature(), loaded_at=time.time())
+    return True
+
+def _watch_data_files(interval: float):
+    """Comprueba periódicamente si los datos han cambiado para que las peticiones no tengan que hacerlo."""
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_model()
+        except Exception as e:
+            print(f"Error al recargar el modelo: {e}")
+
+def render_report() -> str:
+    """Devuelve el informe exactamente como lo imprime `reporter.main`."""
+    stats, error_report = _state['stats'], _state['error_report']
+    if error_report:
+        return json.dumps(error_report)
+    return json.dumps(reporter.build_report(stats), indent=2)
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """Atiende las peticiones del servicio."""
+
+    def _send(self, status: int, body: str):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/report':
+            try:
+                self._send(200, render_report())
+            except Exception as e:
+                self._send(500, json.dumps([{"error": f"No se pudo generar el informe: {e}"}]))
+        elif path == '/health':
+            self._send(200, json.dumps({'status': 'ok', 'model_loaded': _state['stats'] is not None,
+                                        'loaded_at': _state['loaded_at']}))
+        else:
+            self._send(404, json.dumps({'error': 'Ruta no encontrada'}))
+
+    def do_POST(self):
+        if urlparse(self.path).path == '/refresh':
+            refresh_model(force=True)
+            self._send(200, json.dumps({'status': 'ok', 'loaded_at': _state['loaded_at']}))
+        else:
+            self._send(404, json.dumps({'error': 'Ruta no encontrada'}))
+
+    def log_message(self, format, *args):
+        # Sin registro por petición; n8n llama al servicio con mucha frecuencia
+        pass
+
+def create_server(host: str = None, port: int = None) -> ThreadingHTTPServer:
+    """Carga el modelo, arranca el vigilante de archivos y devuelve el servidor (sin empezar a servir)."""
+    refresh_model(force=True)
+    watcher = threading.Thread(target=_watch_data_files, args=(settings.PREDICTION_SERVICE_POLL_SECONDS,), daemon=True)
+    watcher.start()
+    return ThreadingHTTPServer((host or settings.PREDICTION_SERVICE_HOST, port or settings.PREDICTION_SERVICE_PORT), PredictionRequestHandler)
+
+def main():
+    server = create_server()
+    host, port = server.server_address[:2]
+    print(f"--- 🤖 Servicio de predicciones escuchando en http://{host}:{port} ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# reporter_client.py
+
+"""
+Cliente ligero para n8n: pide el informe al servicio de predicciones y lo imprime tal cual,
+con la misma salida que `reporter.py`. No importa pandas ni el modelo, así que arranca al instante.
+
+Si el servicio no está en marcha, genera el informe en este mismo proceso como siempre.
+"""
+
+import sys
+import urllib.error
+import urllib.request
+from config import settings
+
+def main():
+    url = f"http://{settings.PREDICTION_SERVICE_HOST}:{settings.PREDICTION_SERVICE_PORT}/report"
+    try:
+        with urllib.request.urlopen(url, timeout=settings.PREDICTION_SERVICE_TIMEOUT) as response:
+            print(response.read().decode('utf-8'))
+            return
+    except (urllib.error.URLError, OSError):
+        pass
+
+    # El servicio no responde: volvemos al informe de siempre
+    import reporter
+    reporter.main()
+
+if __name__ == "__main__":
+    sys.exit(main())
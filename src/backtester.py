@@ -1,19 +1,239 @@
 # src/backtester.py (Versión Final Corregida)
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import os
-from src.utils import load_and_prepare_data, normalize_team_name
-from src.data_analyzer import calculate_team_strengths
-from src.prediction_model import predict_outcome, find_value_bets, calculate_kelly_criterion
-
-def run_backtest_sequential(files: list, seasons_to_test: list) -> str:
-    # ... (esta función ya estaba correcta y no cambia)
-    report_log = ["="*50, "🔬 INICIANDO BACKTEST DE PRECISIÓN 🔬", "="*50]
-    full_df = load_and_prepare_data(files)
+from config import settings
+from src.utils import load_and_prepare_data
+from src.dixon_coles import fit_dixon_coles, dixon_coles_strengths, dixon_coles_expected_goals
+from src.team_registry import get_team_ids
+from src.league_models import split_by_league, map_partitions, model_label, LEGACY_MODEL_LABEL
+from src.strength_store import create_strength_store, update_strength_store, get_team_strengths, calculate_walk_forward_expected_goals
+from src.prediction_model import predict_outcomes_batch, predict_fixtures, calculate_kelly_criterion_batch
+from src.instrumentation import traced, span
+
+# --- NÚCLEO VECTORIZADO DE SIMULACIÓN ---
+# Resultados y apuestas se codifican como 0 = local, 1 = empate, 2 = visitante (-1 = sin apuesta).
+
+LEAGUE_NAME_MAP = {'SP1': 'La Liga', 'E0': 'Premier League', 'D1': 'Bundesliga', 'I1': 'Serie A', 'F1': 'Ligue 1'}
+OUTCOME_COLUMNS = ['home_win', 'draw', 'away_win']
+ODDS_COLUMNS = ['home_win_odds', 'draw_odds', 'away_win_odds']
+
+def actual_outcomes(matches_df: pd.DataFrame) -> np.ndarray:
+    """Resultado real de cada partido (0, 1 o 2)."""
+    goal_diff = matches_df['home_team_score'].to_numpy() - matches_df['away_team_score'].to_numpy()
+    return np.where(goal_diff > 0, 0, np.where(goal_diff == 0, 1, 2))
+
+def select_value_bets(probs: np.ndarray, odds: np.ndarray, min_edge: float):
+    """
+    Elige la apuesta de cada partido, igual que `find_value_bets` + `value_bets[0]`:
+    la primera apuesta de valor en el orden local, empate, visitante, siempre que su edge sea >= min_edge.
+
+    Args:
+        probs (np.ndarray): Probabilidades del modelo (n, 3).
+        odds (np.ndarray): Cuotas (n, 3). Las cuotas que faltan (NaN) nunca tienen valor.
+        min_edge (float): Ventaja mínima exigida (prob * cuota - 1).
+
+    Returns:
+        tuple: (selección (n,) con -1 si no se apuesta, cuota apostada (n,), probabilidad del modelo (n,)).
+    """
+    has_value, choice, bet_odds, model_prob = _first_value_bet(probs, odds)
+    placed = has_value & ((model_prob * bet_odds) - 1 >= min_edge)
+    return np.where(placed, choice, -1), bet_odds, model_prob
+
+def _first_value_bet(probs: np.ndarray, odds: np.ndarray):
+    """Primera apuesta de valor de cada partido: (hay valor, resultado elegido, cuota, probabilidad del modelo)."""
+    rows = np.arange(len(probs))
+    is_value = np.nan_to_num(probs * odds) > 1.0
+    choice = is_value.argmax(axis=1)
+    return is_value.any(axis=1), choice, odds[rows, choice], probs[rows, choice]
+
+def simulate_kelly_bankroll(selection: np.ndarray, bet_odds: np.ndarray, model_prob: np.ndarray, outcomes: np.ndarray,
+                            initial_bankroll: float, kelly_fraction: float):
+    """
+    Evoluciona el bankroll apostando una fracción de Kelly en cada partido (ya ordenados por fecha).
+    Cada apuesta multiplica el bankroll por (1 - f + f * cuota * acierto), así que toda la temporada
+    es un producto acumulado.
+
+    Returns:
+        tuple: (bankroll final, total apostado, número de apuestas).
+    """
+    stake_fraction = np.where(selection >= 0, calculate_kelly_criterion_batch(model_prob, bet_odds) * kelly_fraction, 0.0)
+    growth = 1 - stake_fraction + stake_fraction * np.where(selection == outcomes, bet_odds, 0.0)
+    bankroll_path = initial_bankroll * np.cumprod(growth)
+    bankroll_before_bet = np.concatenate(([initial_bankroll], bankroll_path[:-1]))
+    total_staked = float((bankroll_before_bet * stake_fraction).sum())
+    final_bankroll = float(bankroll_path[-1]) if len(bankroll_path) else initial_bankroll
+    return final_bankroll, total_staked, int((stake_fraction > 0).sum())
+
+def simulate_flat_bankroll(selection: np.ndarray, bet_odds: np.ndarray, outcomes: np.ndarray,
+                           initial_bankroll: float, stake_per_bet: float):
+    """
+    Evoluciona el bankroll apostando siempre la misma cantidad.
+
+    Returns:
+        tuple: (bankroll final, total apostado, número de apuestas).
+    """
+    placed = selection >= 0
+    bets_placed = int(placed.sum())
+    winnings = stake_per_bet * bet_odds[placed & (selection == outcomes)].sum()
+    total_staked = stake_per_bet * bets_placed
+    return float(initial_bankroll - total_staked + winnings), float(total_staked), bets_placed
+
+def _select_season_bets(predicted: pd.DataFrame, min_edge: float) -> pd.DataFrame:
+    """Añade a las predicciones de la temporada la apuesta elegida y el resultado real, ordenadas por fecha."""
+    bets = predicted.sort_values(by='utc_date', kind='stable')
+    selection, bet_odds, model_prob = select_value_bets(bets[OUTCOME_COLUMNS].to_numpy(), bets[ODDS_COLUMNS].to_numpy(dtype=float), min_edge)
+    return bets.assign(selection=selection, bet_odds=bet_odds, model_prob=model_prob, outcome=actual_outcomes(bets))
+
+def _build_strength_store(full_df: pd.DataFrame) -> dict:
+    """Almacén de fuerzas en memoria con todo el histórico, para consultarlo "a fecha de" cada temporada."""
+    store = create_strength_store()
+    update_strength_store(store, full_df)
+    return store
+
+def _predict_walk_forward(test_df: pd.DataFrame, walk_forward_goals: tuple) -> pd.DataFrame:
+    """
+    Igual que `predict_fixtures`, pero con los goles esperados del modo walk-forward
+    (ya calculados sobre el histórico completo, alineados con su índice por posición).
+    """
+    expected_home, expected_away, known = walk_forward_goals
+    positions = test_df.index.to_numpy()
+    known = known[positions]
+    predicted = test_df[known].copy()
+    predicted['expected_home'] = expected_home[positions][known]
+    predicted['expected_away'] = expected_away[positions][known]
+    predicted[['home_win', 'draw', 'away_win']] = predict_outcomes_batch(predicted['expected_home'], predicted['expected_away'])
+    return predicted
+
+def _predict_walk_forward_dixon_coles(full_df: pd.DataFrame, test_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Modo walk-forward con el modelo Dixon-Coles: se reajusta antes de cada día de partidos con
+    todo lo jugado hasta el día anterior, arrancando siempre desde el ajuste del día previo.
+    """
+    home_ids, away_ids = get_team_ids(test_df['home_team_name']), get_team_ids(test_df['away_team_name'])
+    match_days = test_df['utc_date'].dt.normalize().to_numpy()
+    expected_home, expected_away = np.full(len(test_df), np.nan), np.full(len(test_df), np.nan)
+    probs = np.full((len(test_df), len(OUTCOME_COLUMNS)), np.nan)
+    fit = None
+    for match_day in np.unique(match_days):
+        fit = fit_dixon_coles(full_df, as_of=match_day, init=fit)
+        if fit is None: continue
+        day = np.flatnonzero(match_days == match_day)
+        day_home, day_away, known = dixon_coles_expected_goals(fit, home_ids[day], away_ids[day])
+        day = day[known]
+        expected_home[day], expected_away[day] = day_home[known], day_away[known]
+        probs[day] = predict_outcomes_batch(expected_home[day], expected_away[day], rho=fit['rho'])
+    known = ~np.isnan(expected_home)
+    predicted = test_df[known].copy()
+    predicted['expected_home'] = expected_home[known]
+    predicted['expected_away'] = expected_away[known]
+    predicted[OUTCOME_COLUMNS] = probs[known]
+    return predicted
+
+def _frozen_strengths(full_df: pd.DataFrame, store: dict, as_of: str, model: str):
+    """Fuerzas "a fecha de" `as_of` con el modelo pedido ('ratios' usa el almacén ya construido)."""
+    if model == 'dixon_coles':
+        return dixon_coles_strengths(fit_dixon_coles(full_df, as_of=as_of))
+    return get_team_strengths(store, as_of=as_of)
+
+def _predict_pooled_season(full_df: pd.DataFrame, test_df: pd.DataFrame, test_season_start_year: int, walk_forward: bool, model: str = 'ratios'):
+    """
+    Predice los partidos de la temporada de prueba con un único modelo para todos los partidos de `full_df`,
+    congelado a 1 de agosto o en modo walk-forward. Devuelve None si no se pudieron calcular las fuerzas.
+    """
+    if walk_forward:
+        if model == 'dixon_coles':
+            return _predict_walk_forward_dixon_coles(full_df, test_df)
+        return _predict_walk_forward(test_df, calculate_walk_forward_expected_goals(full_df))
+    store = _build_strength_store(full_df) if model == 'ratios' else None
+    stats = _frozen_strengths(full_df, store, f'{test_season_start_year}-08-01', model)
+    return predict_fixtures(test_df, stats) if stats else None
+
+def _predict_league_partition(league_df: pd.DataFrame, test_index: pd.Index, test_season_start_year: int, walk_forward: bool, model: str):
+    """
+    Predice la temporada de prueba de una sola liga (se ejecuta en el pool de procesos).
+    `league_df` son todos los partidos de la liga y `test_index` las filas de la temporada de prueba.
+    """
+    # El modo walk-forward de medias necesita un índice posicional; al final se recupera el original
+    original_index = league_df.index
+    league_local = league_df.reset_index(drop=True)
+    predicted = _predict_pooled_season(league_local, league_local[original_index.isin(test_index)], test_season_start_year, walk_forward, model)
+    if predicted is not None:
+        predicted.index = original_index[predicted.index]
+    return predicted
+
+def _predict_test_season(full_df: pd.DataFrame, test_df: pd.DataFrame, test_season_start_year: int, walk_forward: bool, model: str = 'ratios'):
+    """
+    Predice los partidos de la temporada de prueba, con el modelo congelado a 1 de agosto
+    o en modo walk-forward. Devuelve None si no se pudieron calcular las fuerzas.
+
+    Con `settings.PARTITION_BY_LEAGUE` cada liga tiene su propio modelo y las ligas se calculan en
+    paralelo si el modelo está en `settings.LEAGUE_FIT_PARALLEL_MODELS` (el de medias tarda milisegundos y va en serie).
+    """
+    if not settings.PARTITION_BY_LEAGUE:
+        return _predict_pooled_season(full_df, test_df, test_season_start_year, walk_forward, model)
+    test_leagues = set(test_df['league_code'])
+    partitions = [(league_df, test_df.index[test_df['league_code'] == league_code], test_season_start_year, walk_forward, model)
+                  for league_code, league_df in split_by_league(full_df).items() if league_code in test_leagues]
+    predicted = [league_predicted for league_predicted in map_partitions(_predict_league_partition, partitions, parallel=model in settings.LEAGUE_FIT_PARALLEL_MODELS)
+                 if league_predicted is not None]
+    return pd.concat(predicted).sort_index() if predicted else None
+
+def append_to_backtest_log(log_file: str, log_entry: pd.DataFrame, key_columns: list) -> int:
+    """
+    Añade filas a un log de backtest (performance_log.csv, financial_log.csv) sustituyendo las que tengan la misma
+    clave. La columna 'model' forma parte de la clave: las curvas de cada configuración del modelo no se mezclan.
+    Las filas anteriores a esa columna se marcan con `LEGACY_MODEL_LABEL`. Devuelve el número de filas del log.
+    """
+    log_df = pd.read_csv(log_file) if os.path.exists(log_file) else pd.DataFrame()
+    if not log_df.empty and 'model' not in log_df:
+        log_df['model'] = LEGACY_MODEL_LABEL
+    updated_log = pd.concat([log_df, log_entry]).drop_duplicates(subset=key_columns + ['model'], keep='last')
+    updated_log.to_csv(log_file, index=False)
+    return len(updated_log)
+
+def _mode_label(walk_forward: bool, model: str) -> str:
+    return (" (WALK-FORWARD)" if walk_forward else "") + (" (DIXON-COLES)" if model == 'dixon_coles' else "")
+
+def _report_progress(progress, fraction: float, message: str):
+    """Avisa del avance a quien lo haya pedido (ej. la app, que ejecuta los backtests en segundo plano)."""
+    if progress is not None:
+        progress(min(max(fraction, 0.0), 1.0), message)
+
+@traced
+def run_backtest_sequential(files: list, seasons_to_test: list, walk_forward: bool = False, progress=None, model: str = None) -> str:
+    """
+    Backtester de PRECISIÓN temporada a temporada.
+
+    Con `walk_forward=True` el modelo no se congela el 1 de agosto: las fuerzas se actualizan
+    con cada jornada de la temporada de prueba. En ese modo no se escribe en performance_log.csv,
+    que guarda la curva de aprendizaje del modelo congelado.
+    `progress`, si se pasa, se llama como progress(fracción, mensaje) al terminar cada paso.
+    `model` es 'ratios' o 'dixon_coles' (None = `settings.STRENGTH_MODEL`); la curva de aprendizaje solo se
+    guarda con 'ratios', para poder comparar ambos modelos sin mezclarlos en la gráfica.
+    """
+    model = model or settings.STRENGTH_MODEL
+    mode_label = _mode_label(walk_forward, model)
+    report_log = ["="*50, f"🔬 INICIANDO BACKTEST DE PRECISIÓN{mode_label} 🔬", "="*50]
+    _report_progress(progress, 0.0, "Cargando datos...")
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(files)
+        stage.count('matches', len(full_df))
     if full_df.empty: return "❌ No se pudieron cargar los datos."
+    with span('prepare_model'):
+        if settings.PARTITION_BY_LEAGUE:
+            pass # Cada temporada se predice liga a liga con _predict_test_season
+        elif walk_forward and model == 'ratios':
+            walk_forward_goals = calculate_walk_forward_expected_goals(full_df)
+        elif model == 'ratios':
+            store = _build_strength_store(full_df)
+        else:
+            store = None
     season_results = []
-    for test_season_start_year in seasons_to_test:
+    for season_index, test_season_start_year in enumerate(seasons_to_test):
+        _report_progress(progress, 0.1 + 0.9 * season_index / len(seasons_to_test), f"Temporada {test_season_start_year}/{test_season_start_year+1}")
         report_log.append(f"\n--- EXAMEN DE LA TEMPORADA {test_season_start_year}/{test_season_start_year+1} ---")
         train_df = full_df[full_df['utc_date'] < f'{test_season_start_year}-08-01']
         test_start_date, test_end_date = f'{test_season_start_year}-08-01', f'{test_season_start_year+1}-07-31'
@@ -21,36 +241,39 @@ def run_backtest_sequential(files: list, seasons_to_test: list) -> str:
         if train_df.empty or test_df.empty:
             report_log.append("  - No hay suficientes datos para esta combinación.")
             continue
-        stats = calculate_team_strengths(train_df.copy())
-        if not stats: continue
-        report_log.append(f"  - Materia de Estudio: {len(train_df)} partidos.")
-        team_strengths = stats['team_strengths']
-        correct_predictions, hc_correct, hc_total, total_tested = 0, 0, 0, 0
-        for index, match in test_df.iterrows():
-            home_team, away_team = normalize_team_name(match['home_team_name']), normalize_team_name(match['away_team_name'])
-            if home_team in team_strengths and away_team in team_strengths:
-                total_tested += 1
-                expected_home = team_strengths[home_team]['attack_strength_home'] * team_strengths[away_team]['defense_strength_away'] * stats['league_avg_home_goals']
-                expected_away = team_strengths[away_team]['attack_strength_away'] * team_strengths[home_team]['defense_strength_home'] * stats['league_avg_away_goals']
-                prediction = predict_outcome(expected_home, expected_away)
-                predicted_outcome = max(prediction, key=prediction.get)
-                actual_home, actual_away = match['home_team_score'], match['away_team_score']
-                actual_outcome = 'home_win' if actual_home > actual_away else 'draw' if actual_home == actual_away else 'away_win'
-                if predicted_outcome == actual_outcome: correct_predictions += 1
-                if prediction[predicted_outcome] > 0.55:
-                    hc_total += 1
-                    if predicted_outcome == actual_outcome: hc_correct += 1
+        with span('predict_season', season=f"{test_season_start_year}/{test_season_start_year+1}") as stage:
+            if settings.PARTITION_BY_LEAGUE:
+                predicted = _predict_test_season(full_df, test_df, test_season_start_year, walk_forward, model)
+                if predicted is None: continue
+                report_log.append(f"  - Materia de Estudio: {len(train_df)} partidos{' + cada jornada ya jugada' if walk_forward else ''} (un modelo por liga).")
+            elif walk_forward:
+                report_log.append(f"  - Materia de Estudio: {len(train_df)} partidos + cada jornada ya jugada.")
+                predicted = _predict_walk_forward(test_df, walk_forward_goals) if model == 'ratios' else _predict_walk_forward_dixon_coles(full_df, test_df)
+            else:
+                stats = _frozen_strengths(full_df, store, f'{test_season_start_year}-08-01', model)
+                if not stats: continue
+                report_log.append(f"  - Materia de Estudio: {len(train_df)} partidos.")
+                predicted = predict_fixtures(test_df, stats)
+            stage.count('matches', len(predicted))
+        total_tested = len(predicted)
         if total_tested == 0: continue
+        probs = predicted[OUTCOME_COLUMNS].to_numpy()
+        # argmax desempata igual que max() sobre el dict: local, empate, visitante
+        is_correct = probs.argmax(axis=1) == actual_outcomes(predicted)
+        high_confidence = probs.max(axis=1) > 0.55
+        correct_predictions = int(is_correct.sum())
+        hc_total = int(high_confidence.sum())
+        hc_correct = int((is_correct & high_confidence).sum())
         accuracy = (correct_predictions / total_tested) * 100
         hc_accuracy = (hc_correct / hc_total) * 100 if hc_total > 0 else 0
         report_log.append(f"  - 🎯 Nota de Precisión General: {accuracy:.2f}%")
         season_results.append({'season': f"{test_season_start_year}/{test_season_start_year+1}", 'accuracy': accuracy})
-        try:
-            log_entry = pd.DataFrame([{'timestamp': datetime.now(), 'season_tested': f"{test_season_start_year}/{test_season_start_year+1}", 'accuracy': accuracy,'hc_accuracy': hc_accuracy}])
-            log_df = pd.read_csv('performance_log.csv') if os.path.exists('performance_log.csv') else pd.DataFrame()
-            updated_log = pd.concat([log_df, log_entry]).drop_duplicates(subset=['season_tested'], keep='last')
-            updated_log.to_csv('performance_log.csv', index=False)
-        except: pass
+        if walk_forward or model != 'ratios': continue
+        with span('write_performance_log') as stage:
+            try:
+                log_entry = pd.DataFrame([{'timestamp': datetime.now(), 'season_tested': f"{test_season_start_year}/{test_season_start_year+1}", 'accuracy': accuracy,'hc_accuracy': hc_accuracy, 'model': model_label(model)}])
+                stage.count('rows', append_to_backtest_log('performance_log.csv', log_entry, ['season_tested']))
+            except: pass
     if len(season_results) > 1:
         last_result, previous_result = season_results[-1], season_results[-2]
         report_log.append("\n" + "="*50)
@@ -63,100 +286,100 @@ def run_backtest_sequential(files: list, seasons_to_test: list) -> str:
             conclusion = "El modelo mantuvo un rendimiento ESTABLE y consistente."
         report_log.append(conclusion)
         report_log.append("="*50)
+    _report_progress(progress, 1.0, "Backtest completado")
     return "\n".join(report_log)
 
 
+@traced
 def run_financial_backtest_by_league(
     files: list, 
     test_season_start_year: int, 
     initial_bankroll: float = 100.0, 
     kelly_fraction: float = 0.5,
-    min_edge: float = 0.05
+    min_edge: float = 0.05,
+    walk_forward: bool = False,
+    progress=None,
+    model: str = None
 ) -> str:
     """
     Backtester FINANCIERO. Simula la estrategia Kelly por ligas.
+    Con `walk_forward=True` las fuerzas se actualizan tras cada jornada y no se escribe en financial_log.csv.
+    `model` es 'ratios' o 'dixon_coles' (None = `settings.STRENGTH_MODEL`); solo 'ratios' escribe en el log.
     """
-    report_log = ["="*50, "📈 INICIANDO BACKTEST FINANCIERO AVANZADO 📈", "="*50]
-    full_df = load_and_prepare_data(files)
+    model = model or settings.STRENGTH_MODEL
+    mode_label = _mode_label(walk_forward, model)
+    report_log = ["="*50, f"📈 INICIANDO BACKTEST FINANCIERO AVANZADO{mode_label} 📈", "="*50]
+    _report_progress(progress, 0.0, "Cargando datos...")
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(files)
+        stage.count('matches', len(full_df))
     if full_df.empty: return "❌ No se pudieron cargar los datos."
     train_df = full_df[full_df['utc_date'] < f'{test_season_start_year}-08-01']
     test_start_date, test_end_date = f'{test_season_start_year}-08-01', f'{test_season_start_year+1}-07-31'
     test_df = full_df[(full_df['utc_date'] >= test_start_date) & (full_df['utc_date'] <= test_end_date)].copy()
     if train_df.empty or test_df.empty: return "❌ No hay suficientes datos para separar en temporadas."
-    stats = calculate_team_strengths(train_df)
-    if not stats: return "❌ No se pudieron calcular las fuerzas de los equipos."
-    report_log.append(f"🧠 Modelo entrenado con {len(train_df)} partidos.")
+    _report_progress(progress, 0.2, "Calculando predicciones de la temporada...")
+    with span('predict_season', season=f"{test_season_start_year}/{test_season_start_year+1}") as stage:
+        predicted = _predict_test_season(full_df, test_df, test_season_start_year, walk_forward, model)
+        stage.count('matches', 0 if predicted is None else len(predicted))
+    if predicted is None: return "❌ No se pudieron calcular las fuerzas de los equipos."
+    report_log.append(f"🧠 Modelo entrenado con {len(train_df)} partidos{' + cada jornada ya jugada' if walk_forward else ''}.")
     report_log.append(f"🏦 Bankroll Inicial por Liga: {initial_bankroll:.2f} | Fracción Kelly: {kelly_fraction}x | Edge Mínimo: {min_edge:.1%}")
-    league_name_map = {'SP1': 'La Liga', 'E0': 'Premier League', 'D1': 'Bundesliga', 'I1': 'Serie A', 'F1': 'Ligue 1'}
     leagues_to_test = test_df['league_code'].unique()
-    for league_code in leagues_to_test:
-        league_name = league_name_map.get(league_code, f"Liga Desconocida ({league_code})")
-        league_test_df = test_df[test_df['league_code'] == league_code]
+    with span('select_bets'):
+        season_bets = _select_season_bets(predicted, min_edge)
+    for league_index, league_code in enumerate(leagues_to_test):
+        league_name = LEAGUE_NAME_MAP.get(league_code, f"Liga Desconocida ({league_code})")
+        _report_progress(progress, 0.5 + 0.5 * league_index / len(leagues_to_test), league_name)
         report_log.append(f"\n--- {league_name} | Temporada {test_season_start_year}/{test_season_start_year+1} ---")
-        bankroll, bets_placed, total_staked = initial_bankroll, 0, 0.0
-        for index, match in league_test_df.sort_values(by='utc_date').iterrows():
-            home_team, away_team = normalize_team_name(match['home_team_name']), normalize_team_name(match['away_team_name'])
-            if home_team in stats['team_strengths'] and away_team in stats['team_strengths']:
-                expected_home = stats['team_strengths'][home_team]['attack_strength_home'] * stats['team_strengths'][away_team]['defense_strength_away'] * stats['league_avg_home_goals']
-                expected_away = stats['team_strengths'][away_team]['attack_strength_away'] * stats['team_strengths'][home_team]['defense_strength_home'] * stats['league_avg_away_goals']
-                prediction = predict_outcome(expected_home, expected_away)
-                odds = {'home_win_odds': match['home_win_odds'], 'draw_odds': match['draw_odds'], 'away_win_odds': match['away_win_odds']}
-                value_bets = find_value_bets(prediction, odds)
-                if value_bets:
-                    bet_string = value_bets[0]
-                    
-                    # --- LÍNEA CORREGIDA ---
-                    parts = bet_string.split(" @")
-                    bet_type = parts[0]
-                    # ------------------------
-
-                    odds_part = parts[1].split(" (Modelo: ")
-                    bet_odds = float(odds_part[0])
-                    
-                    model_prob = float(odds_part[1].replace("%)", "")) / 100
-                    edge = (model_prob * bet_odds) - 1
-                    if edge >= min_edge:
-                        kelly_stake_percent = calculate_kelly_criterion(model_prob, bet_odds)
-                        stake = bankroll * (kelly_stake_percent * kelly_fraction)
-                        if stake > 0:
-                            bets_placed += 1
-                            total_staked += stake
-                            bankroll -= stake
-                            actual_home, actual_away = match['home_team_score'], match['away_team_score']
-                            if (bet_type == "Victoria Local" and actual_home > actual_away) or \
-                               (bet_type == "Empate" and actual_home == actual_away) or \
-                               (bet_type == "Victoria Visitante" and actual_home < actual_away):
-                                winnings = stake * bet_odds
-                                bankroll += winnings
+        league_bets = season_bets[season_bets['league_code'] == league_code]
+        with span('simulate_bankroll', league=league_code) as stage:
+            bankroll, total_staked, bets_placed = simulate_kelly_bankroll(
+                league_bets['selection'].to_numpy(), league_bets['bet_odds'].to_numpy(), league_bets['model_prob'].to_numpy(),
+                league_bets['outcome'].to_numpy(), initial_bankroll, kelly_fraction
+            )
+            stage.count('bets', bets_placed)
         profit_loss = bankroll - initial_bankroll
         roi = (profit_loss / total_staked) * 100 if total_staked > 0 else 0
         report_log.append(f"  - Resultado: Bankroll Final: {bankroll:.2f} | P/L: {profit_loss:+.2f} | ROI: {roi:+.2f}%")
         
-        # Guardamos el resultado en el log financiero
-        try:
-            log_entry = pd.DataFrame([{'season_simulated': f"{test_season_start_year}/{test_season_start_year+1}", 'league': league_name, 'final_bankroll': bankroll, 'profit_loss': profit_loss, 'roi_percent': roi}])
-            log_file = 'financial_log.csv'
-            log_df = pd.read_csv(log_file) if os.path.exists(log_file) else pd.DataFrame()
-            updated_log = pd.concat([log_df, log_entry]).drop_duplicates(subset=['season_simulated', 'league'], keep='last')
-            updated_log.to_csv(log_file, index=False)
-        except Exception as e:
-            report_log.append(f"  - ❌ No se pudo guardar el log: {e}")
-
-    report_log.append("\n💾 Rentabilidad guardada. La gráfica se actualizará.")
+        # Guardamos el resultado en el log financiero (solo el modelo congelado de medias alimenta la gráfica)
+        if walk_forward or model != 'ratios': continue
+        with span('write_financial_log', league=league_code) as stage:
+            try:
+                log_entry = pd.DataFrame([{'season_simulated': f"{test_season_start_year}/{test_season_start_year+1}", 'league': league_name, 'final_bankroll': bankroll, 'profit_loss': profit_loss, 'roi_percent': roi, 'model': model_label(model)}])
+                stage.count('rows', append_to_backtest_log('financial_log.csv', log_entry, ['season_simulated', 'league']))
+            except Exception as e:
+                report_log.append(f"  - ❌ No se pudo guardar el log: {e}")
+
+    if not walk_forward and model == 'ratios':
+        report_log.append("\n💾 Rentabilidad guardada. La gráfica se actualizará.")
+    _report_progress(progress, 1.0, "Simulación completada")
     return "\n".join(report_log)
 
+@traced
 def run_flat_betting_backtest(
     files: list, 
     test_season_start_year: int, 
     initial_bankroll: float = 100.0,
     stake_per_bet: float = 1.0, # Apostamos 1 unidad fija
-    min_edge: float = 0.05
+    min_edge: float = 0.05,
+    walk_forward: bool = False,
+    progress=None,
+    model: str = None
 ) -> str:
     """
     Simula una estrategia de Apuesta Fija (Flat Betting) y calcula la rentabilidad.
+    Con `walk_forward=True` las fuerzas se actualizan tras cada jornada.
+    `model` es 'ratios' o 'dixon_coles' (None = `settings.STRENGTH_MODEL`).
     """
-    report_log = ["="*50, "⚖️ INICIANDO BACKTEST DE APUESTA FIJA (FLAT) ⚖️", "="*50]
-    full_df = load_and_prepare_data(files)
+    model = model or settings.STRENGTH_MODEL
+    mode_label = _mode_label(walk_forward, model)
+    report_log = ["="*50, f"⚖️ INICIANDO BACKTEST DE APUESTA FIJA (FLAT){mode_label} ⚖️", "="*50]
+    _report_progress(progress, 0.0, "Cargando datos...")
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(files)
+        stage.count('matches', len(full_df))
     if full_df.empty: return "❌ No se pudieron cargar los datos."
     
     train_df = full_df[full_df['utc_date'] < f'{test_season_start_year}-08-01']
@@ -164,63 +387,146 @@ def run_flat_betting_backtest(
     test_df = full_df[(full_df['utc_date'] >= test_start_date) & (full_df['utc_date'] <= test_end_date)].copy()
     
     if train_df.empty or test_df.empty: return "❌ No hay suficientes datos para separar en temporadas."
-    stats = calculate_team_strengths(train_df)
-    if not stats: return "❌ No se pudieron calcular las fuerzas de los equipos."
+    _report_progress(progress, 0.2, "Calculando predicciones de la temporada...")
+    with span('predict_season', season=f"{test_season_start_year}/{test_season_start_year+1}") as stage:
+        predicted = _predict_test_season(full_df, test_df, test_season_start_year, walk_forward, model)
+        stage.count('matches', 0 if predicted is None else len(predicted))
+    if predicted is None: return "❌ No se pudieron calcular las fuerzas de los equipos."
 
-    report_log.append(f"🧠 Modelo entrenado con {len(train_df)} partidos.")
+    report_log.append(f"🧠 Modelo entrenado con {len(train_df)} partidos{' + cada jornada ya jugada' if walk_forward else ''}.")
     report_log.append(f"🏦 Bankroll Inicial por Liga: {initial_bankroll:.2f} | Apuesta Fija: {stake_per_bet:.2f} ud. | Edge Mínimo: {min_edge:.1%}")
     
-    league_name_map = {'SP1': 'La Liga', 'E0': 'Premier League', 'D1': 'Bundesliga', 'I1': 'Serie A', 'F1': 'Ligue 1'}
     leagues_to_test = test_df['league_code'].unique()
 
-    for league_code in leagues_to_test:
-        league_name = league_name_map.get(league_code, f"Liga Desconocida ({league_code})")
-        league_test_df = test_df[test_df['league_code'] == league_code]
-        
+    with span('select_bets'):
+        season_bets = _select_season_bets(predicted, min_edge)
+    for league_index, league_code in enumerate(leagues_to_test):
+        league_name = LEAGUE_NAME_MAP.get(league_code, f"Liga Desconocida ({league_code})")
+        _report_progress(progress, 0.5 + 0.5 * league_index / len(leagues_to_test), league_name)
         report_log.append(f"\n--- {league_name} | Temporada {test_season_start_year}/{test_season_start_year+1} ---")
-        
-        bankroll, bets_placed, total_staked = initial_bankroll, 0, 0.0
-        
-        for index, match in league_test_df.sort_values(by='utc_date').iterrows():
-            home_team, away_team = normalize_team_name(match['home_team_name']), normalize_team_name(match['away_team_name'])
-            
-            if home_team in stats['team_strengths'] and away_team in stats['team_strengths']:
-                expected_home = stats['team_strengths'][home_team]['attack_strength_home'] * stats['team_strengths'][away_team]['defense_strength_away'] * stats['league_avg_home_goals']
-                expected_away = stats['team_strengths'][away_team]['attack_strength_away'] * stats['team_strengths'][home_team]['defense_strength_home'] * stats['league_avg_away_goals']
-                prediction = predict_outcome(expected_home, expected_away)
-                odds = {'home_win_odds': match['home_win_odds'], 'draw_odds': match['draw_odds'], 'away_win_odds': match['away_win_odds']}
-                value_bets = find_value_bets(prediction, odds)
-
-                if value_bets:
-                    bet_string = value_bets[0]
-
-                    parts = bet_string.split(" @")
-                    bet_type = parts[0]
-                    
-                    # --- LÍNEA CORREGIDA ---
-                    odds_part = parts[1].split(" (Modelo: ")
-                    bet_odds = float(odds_part[0])
-                    # ------------------------
-
-                    model_prob = float(odds_part[1].replace("%)", "")) / 100
-                    
-                    edge = (model_prob * bet_odds) - 1
-                    if edge >= min_edge:
-                        stake = stake_per_bet
-                        bets_placed += 1
-                        total_staked += stake
-                        bankroll -= stake
-                        actual_home, actual_away = match['home_team_score'], match['away_team_score']
-                        if (bet_type == "Victoria Local" and actual_home > actual_away) or \
-                           (bet_type == "Empate" and actual_home == actual_away) or \
-                           (bet_type == "Victoria Visitante" and actual_home < actual_away):
-                            winnings = stake * bet_odds
-                            bankroll += winnings
+        league_bets = season_bets[season_bets['league_code'] == league_code]
+        with span('simulate_bankroll', league=league_code) as stage:
+            bankroll, total_staked, bets_placed = simulate_flat_bankroll(
+                league_bets['selection'].to_numpy(), league_bets['bet_odds'].to_numpy(), league_bets['outcome'].to_numpy(),
+                initial_bankroll, stake_per_bet
+            )
+            stage.count('bets', bets_placed)
 
         profit_loss = bankroll - initial_bankroll
         roi = (profit_loss / total_staked) * 100 if total_staked > 0 else 0
         
         report_log.append(f"  - Resultado: Bankroll Final: {bankroll:.2f} | P/L: {profit_loss:+.2f} | ROI: {roi:+.2f}%")
 
+    _report_progress(progress, 1.0, "Simulación completada")
     return "\n".join(report_log)
-    
\ No newline at end of file
+    
+
+def _sweep_league_bets(league_bets: pd.DataFrame, kelly_fractions: np.ndarray, min_edges: np.ndarray, stakes: np.ndarray, initial_bankroll: float) -> dict:
+    """
+    Evalúa todas las combinaciones de la rejilla para una liga y temporada con broadcasting.
+    Las dimensiones son (min_edge, kelly_fraction, partido) para Kelly y (min_edge, stake) para apuesta fija.
+    """
+    has_value, choice, bet_odds, model_prob = _first_value_bet(league_bets[OUTCOME_COLUMNS].to_numpy(), league_bets[ODDS_COLUMNS].to_numpy(dtype=float))
+    edge = (model_prob * bet_odds) - 1
+    payout = np.where(choice == actual_outcomes(league_bets), bet_odds, 0.0)
+    placed = has_value[None, :] & (edge[None, :] >= min_edges[:, None])                          # (E, n)
+
+    # Kelly: un producto acumulado por cada (min_edge, fracción)
+    stake_fraction = placed[:, None, :] * calculate_kelly_criterion_batch(model_prob, bet_odds)[None, None, :] * kelly_fractions[None, :, None]
+    growth = 1 - stake_fraction + stake_fraction * payout
+    bankroll_path = initial_bankroll * np.cumprod(growth, axis=2)
+    bankroll_before_bet = np.concatenate([np.full(bankroll_path.shape[:2] + (1,), initial_bankroll), bankroll_path[:, :, :-1]], axis=2)
+    kelly_final = bankroll_path[:, :, -1] if bankroll_path.shape[2] else np.full(bankroll_path.shape[:2], initial_bankroll)
+
+    # Apuesta fija: el resultado es lineal en el stake
+    bets_placed = placed.sum(axis=1)
+    units_won = (placed * payout).sum(axis=1)
+    return {
+        'kelly_final': kelly_final,
+        'kelly_staked': (bankroll_before_bet * stake_fraction).sum(axis=2),
+        'kelly_bets': (stake_fraction > 0).sum(axis=2),
+        'flat_final': initial_bankroll + stakes[None, :] * (units_won - bets_placed)[:, None],
+        'flat_staked': stakes[None, :] * bets_placed[:, None],
+        'flat_bets': np.broadcast_to(bets_placed[:, None], (len(min_edges), len(stakes)))
+    }
+
+@traced
+def run_strategy_sweep(
+    files: list,
+    test_seasons: list,
+    kelly_fractions: list,
+    min_edges: list,
+    stakes: list,
+    leagues: list = None,
+    initial_bankroll: float = 100.0,
+    walk_forward: bool = False,
+    log_file: str = None,
+    progress=None,
+    model: str = None
+) -> pd.DataFrame:
+    """
+    Barrido de estrategias: evalúa la rejilla fracción Kelly x edge mínimo x stake fijo x liga x temporada.
+
+    Los datos se cargan y las predicciones de cada temporada se calculan una sola vez; todas las
+    combinaciones de staking se evalúan después como operaciones sobre arrays.
+
+    Returns:
+        pd.DataFrame: Una fila por combinación, con las columnas de financial_log.csv más los parámetros
+        ('strategy', 'kelly_fraction', 'min_edge', 'stake_per_bet', 'bets_placed'). También se guarda en `log_file`
+        (None = `settings.SWEEP_LOG_FILE`).
+        `progress`, si se pasa, se llama como progress(fracción, mensaje) al empezar cada temporada.
+        `model` es 'ratios' o 'dixon_coles' (None = `settings.STRENGTH_MODEL`).
+    """
+    model = model or settings.STRENGTH_MODEL
+    _report_progress(progress, 0.0, "Cargando datos...")
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(files)
+        stage.count('matches', len(full_df))
+    if full_df.empty: return pd.DataFrame()
+    kelly_fractions, min_edges, stakes = (np.asarray(values, dtype=float) for values in (kelly_fractions, min_edges, stakes))
+
+    results = []
+    for season_index, test_season_start_year in enumerate(test_seasons):
+        _report_progress(progress, 0.1 + 0.9 * season_index / len(test_seasons), f"Temporada {test_season_start_year}/{test_season_start_year+1}")
+        season_label = f"{test_season_start_year}/{test_season_start_year+1}"
+        test_df = full_df[(full_df['utc_date'] >= f'{test_season_start_year}-08-01') & (full_df['utc_date'] <= f'{test_season_start_year+1}-07-31')]
+        if test_df.empty or full_df['utc_date'].min() >= pd.Timestamp(f'{test_season_start_year}-08-01'): continue
+        with span('predict_season', season=season_label) as stage:
+            predicted = _predict_test_season(full_df, test_df, test_season_start_year, walk_forward, model)
+            stage.count('matches', 0 if predicted is None else len(predicted))
+        if predicted is None or predicted.empty: continue
+        predicted = predicted.sort_values(by='utc_date', kind='stable')
+
+        for league_code in (leagues or predicted['league_code'].unique()):
+            league_bets = predicted[predicted['league_code'] == league_code]
+            if league_bets.empty: continue
+            with span('sweep_grid', season=season_label, league=league_code) as stage:
+                grid = _sweep_league_bets(league_bets, kelly_fractions, min_edges, stakes, initial_bankroll)
+                stage.count('combinations', len(min_edges) * (len(kelly_fractions) + len(stakes)))
+            league_name = LEAGUE_NAME_MAP.get(league_code, f"Liga Desconocida ({league_code})")
+            base = {'season_simulated': season_label, 'league': league_name, 'model': model_label(model)}
+            for e, min_edge in enumerate(min_edges):
+                for k, kelly_fraction in enumerate(kelly_fractions):
+                    results.append({**base, 'strategy': 'kelly', 'kelly_fraction': kelly_fraction, 'min_edge': min_edge, 'stake_per_bet': np.nan,
+                                    'final_bankroll': grid['kelly_final'][e, k], 'staked': grid['kelly_staked'][e, k], 'bets_placed': grid['kelly_bets'][e, k]})
+                for j, stake in enumerate(stakes):
+                    results.append({**base, 'strategy': 'flat', 'kelly_fraction': np.nan, 'min_edge': min_edge, 'stake_per_bet': stake,
+                                    'final_bankroll': grid['flat_final'][e, j], 'staked': grid['flat_staked'][e, j], 'bets_placed': grid['flat_bets'][e, j]})
+
+    _report_progress(progress, 1.0, "Barrido completado")
+    results_df = pd.DataFrame(results)
+    if results_df.empty: return results_df
+    results_df['profit_loss'] = results_df['final_bankroll'] - initial_bankroll
+    results_df['roi_percent'] = np.where(results_df['staked'] > 0, results_df['profit_loss'] / results_df['staked'].where(results_df['staked'] > 0) * 100, 0.0)
+    results_df = results_df.drop(columns='staked')
+    if not walk_forward:
+        with span('write_sweep_log') as stage:
+            log_file = log_file or settings.SWEEP_LOG_FILE
+            try:
+                os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+                results_df.to_csv(log_file, index=False)
+                stage.count('rows', len(results_df))
+            except Exception as e:
+                print(f"No se pudo guardar el log del barrido: {e}")
+    return results_df
+
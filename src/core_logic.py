@@ -1,19 +1,27 @@
 from config import settings
-from src.utils import load_and_prepare_data, normalize_team_name
-from src.data_analyzer import calculate_team_strengths, get_h2h_stats
+from src.utils import load_and_prepare_data, normalize_team_name, files_signature, league_file_path
+from src.database_manager import open_match_db, import_csv_files, upsert_results, load_matches_from_db
+from src.data_analyzer import build_h2h_index, get_h2h_stats
+from src.strength_store import add_results_to_strength_store
+from src.league_models import get_current_league_strengths
 # Importamos la nueva función para calcular Over/Under
-from src.prediction_model import predict_outcome, find_value_bets, calculate_kelly_criterion, calculate_over_under_probs
-from src.data_fetcher import get_future_odds_from_api, get_recent_scores_from_api
-from src.backtester import run_backtest_sequential, run_financial_backtest_by_league, run_flat_betting_backtest
+from src.prediction_model import calculate_match_markets
+from src.odds_table import build_odds_table, match_key
+from src.market_pricing import find_value_bets_all_books
+from src.data_fetcher import fetch_odds_for_leagues, fetch_scores_for_leagues
+from src.prediction_journal import prediction_entry, save_predictions, load_predictions, reconcile_predictions, update_prediction_results
+from src.instrumentation import traced, span
 from datetime import datetime
 import pandas as pd
-import os
 
-def generar_informe_partido(match: dict, stats: dict, matches_df: pd.DataFrame, prediction: dict) -> str:
+def generar_informe_partido(match: dict, stats: dict, h2h_index: dict, markets: dict, value_bets: list) -> str:
     """
     Genera un informe detallado, incluyendo ahora el análisis de goles.
+    `h2h_index` es la salida de `build_h2h_index`, `markets` la de `calculate_match_markets` para este partido
+    y `value_bets` sus apuestas de valor contra la mejor cuota de todas las casas.
     """
     informe = []
+    prediction = markets['1x2']
     home_team_original = match['home_team']
     away_team_original = match['away_team']
     match_time = datetime.fromisoformat(match['commence_time'].replace('Z', '+00:00'))
@@ -25,7 +33,7 @@ def generar_informe_partido(match: dict, stats: dict, matches_df: pd.DataFrame,
 
     home_team_norm = normalize_team_name(home_team_original)
     away_team_norm = normalize_team_name(away_team_original)
-    h2h = get_h2h_stats(matches_df, home_team_norm, away_team_norm)
+    h2h = get_h2h_stats(h2h_index, home_team_norm, away_team_norm, last_n=settings.H2H_LAST_N)
 
     informe.append("\n" + "📊 **Cara a Cara (Historial Reciente):**")
     if h2h['total_matches'] > 0:
@@ -48,7 +56,7 @@ def generar_informe_partido(match: dict, stats: dict, matches_df: pd.DataFrame,
     informe.append(f"   - _Goles esperados: {expected_home:.2f} - {expected_away:.2f}_")
     
     # --- NUEVO: ANÁLISIS DE GOLES (OVER/UNDER 2.5) ---
-    over_under_probs = calculate_over_under_probs(expected_home, expected_away)
+    over_under_probs = markets['totals']
     informe.append("\n" + "⚽ **Predicción de Goles (Más/Menos 2.5):**")
     informe.append(f"   - Probabilidad de Más de 2.5 goles: **{over_under_probs['over_2.5']:.1%}**")
     informe.append(f"   - Probabilidad de Menos de 2.5 goles: **{over_under_probs['under_2.5']:.1%}**")
@@ -56,119 +64,108 @@ def generar_informe_partido(match: dict, stats: dict, matches_df: pd.DataFrame,
     # --- OPORTUNIDADES DE VALOR (AMBOS MERCADOS) ---
     informe.append("\n" + "💎 **Oportunidades de Valor Detectadas:**")
     
-    value_bets_h2h = []
-    bookmaker_h2h = next((b for b in match['bookmakers'] if 'h2h' in [m['key'] for m in b['markets']]), None)
-    if bookmaker_h2h:
-        market_h2h = next(m for m in bookmaker_h2h['markets'] if m['key'] == 'h2h')
-        home_odds = next((p['price'] for p in market_h2h['outcomes'] if p['name'] == home_team_original), None)
-        away_odds = next((p['price'] for p in market_h2h['outcomes'] if p['name'] == away_team_original), None)
-        draw_odds = next((p['price'] for p in market_h2h['outcomes'] if p['name'] == 'Draw'), None)
-        value_bets_h2h = find_value_bets(prediction, {'home_odds': home_odds, 'draw_odds': draw_odds, 'away_odds': away_odds})
-
-    value_bets_totals = []
-    bookmaker_totals = next((b for b in match['bookmakers'] if 'totals' in [m['key'] for m in b['markets']]), None)
-    if bookmaker_totals:
-        market_totals = next((m for m in bookmaker_totals['markets'] if m['key'] == 'totals'), None)
-        over_odds = next((p['price'] for p in market_totals['outcomes'] if p.get('name') == 'Over' and p.get('point') == 2.5), None)
-        under_odds = next((p['price'] for p in market_totals['outcomes'] if p.get('name') == 'Under' and p.get('point') == 2.5), None)
-        
-        if over_odds and (over_under_probs['over_2.5'] * over_odds > 1.0):
-            value_bets_totals.append(f"Más de 2.5 Goles @{over_odds:.2f} (Modelo: {over_under_probs['over_2.5']:.2%})")
-        if under_odds and (over_under_probs['under_2.5'] * under_odds > 1.0):
-            value_bets_totals.append(f"Menos de 2.5 Goles @{under_odds:.2f} (Modelo: {over_under_probs['under_2.5']:.2%})")
-
-    all_value_bets = value_bets_h2h + value_bets_totals
+    all_value_bets = value_bets
     
     if not all_value_bets:
         informe.append("_No se ha encontrado una oportunidad clara de valor en los mercados principales._")
     else:
         informe.append("_Estas son apuestas donde el modelo cree que la cuota es desproporcionadamente alta para el riesgo que representa._")
-        for bet_string in all_value_bets:
-            parts = bet_string.split(" @")
-            bet_type = parts[0]
-            odds_part = parts[1].split(" (Modelo: ")
-            odds = float(odds_part[0])
-            model_prob = float(odds_part[1].replace("%)", "")) / 100
-            kelly_stake = calculate_kelly_criterion(model_prob, odds)
-            value_edge = (model_prob * odds) - 1
+        for bet in all_value_bets:
+            value_edge = bet.edge
             if value_edge > 0.5: nivel = "⭐⭐⭐ (Muy Alta)"
             elif value_edge > 0.2: nivel = "⭐⭐ (Buena)"
             else: nivel = "⭐ (Pequeña Ventaja)"
-            informe.append(f"\n- **{bet_type}:** Cuota **{odds:.2f}**. Nivel de Oportunidad: {nivel}")
-            informe.append(f"  - **📈 Apuesta Sugerida (Kelly):** Invertir un **{kelly_stake:.2%}** de tu bankroll.")
+            informe.append(f"\n- **{bet.label}:** Cuota **{bet.odds:.2f}** ({bet.bookmaker}). Nivel de Oportunidad: {nivel}")
+            informe.append(f"  - **📈 Apuesta Sugerida (Kelly):** Invertir un **{bet.kelly:.2%}** de tu bankroll.")
 
     return "\n".join(informe)
 
 def save_prediction(match: dict, prediction: dict):
-    log_file = 'predictions_log.csv'
-    match_id = f"{match['commence_time']}-{match['home_team']}-{match['away_team']}"
-    favorito_modelo = max(prediction, key=prediction.get)
-    if favorito_modelo == 'home_win': resultado_predicho = '1'
-    elif favorito_modelo == 'draw': resultado_predicho = 'X'
-    else: resultado_predicho = '2'
-    log_entry = {'id': match_id, 'date': match['commence_time'], 'home_team': match['home_team'], 'away_team': match['away_team'], 'predicted_outcome': resultado_predicho, 'model_confidence': prediction[favorito_modelo], 'status': 'PENDIENTE', 'actual_outcome': None, 'is_correct': None}
-    try:
-        log_df = pd.read_csv(log_file) if os.path.exists(log_file) else pd.DataFrame(columns=log_entry.keys())
-        if log_entry['id'] not in log_df['id'].values:
-            new_log_df = pd.DataFrame([log_entry])
-            updated_log = pd.concat([log_df, new_log_df], ignore_index=True)
-            updated_log.to_csv(log_file, index=False)
-    except Exception as e:
-        print(f"Error al guardar predicción: {e}")
+    """Guarda una predicción en el diario (si ya estaba, no hace nada)."""
+    save_predictions([prediction_entry(match, prediction)])
 
-def run_analysis():
-    all_files = settings.HISTORICAL_DATA_FILES + ['data/SP1_2025_2026.csv', 'data/E0_2025_2026.csv'] # Y otras ligas
-    matches_df = load_and_prepare_data(all_files)
+# Modelo del análisis ya entrenado, para no recargarlo en cada clic de la app mientras no cambien los datos
+_analysis_model = {'signature': None, 'model': None}
+
+def _analysis_signature() -> tuple:
+    # Con un modelo por liga cada liga tiene su propio almacén de fuerzas
+    league_codes = [settings.ODDS_API_LEAGUE_CODES[league_key] for league_key in settings.ODDS_API_LEAGUES] if settings.PARTITION_BY_LEAGUE else [None]
+    strength_files = [league_file_path(settings.STRENGTH_STORE_FILE, league_code) for league_code in league_codes]
+    return (settings.STRENGTH_MODEL, settings.PARTITION_BY_LEAGUE) + files_signature(settings.HISTORICAL_DATA_FILES + settings.CURRENT_SEASON_FILES + [settings.MATCH_DB_FILE] + strength_files)
+
+def load_analysis_model():
+    """
+    Carga los partidos de las ligas analizadas, las fuerzas y el índice H2H.
+    El resultado se reutiliza mientras no cambien los CSV, la base de datos ni el almacén de fuerzas.
+
+    Returns:
+        dict | str: {'matches_df', 'league_stats' ({league_code: stats}), 'h2h_index'} o el mensaje de error.
+    """
+    with span('check_model_cache') as stage:
+        if _analysis_model['model'] is not None and _analysis_signature() == _analysis_model['signature']:
+            stage.count('hits')
+            return _analysis_model['model']
+    # Solo las ligas que vamos a analizar; los CSV se importan a la base de datos la primera vez
+    leagues = [settings.ODDS_API_LEAGUE_CODES[league_key] for league_key in settings.ODDS_API_LEAGUES]
+    with span('load_matches') as stage:
+        matches_df = load_matches_from_db(settings.HISTORICAL_DATA_FILES + settings.CURRENT_SEASON_FILES, leagues=leagues)
+        stage.count('matches', len(matches_df))
     if matches_df.empty: return "❌ No se encontraron datos históricos."
-    informe_inicial = [f"✅ Modelo entrenado con {len(matches_df)} partidos históricos."]
-    stats = calculate_team_strengths(matches_df)
-    if not stats: return "❌ No se pudieron calcular las fuerzas de los equipos."
-    informe_inicial.append(f"\n📡 Obteniendo cuotas para partidos en las próximas {settings.HOURS_AHEAD} horas...")
-    informes = []
-    partidos_encontrados = 0
-    for league_key in settings.ODDS_API_LEAGUES:
-        upcoming_matches = get_future_odds_from_api(settings.ODDS_API_KEY, league_key, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD)
-        for match in upcoming_matches:
-            partidos_encontrados += 1
-            home_team_norm, away_team_norm = normalize_team_name(match['home_team']), normalize_team_name(match['away_team'])
-            if home_team_norm in stats['team_strengths'] and away_team_norm in stats['team_strengths']:
-                expected_home = stats['team_strengths'][home_team_norm]['attack_strength_home'] * stats['team_strengths'][away_team_norm]['defense_strength_away'] * stats['league_avg_home_goals']
-                expected_away = stats['team_strengths'][away_team_norm]['attack_strength_away'] * stats['team_strengths'][home_team_norm]['defense_strength_home'] * stats['league_avg_away_goals']
-                prediction = predict_outcome(expected_home, expected_away)
-                save_prediction(match, prediction)
-                informe = generar_informe_partido(match, stats, matches_df, prediction)
-                informes.append(informe)
-    if partidos_encontrados == 0:
-        informe_inicial.append("\nNo se han encontrado próximos partidos con cuotas en las APIs.")
-    elif not informes:
-        informe_inicial.append("\nSe encontraron partidos, pero nuestro modelo no tiene datos históricos para los equipos involucrados.")
-    else:
-        informe_inicial.append("\n\n" + "\n\n".join(informes))
-    return "\n".join(informe_inicial)
+    with span('fit_strengths', model=settings.STRENGTH_MODEL) as stage:
+        league_stats = get_current_league_strengths(matches_df)
+        stage.count('leagues', len(league_stats))
+    if not league_stats: return "❌ No se pudieron calcular las fuerzas de los equipos."
+    with span('build_h2h_index'):
+        h2h_index = build_h2h_index(matches_df)
+    model = {'matches_df': matches_df, 'league_stats': league_stats, 'h2h_index': h2h_index}
+    # La firma se toma después de cargar: la carga puede importar CSV y guardar el almacén de fuerzas
+    _analysis_model.update(signature=_analysis_signature(), model=model)
+    return model
 
+@traced
 def run_analysis():
-    # ... (código sin cambios)
-    all_files = settings.HISTORICAL_DATA_FILES + ['data/SP1_2025_2026.csv', 'data/E0_2025_2026.csv']
-    matches_df = load_and_prepare_data(all_files)
-    if matches_df.empty: return "❌ No se encontraron datos históricos."
+    with span('load_analysis_model'):
+        model = load_analysis_model()
+    if isinstance(model, str): return model
+    matches_df, league_stats, h2h_index = model['matches_df'], model['league_stats'], model['h2h_index']
     informe_inicial = [f"✅ Modelo entrenado con {len(matches_df)} partidos históricos."]
-    stats = calculate_team_strengths(matches_df)
-    if not stats: return "❌ No se pudieron calcular las fuerzas de los equipos."
     informe_inicial.append(f"\n📡 Obteniendo cuotas para partidos en las próximas {settings.HOURS_AHEAD} horas...")
-    informes = []
     partidos_encontrados = 0
-    for league_key in settings.ODDS_API_LEAGUES:
-        upcoming_matches = get_future_odds_from_api(settings.ODDS_API_KEY, league_key, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD)
-        for match in upcoming_matches:
-            partidos_encontrados += 1
-            home_team_norm, away_team_norm = normalize_team_name(match['home_team']), normalize_team_name(match['away_team'])
-            if home_team_norm in stats['team_strengths'] and away_team_norm in stats['team_strengths']:
-                expected_home = stats['team_strengths'][home_team_norm]['attack_strength_home'] * stats['team_strengths'][away_team_norm]['defense_strength_away'] * stats['league_avg_home_goals']
-                expected_away = stats['team_strengths'][away_team_norm]['attack_strength_away'] * stats['team_strengths'][home_team_norm]['defense_strength_home'] * stats['league_avg_away_goals']
-                prediction = predict_outcome(expected_home, expected_away)
-                save_prediction(match, prediction)
-                informe = generar_informe_partido(match, stats, matches_df, prediction)
-                informes.append(informe)
+    predicciones = []
+    analizados = [] # (partido, fuerzas de su liga, mercados del modelo)
+    with span('fetch_odds') as stage:
+        odds_by_league = fetch_odds_for_leagues(settings.ODDS_API_KEY, settings.ODDS_API_LEAGUES, settings.REGIONS, settings.MARKETS, settings.HOURS_AHEAD)
+        stage.count('leagues', len(odds_by_league))
+    # Las cuotas de todas las casas se aplanan una sola vez
+    with span('build_odds_table') as stage:
+        odds_df = build_odds_table([match for upcoming_matches in odds_by_league.values() for match in upcoming_matches])
+        stage.count('prices', len(odds_df))
+    with span('predict_matches') as stage:
+        for league_key, upcoming_matches in odds_by_league.items():
+            # Cada partido se predice con el modelo de su liga
+            stats = league_stats.get(settings.ODDS_API_LEAGUE_CODES.get(league_key), {'team_strengths': {}})
+            for match in upcoming_matches:
+                partidos_encontrados += 1
+                home_team_norm, away_team_norm = normalize_team_name(match['home_team']), normalize_team_name(match['away_team'])
+                if home_team_norm in stats['team_strengths'] and away_team_norm in stats['team_strengths']:
+                    expected_home = stats['team_strengths'][home_team_norm]['attack_strength_home'] * stats['team_strengths'][away_team_norm]['defense_strength_away'] * stats['league_avg_home_goals']
+                    expected_away = stats['team_strengths'][away_team_norm]['attack_strength_away'] * stats['team_strengths'][home_team_norm]['defense_strength_home'] * stats['league_avg_away_goals']
+                    markets = calculate_match_markets(expected_home, expected_away, rho=stats.get('rho', 0.0))
+                    predicciones.append(prediction_entry(match, markets['1x2']))
+                    analizados.append((match, stats, markets))
+        stage.count('matches', partidos_encontrados)
+        stage.count('predicted', len(analizados))
+    # Búsqueda de valor de todas las líneas ofrecidas (1X2, goles, hándicap, doble oportunidad) de todos los partidos
+    # a la vez, contra la mejor cuota de cada selección
+    with span('find_value_bets') as stage:
+        value_bets = find_value_bets_all_books(odds_df, {match_key(match): markets['score_matrix'] for match, _, markets in analizados})
+        stage.count('value_bets', sum(len(bets) for bets in value_bets.values()))
+    with span('build_reports') as stage:
+        informes = [generar_informe_partido(match, stats, h2h_index, markets, value_bets.get(match_key(match), [])) for match, stats, markets in analizados]
+        stage.count('reports', len(informes))
+    # Todas las predicciones del análisis se guardan de una vez
+    with span('save_predictions') as stage:
+        stage.count('saved', save_predictions(predicciones))
     if partidos_encontrados == 0:
         informe_inicial.append("\nNo se han encontrado próximos partidos con cuotas en las APIs.")
     elif not informes:
@@ -177,68 +174,32 @@ def run_analysis():
         informe_inicial.append("\n\n" + "\n\n".join(informes))
     return "\n".join(informe_inicial)
 
+@traced
 def run_review_predictions():
     """Revisa las predicciones pendientes con una lógica de búsqueda y comparación robusta."""
-    log_file = 'predictions_log.csv'
     output_log = ["--- 📖 Iniciando Revisión de Predicciones ---"]
-    try:
-        log_df = pd.read_csv(log_file)
-    except FileNotFoundError:
-        return "❌ No se encontró el diario de predicciones."
-
-    pending_predictions = log_df[log_df['status'] == 'PENDIENTE']
+    with span('load_predictions') as stage:
+        pending_predictions = load_predictions(status='PENDIENTE')
+        stage.count('pending', len(pending_predictions))
     if pending_predictions.empty: return "✅ No hay predicciones nuevas que revisar."
 
     output_log.append(f"Revisando {len(pending_predictions)} predicciones pendientes...")
-    all_scores = []
-    for league in settings.ODDS_API_LEAGUES:
-        all_scores.extend(get_recent_scores_from_api(settings.ODDS_API_KEY, league, days_ago=3))
+    with span('fetch_scores') as stage:
+        scores_by_league = fetch_scores_for_leagues(settings.ODDS_API_KEY, settings.ODDS_API_LEAGUES, days_ago=3)
+        all_scores = [score for scores in scores_by_league.values() for score in scores]
+        stage.count('scores', len(all_scores))
 
     if not all_scores: return "No se pudieron obtener resultados recientes."
 
-    aciertos, fallos = 0, 0
-    for index, row in pending_predictions.iterrows():
-        home_team_log_norm = normalize_team_name(row['home_team'])
-        away_team_log_norm = normalize_team_name(row['away_team'])
-        date_to_find = row['date'][:10]
-        
-        match_result = None
-        for s in all_scores:
-            if s.get('completed'):
-                home_team_api_norm = normalize_team_name(s.get('home_team', ''))
-                away_team_api_norm = normalize_team_name(s.get('away_team', ''))
-                api_date = s['commence_time'][:10]
-                
-                if (home_team_api_norm == home_team_log_norm and
-                    away_team_api_norm == away_team_log_norm and
-                    api_date == date_to_find):
-                    match_result = s
-                    break
-        
-        if match_result and match_result.get('scores'):
-            home_team_original_api = match_result['home_team']
-            away_team_original_api = match_result['away_team']
-            home_score = next((int(s['score']) for s in match_result['scores'] if s['name'] == home_team_original_api), None)
-            away_score = next((int(s['score']) for s in match_result['scores'] if s['name'] == away_team_original_api), None)
-
-            if home_score is not None and away_score is not None:
-                if home_score > away_score: actual_outcome = '1'
-                elif home_score == away_score: actual_outcome = 'X'
-                else: actual_outcome = '2'
+    # Cruce por equipos normalizados y fecha, construido una sola vez sobre los resultados
+    with span('reconcile_predictions') as stage:
+        revisadas = reconcile_predictions(pending_predictions, all_scores, date_tolerance_days=settings.REVIEW_DATE_TOLERANCE_DAYS)
+        stage.count('matched', len(revisadas))
+    aciertos = int(revisadas['is_correct'].sum())
 
-                log_df.loc[index, 'status'] = 'REVISADO'
-                log_df.loc[index, 'actual_outcome'] = actual_outcome
-                
-                # --- LÍNEA CORREGIDA ---
-                # Comparamos ambos valores como texto para evitar errores de tipo
-                if str(row['predicted_outcome']) == str(actual_outcome):
-                    log_df.loc[index, 'is_correct'] = True
-                    aciertos += 1
-                else:
-                    log_df.loc[index, 'is_correct'] = False
-                    fallos += 1
-
-    log_df.to_csv(log_file, index=False)
+    # Solo se actualizan las filas revisadas, en una sola transacción
+    with span('update_journal') as stage:
+        stage.count('updated', update_prediction_results(list(revisadas[['id', 'actual_outcome', 'is_correct']].itertuples(index=False, name=None))))
     output_log.append(f"\n--- Resumen de la Revisión ---\nAciertos: {aciertos} | Fallos: {len(pending_predictions) - aciertos}")
     if (len(pending_predictions)) > 0:
         precision = (aciertos / len(pending_predictions)) * 100
@@ -246,48 +207,67 @@ def run_review_predictions():
     output_log.append("✅ Diario de predicciones actualizado.")
     return "\n".join(output_log)
 
+@traced
 def run_update():
-    # ... (código sin cambios)
     output_log = ["--- 🧠 Iniciando Sistema de Aprendizaje (Actualizador de Datos) ---"]
-    league_map = {'soccer_spain_la_liga': {'file': 'data/SP1_2025_2026.csv', 'name': 'La Liga'}, 'soccer_epl': {'file': 'data/E0_2025_2026.csv', 'name': 'Premier League'}}
-    for league_key, info in league_map.items():
-        output_log.append(f"\n🔄 Buscando nuevos resultados para {info['name']}...")
-        scores = get_recent_scores_from_api(settings.ODDS_API_KEY, league_key)
-        new_results = []
-        for game in scores:
-            if game.get('completed') and game.get('scores'):
-                home_team, away_team = game['scores'][0]['name'], game['scores'][1]['name']
-                if home_team and away_team:
-                    new_results.append({'Date': datetime.fromisoformat(game['commence_time'].replace('Z', '')).strftime('%d/%m/%Y'), 'HomeTeam': home_team, 'AwayTeam': away_team, 'FTHG': int(game['scores'][0]['score']), 'FTAG': int(game['scores'][1]['score']), 'B365H': None, 'B365D': None, 'B365A': None})
-        if not new_results:
-            output_log.append("No se encontraron nuevos resultados finalizados.")
-            continue
-        try:
-            try: df = pd.read_csv(info['file'])
-            except FileNotFoundError: df = pd.DataFrame()
+    league_map = {'soccer_spain_la_liga': {'league_code': 'SP1', 'name': 'La Liga'}, 'soccer_epl': {'league_code': 'E0', 'name': 'Premier League'}}
+    with span('fetch_scores') as stage:
+        scores_by_league = fetch_scores_for_leagues(settings.ODDS_API_KEY, league_map.keys())
+        stage.count('scores', sum(len(scores) for scores in scores_by_league.values()))
+    conn = open_match_db()
+    if conn is None:
+        return "❌ No se pudo abrir la base de datos de partidos."
+    try:
+        # Nos aseguramos de que los CSV ya estén importados antes de añadir resultados
+        with span('import_csv_files') as stage:
+            stage.count('matches', import_csv_files(conn, settings.HISTORICAL_DATA_FILES + settings.CURRENT_SEASON_FILES))
+        for league_key, info in league_map.items():
+            output_log.append(f"\n🔄 Buscando nuevos resultados para {info['name']}...")
+            scores = scores_by_league[league_key]
+            new_results = []
+            for game in scores:
+                if game.get('completed') and game.get('scores'):
+                    home_team, away_team = game['scores'][0]['name'], game['scores'][1]['name']
+                    if home_team and away_team:
+                        new_results.append({'Date': datetime.fromisoformat(game['commence_time'].replace('Z', '')).strftime('%d/%m/%Y'), 'HomeTeam': home_team, 'AwayTeam': away_team, 'FTHG': int(game['scores'][0]['score']), 'FTAG': int(game['scores'][1]['score']), 'B365H': None, 'B365D': None, 'B365A': None})
+            if not new_results:
+                output_log.append("No se encontraron nuevos resultados finalizados.")
+                continue
             new_df = pd.DataFrame(new_results)
-            updated_df = pd.concat([df, new_df]).drop_duplicates(subset=['Date', 'HomeTeam', 'AwayTeam'], keep='last')
-            updated_df.to_csv(info['file'], index=False)
-            num_added = len(updated_df) - len(df)
-            output_log.append(f"✅ ¡Hecho! Se han añadido {num_added} nuevos partidos a {info['file']}.")
-        except Exception as e:
-            output_log.append(f"❌ Error al guardar los datos en el archivo CSV: {e}")
+            # Upsert en bloque: solo se escriben los partidos nuevos, sin reescribir ningún archivo
+            with span('upsert_results', league=info['league_code']) as stage:
+                num_added = upsert_results(conn, new_df, info['league_code'])
+                stage.count('matches', num_added)
+            with span('update_strength_store', league=info['league_code']):
+                add_results_to_strength_store(new_df, info['league_code'])
+            output_log.append(f"✅ ¡Hecho! Se han añadido {num_added} nuevos partidos a la base de datos ({info['league_code']}).")
+    finally:
+        conn.close()
     return "\n".join(output_log)
 
 # --- FUNCIONES DE BACKTEST CORREGIDAS ---
-def run_backtest_logic():
-    """Ejecuta el backtest de PRECISIÓN."""
-    full_df = load_and_prepare_data(settings.HISTORICAL_DATA_FILES)
+# El backtester y el simulador se importan dentro de cada función: el análisis y el informe de n8n no los necesitan
+@traced
+def run_backtest_logic(walk_forward: bool = False, progress=None, model: str = None):
+    """Ejecuta el backtest de PRECISIÓN (opcionalmente en modo walk-forward). `progress` se pasa al backtester."""
+    from src.backtester import run_backtest_sequential
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(settings.HISTORICAL_DATA_FILES)
+        stage.count('matches', len(full_df))
     if full_df.empty: return "No se encontraron datos históricos para evaluar."
     season_start_years = sorted(full_df[full_df['utc_date'].dt.month > 7]['utc_date'].dt.year.unique())
     seasons_to_test = season_start_years[1:]
     if not seasons_to_test: return "Se necesita al menos dos temporadas de datos para realizar un backtest."
-    report = run_backtest_sequential(files=settings.HISTORICAL_DATA_FILES, seasons_to_test=seasons_to_test)
+    report = run_backtest_sequential(files=settings.HISTORICAL_DATA_FILES, seasons_to_test=seasons_to_test, walk_forward=walk_forward, progress=progress, model=model)
     return report
 
-def run_financial_backtest_logic():
-    """Ejecuta el backtest FINANCIERO."""
-    full_df = load_and_prepare_data(settings.HISTORICAL_DATA_FILES)
+@traced
+def run_financial_backtest_logic(walk_forward: bool = False, progress=None, model: str = None):
+    """Ejecuta el backtest FINANCIERO (opcionalmente en modo walk-forward). `progress` se pasa al backtester."""
+    from src.backtester import run_financial_backtest_by_league
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(settings.HISTORICAL_DATA_FILES)
+        stage.count('matches', len(full_df))
     if full_df.empty: return "No se encontraron datos históricos para evaluar."
     season_start_years = sorted(full_df[full_df['utc_date'].dt.month > 7]['utc_date'].dt.year.unique())
     seasons_to_test = season_start_years[1:]
@@ -297,15 +277,82 @@ def run_financial_backtest_logic():
     latest_test_season = seasons_to_test[-1] if seasons_to_test else None
     if not latest_test_season:
         return "No hay una temporada reciente contra la que probar la rentabilidad."
-    report = run_financial_backtest_by_league(files=settings.HISTORICAL_DATA_FILES, test_season_start_year=latest_test_season)
+    report = run_financial_backtest_by_league(files=settings.HISTORICAL_DATA_FILES, test_season_start_year=latest_test_season, walk_forward=walk_forward, progress=progress, model=model)
     return report
 
-def run_flat_backtest_logic():
+@traced
+def run_flat_backtest_logic(walk_forward: bool = False, progress=None, model: str = None):
     """
     Ejecuta el backtest de Apuesta Fija.
     """
+    from src.backtester import run_flat_betting_backtest
     report = run_flat_betting_backtest(
         files=settings.HISTORICAL_DATA_FILES,
-        test_season_start_year=2024
+        test_season_start_year=2024,
+        walk_forward=walk_forward,
+        progress=progress,
+        model=model
     )
-    return report
\ No newline at end of file
+    return report
+
+@traced
+def run_strategy_sweep_logic(walk_forward: bool = False, progress=None, model: str = None):
+    """Ejecuta el barrido de estrategias (Kelly y apuesta fija) y resume las mejores combinaciones."""
+    from src.backtester import run_strategy_sweep
+    with span('load_data') as stage:
+        full_df = load_and_prepare_data(settings.HISTORICAL_DATA_FILES)
+        stage.count('matches', len(full_df))
+    if full_df.empty: return "No se encontraron datos históricos para evaluar."
+    season_start_years = sorted(full_df[full_df['utc_date'].dt.month > 7]['utc_date'].dt.year.unique())
+    seasons_to_test = season_start_years[1:]
+    if not seasons_to_test: return "Se necesita al menos dos temporadas de datos para realizar un backtest."
+    results = run_strategy_sweep(
+        files=settings.HISTORICAL_DATA_FILES,
+        test_seasons=seasons_to_test,
+        kelly_fractions=settings.SWEEP_KELLY_FRACTIONS,
+        min_edges=settings.SWEEP_MIN_EDGES,
+        stakes=settings.SWEEP_STAKES,
+        walk_forward=walk_forward,
+        log_file=settings.SWEEP_LOG_FILE,
+        progress=progress,
+        model=model
+    )
+    if results.empty: return "❌ No se pudo evaluar ninguna combinación."
+    report_log = ["="*50, "🧪 BARRIDO DE ESTRATEGIAS DE STAKING 🧪", "="*50]
+    report_log.append(f"Combinaciones evaluadas: {len(results)} (temporadas: {len(seasons_to_test)}, ligas: {results['league'].nunique()})")
+    # Sumamos el P/L de todas las ligas y temporadas para cada configuración
+    summary = results.fillna({'kelly_fraction': '-', 'stake_per_bet': '-'}).groupby(
+        ['strategy', 'kelly_fraction', 'min_edge', 'stake_per_bet'])[['profit_loss', 'bets_placed']].sum().sort_values('profit_loss', ascending=False)
+    report_log.append("\n🏆 Mejores configuraciones (P/L total en unidades):")
+    report_log.append(summary.head(10).to_string())
+    if not walk_forward:
+        report_log.append(f"\n💾 Resultados completos guardados en {settings.SWEEP_LOG_FILE}.")
+    return "\n".join(report_log)
+
+
+@traced
+def run_season_simulation_logic(progress=None, num_simulations: int = None):
+    """Simula el resto de la temporada en curso de cada liga (Monte Carlo) y resume título, plazas altas y descenso."""
+    from src.season_simulator import simulate_leagues
+    if progress: progress(0.0, "Cargando modelo...")
+    with span('load_analysis_model'):
+        model = load_analysis_model()
+    if isinstance(model, str): return model
+    num_simulations = num_simulations or settings.SEASON_SIM_NUM_SIMULATIONS
+    if progress: progress(0.2, f"Simulando {num_simulations} temporadas por liga...")
+    with span('simulate_leagues') as stage:
+        results = simulate_leagues(model['matches_df'], model['league_stats'], num_simulations=num_simulations)
+        stage.count('leagues', len(results))
+        stage.count('simulations', num_simulations * len(results))
+    report_log = ["="*50, "🏆 SIMULACIÓN DE LA TEMPORADA (MONTE CARLO) 🏆", "="*50]
+    for league_code, result in results.items():
+        if result['num_remaining'] == 0:
+            report_log.append(f"\n--- {league_code}: temporada terminada, no quedan partidos por simular. ---")
+            continue
+        report_log.append(f"\n--- {league_code}: {result['num_simulations']} simulaciones de {result['num_remaining']} partidos pendientes ---")
+        table = result['table'].rename(columns={'played': 'PJ', 'points': 'Pts', 'expected_points': 'Pts esperados',
+                                                'title': 'Título %', 'top': f'Top {settings.SEASON_SIM_TOP_PLACES} %', 'relegation': 'Descenso %'})
+        table[table.columns[3:]] *= 100
+        report_log.append(table.round(1).to_string())
+    if len(report_log) == 3: return "❌ No hay partidos de la temporada en curso para simular."
+    return "\n".join(report_log)
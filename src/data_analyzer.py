@@ -1,6 +1,7 @@
 # src/data_analyzer.py (Versión Corregida Final)
+import numpy as np
 import pandas as pd
-from src.utils import normalize_team_name # Asegúrate de que esta importación esté
+from src.team_registry import normalize_team_column, get_team_ids, get_team_registry
 
 def calculate_team_strengths(df: pd.DataFrame):
     """
@@ -13,14 +14,14 @@ def calculate_team_strengths(df: pd.DataFrame):
     if df.empty:
         return None
 
-    df['home_team_name'] = df['home_team_name'].apply(normalize_team_name)
-    df['away_team_name'] = df['away_team_name'].apply(normalize_team_name)
+    df['home_team_name'] = normalize_team_column(df['home_team_name'])
+    df['away_team_name'] = normalize_team_column(df['away_team_name'])
     
     avg_home_goals = df['home_team_score'].mean()
     avg_away_goals = df['away_team_score'].mean()
     
-    home_stats = df.groupby('home_team_name').agg(avg_scored=('home_team_score', 'mean'), avg_conceded=('away_team_score', 'mean')).rename_axis('team')
-    away_stats = df.groupby('away_team_name').agg(avg_scored=('away_team_score', 'mean'), avg_conceded=('home_team_score', 'mean')).rename_axis('team')
+    home_stats = df.groupby('home_team_name', observed=True).agg(avg_scored=('home_team_score', 'mean'), avg_conceded=('away_team_score', 'mean')).rename_axis('team')
+    away_stats = df.groupby('away_team_name', observed=True).agg(avg_scored=('away_team_score', 'mean'), avg_conceded=('home_team_score', 'mean')).rename_axis('team')
     
     # Nos aseguramos de que ambos equipos tengan estadísticas de local y visitante para evitar errores
     common_teams = home_stats.index.intersection(away_stats.index)
@@ -36,30 +37,114 @@ def calculate_team_strengths(df: pd.DataFrame):
     
     return {'league_avg_home_goals': avg_home_goals, 'league_avg_away_goals': avg_away_goals, 'team_strengths': team_strengths.to_dict('index')}
 
-def get_h2h_stats(df, team1_norm: str, team2_norm: str) -> dict:
+def build_h2h_index(df: pd.DataFrame) -> dict:
     """
-    Calcula las estadísticas de enfrentamientos directos (H2H) entre dos equipos.
+    Construye un índice de enfrentamientos directos para consultarlos sin recorrer todo el DataFrame.
+
+    La clave es la pareja de equipos (ya normalizados) ordenada alfabéticamente, así que
+    (A, B) y (B, A) comparten entrada. Cada entrada guarda las victorias, empates y goles
+    de cada equipo y las posiciones (iloc) de los partidos en `df`, ordenadas por fecha.
+
+    Args:
+        df (pd.DataFrame): Partidos con los nombres de los equipos ya normalizados.
+
+    Returns:
+        dict: {(equipo_a, equipo_b): entrada}, con equipo_a < equipo_b.
+    """
+    if df.empty:
+        return {}
+    home = df['home_team_name'].to_numpy(dtype=object)
+    away = df['away_team_name'].to_numpy(dtype=object)
+    home_score = df['home_team_score'].to_numpy(dtype=float)
+    away_score = df['away_team_score'].to_numpy(dtype=float)
+    swap = home > away
+    pairs = pd.DataFrame({
+        'team_a': np.where(swap, away, home), 'team_b': np.where(swap, home, away),
+        'goals_a': np.where(swap, away_score, home_score), 'goals_b': np.where(swap, home_score, away_score),
+        'utc_date': pd.to_datetime(df['utc_date']).to_numpy(), 'row': np.arange(len(df))
+    }).sort_values('utc_date', kind='stable')
+    pairs['team_a_win'] = pairs['goals_a'] > pairs['goals_b']
+    pairs['team_b_win'] = pairs['goals_b'] > pairs['goals_a']
+    pairs['draw'] = pairs['goals_a'] == pairs['goals_b']
+
+    # Totales con un solo groupby; luego cada entrada solo recoge sus posiciones
+    grouped = pairs.groupby(['team_a', 'team_b'], sort=False)
+    totals = grouped[['team_a_win', 'team_b_win', 'draw', 'goals_a', 'goals_b']].sum()
+    rows, goals_a, goals_b = pairs['row'].to_numpy(), pairs['goals_a'].to_numpy(), pairs['goals_b'].to_numpy()
+    positions_by_pair = grouped.indices
+    h2h_index = {}
+    for key, a_wins, b_wins, draws, a_goals, b_goals in zip(totals.index, *(totals[c].to_numpy() for c in totals.columns)):
+        positions = positions_by_pair[key]
+        h2h_index[key] = {
+            'rows': rows[positions],
+            'goals_a': goals_a[positions],
+            'goals_b': goals_b[positions],
+            'team_a_wins': int(a_wins),
+            'team_b_wins': int(b_wins),
+            'draws': int(draws),
+            'team_a_goals': float(a_goals),
+            'team_b_goals': float(b_goals)
+        }
+    return h2h_index
+
+def get_h2h_stats(h2h_index: dict, team1_norm: str, team2_norm: str, last_n: int = None) -> dict:
     """
-    h2h_df = df[((df['home_team_name'] == team1_norm) & (df['away_team_name'] == team2_norm)) | 
-                ((df['home_team_name'] == team2_norm) & (df['away_team_name'] == team1_norm))]
+    Devuelve las estadísticas de enfrentamientos directos (H2H) entre dos equipos a partir del índice.
 
-    if h2h_df.empty:
+    Args:
+        h2h_index (dict): La salida de `build_h2h_index`.
+        last_n (int): Si se indica, solo cuentan los últimos `last_n` enfrentamientos.
+
+    Returns:
+        dict: Partidos, victorias de cada equipo, empates, goles y posiciones de los partidos.
+    """
+    swapped = team1_norm > team2_norm
+    entry = h2h_index.get((team2_norm, team1_norm) if swapped else (team1_norm, team2_norm))
+    if entry is None:
         return {'total_matches': 0}
 
-    team1_wins = len(h2h_df[((h2h_df['home_team_name'] == team1_norm) & (h2h_df['home_team_score'] > h2h_df['away_team_score'])) |
-                           ((h2h_df['away_team_name'] == team1_norm) & (h2h_df['away_team_score'] > h2h_df['home_team_score']))])
-    
-    team2_wins = len(h2h_df[((h2h_df['home_team_name'] == team2_norm) & (h2h_df['home_team_score'] > h2h_df['away_team_score'])) |
-                           ((h2h_df['away_team_name'] == team2_norm) & (h2h_df['away_team_score'] > h2h_df['home_team_score']))])
+    if last_n is not None and last_n < len(entry['rows']):
+        goals_a, goals_b = entry['goals_a'][-last_n:], entry['goals_b'][-last_n:]
+        entry = {'rows': entry['rows'][-last_n:], 'team_a_wins': int((goals_a > goals_b).sum()),
+                 'team_b_wins': int((goals_b > goals_a).sum()), 'draws': int((goals_a == goals_b).sum()),
+                 'team_a_goals': float(goals_a.sum()), 'team_b_goals': float(goals_b.sum())}
 
-    draws = len(h2h_df[h2h_df['home_team_score'] == h2h_df['away_team_score']])
-    
+    team1, team2 = ('b', 'a') if swapped else ('a', 'b')
     return {
-        'total_matches': len(h2h_df),
-        'team1_wins': team1_wins,
-        'team2_wins': team2_wins,
-        'draws': draws
+        'total_matches': len(entry['rows']),
+        'team1_wins': entry[f'team_{team1}_wins'],
+        'team2_wins': entry[f'team_{team2}_wins'],
+        'draws': entry['draws'],
+        'team1_goals': entry[f'team_{team1}_goals'],
+        'team2_goals': entry[f'team_{team2}_goals'],
+        'match_rows': entry['rows'].tolist()
     }
 
+def calculate_expected_goals(stats: dict, home_teams, away_teams):
+    """
+    Calcula los goles esperados de muchos partidos a la vez a partir de las fuerzas de los equipos.
 
+    Args:
+        stats (dict): La salida de `calculate_team_strengths`.
+        home_teams (array-like): Nombres de los equipos locales (se normalizan y se pasan a ids del registro aquí).
+        away_teams (array-like): Nombres de los equipos visitantes.
 
+    Returns:
+        tuple: (goles esperados local, goles esperados visitante, máscara de partidos con ambos equipos conocidos),
+        los tres como arrays de NumPy. Los partidos desconocidos tienen NaN como goles esperados.
+    """
+    home_ids, away_ids = get_team_ids(home_teams), get_team_ids(away_teams)
+    # Tabla de fuerzas indexada por el id del registro (NaN para los equipos sin datos)
+    strength_columns = ['attack_strength_home', 'defense_strength_home', 'attack_strength_away', 'defense_strength_away']
+    strengths_df = pd.DataFrame.from_dict(stats['team_strengths'], orient='index')[strength_columns]
+    # Los ids se resuelven antes de dimensionar la tabla: pueden dar de alta equipos nuevos en el registro
+    strength_ids = get_team_ids(strengths_df.index)
+    strengths = np.full((len(get_team_registry()['teams']) + 1, len(strength_columns)), np.nan)
+    strengths[strength_ids] = strengths_df.to_numpy()
+    # El id -1 (nombre nulo) cae en la última fila, que siempre es NaN
+    home = strengths[home_ids]
+    away = strengths[away_ids]
+    expected_home = home[:, 0] * away[:, 3] * stats['league_avg_home_goals']
+    expected_away = away[:, 2] * home[:, 1] * stats['league_avg_away_goals']
+    known = ~(np.isnan(expected_home) | np.isnan(expected_away))
+    return expected_home, expected_away, known
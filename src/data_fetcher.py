@@ -1,37 +1,244 @@
 # src/data_fetcher.py
-import requests
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from config import settings
 
-def get_future_odds_from_api(api_key: str, league: str, regions: str, markets: str, hours_ahead: int):
-    """Pide a The Odds API las cuotas para un rango de tiempo futuro."""
-    time_now = datetime.now(timezone.utc)
-    time_future = time_now + timedelta(hours=hours_ahead)
-    commence_time_from = time_now.strftime('%Y-%m-%dT%H:%M:%SZ')
-    commence_time_to = time_future.strftime('%Y-%m-%dT%H:%M:%SZ')
+_session = None
+
+def get_session() -> 'requests.Session':
+    """
+    Devuelve la sesión HTTP compartida (se crea la primera vez).
+    Reutiliza las conexiones keep-alive con The Odds API y reintenta los errores temporales.
+    """
+    global _session
+    if _session is None:
+        # requests se importa al hacer la primera petición: con la caché al día no hace falta
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=settings.API_MAX_RETRIES, backoff_factor=0.5,
+                      status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=settings.API_MAX_WORKERS, pool_maxsize=settings.API_MAX_WORKERS, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _session = session
+    return _session
+
+# --- CACHÉ DE RESPUESTAS Y CUOTA ---
+# Métricas de la sesión actual; la cuota (cabeceras x-requests-*) también se guarda en disco
+_metrics = {'api_calls': 0, 'api_errors': 0, 'cache_hits': 0, 'stale_hits': 0, 'cache_misses': 0,
+            'requests_remaining': None, 'requests_used': None, 'last_request_cost': None, 'quota_updated_at': None}
+_metrics_lock = threading.Lock()
+_refreshing = set() # Entradas que se están revalidando en segundo plano
 
-    uri = f"https://api.the-odds-api.com/v4/sports/{league}/odds"
-    params = {'apiKey': api_key, 'regions': regions, 'markets': markets, 'oddsFormat': 'decimal', 'commenceTimeFrom': commence_time_from, 'commenceTimeTo': commence_time_to}
-    
+def _count(metric: str):
+    with _metrics_lock:
+        _metrics[metric] += 1
+
+def _quota_file() -> str:
+    return os.path.join(settings.API_CACHE_DIR, 'quota.json')
+
+def _write_json_atomic(path: str, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _record_quota(headers):
+    """Guarda la cuota que informa The Odds API en las cabeceras de la respuesta."""
+    def _header_int(name):
+        try:
+            return int(float(headers.get(name)))
+        except (TypeError, ValueError):
+            return None
+    quota = {'requests_remaining': _header_int('x-requests-remaining'), 'requests_used': _header_int('x-requests-used'),
+             'last_request_cost': _header_int('x-requests-last'), 'quota_updated_at': time.time()}
+    with _metrics_lock:
+        _metrics.update(quota)
     try:
-        response = requests.get(uri, params=params)
-        response.raise_for_status()
-        print(f"Peticiones restantes a The Odds API: {response.headers.get('x-requests-remaining')}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con The Odds API (cuotas): {e}")
-        return []
+        _write_json_atomic(_quota_file(), quota)
+    except OSError as e:
+        print(f"Error al guardar la cuota de The Odds API: {e}", file=sys.stderr)
 
-def get_recent_scores_from_api(api_key: str, league: str, days_ago: int = 3):
-    """NUEVA FUNCIÓN: Pide a The Odds API los resultados de partidos recientes."""
-    uri = f"https://api.the-odds-api.com/v4/sports/{league}/scores"
-    params = {'apiKey': api_key, 'daysFrom': days_ago}
-    
+def get_api_metrics() -> dict:
+    """
+    Devuelve las métricas de la caché y la última cuota conocida de The Odds API.
+    Si en esta sesión aún no se ha hecho ninguna petición, la cuota se lee del disco.
+    """
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    if metrics['quota_updated_at'] is None and os.path.exists(_quota_file()):
+        try:
+            with open(_quota_file(), encoding='utf-8') as f:
+                metrics.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+    return metrics
+
+def _get_json(uri: str, params: dict, error_label: str):
+    """
+    Hace la petición GET con la sesión compartida y devuelve el JSON (o None si falla).
+    Los mensajes de este módulo van a stderr: un refresco en segundo plano puede imprimir cuando quien
+    pidió los datos ya está escribiendo su salida (reporter.py entrega el JSON por stdout).
+    """
+    import requests
+    _count('api_calls')
     try:
-        response = requests.get(uri, params=params)
+        response = get_session().get(uri, params=params, timeout=settings.API_TIMEOUT)
         response.raise_for_status()
-        print(f"Peticiones restantes a The Odds API: {response.headers.get('x-requests-remaining')}")
+        _record_quota(response.headers)
+        print(f"Peticiones restantes a The Odds API: {response.headers.get('x-requests-remaining')}", file=sys.stderr)
         return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con The Odds API (resultados): {e}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        _count('api_errors')
+        print(f"Error al conectar con The Odds API ({error_label}): {e}", file=sys.stderr)
+        return None
+
+def _cache_path(endpoint: str, key_parts: dict) -> str:
+    """Archivo de caché para una consulta (la clave de la API no forma parte de la clave)."""
+    key = json.dumps([endpoint, key_parts], sort_keys=True)
+    return os.path.join(settings.API_CACHE_DIR, f"{endpoint}_{hashlib.sha1(key.encode()).hexdigest()[:16]}.json")
+
+def _read_cache(path: str):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _fetch_and_store(path: str, uri: str, build_params, error_label: str):
+    """Pide los datos a la API y, si la respuesta es válida, la guarda en la caché."""
+    data = _get_json(uri, build_params(), error_label)
+    if data is not None:
+        try:
+            _write_json_atomic(path, {'fetched_at': time.time(), 'data': data})
+        except OSError as e:
+            print(f"Error al guardar la caché de The Odds API {path}: {e}", file=sys.stderr)
+    return data
+
+def _revalidate_in_background(path: str, uri: str, build_params, error_label: str):
+    """
+    Refresca una entrada caducada sin hacer esperar a quien la ha pedido.
+    El hilo no es daemon: al terminar un script (main.py, updater.py, reporter.py) Python espera a que
+    acabe el refresco (como mucho el timeout de la petición) en lugar de cortarlo y dejar la copia caducada.
+    """
+    with _metrics_lock:
+        if path in _refreshing:
+            return
+        _refreshing.add(path)
+    def _refresh():
+        try:
+            _fetch_and_store(path, uri, build_params, error_label)
+        finally:
+            with _metrics_lock:
+                _refreshing.discard(path)
+    threading.Thread(target=_refresh, daemon=False, name='odds-api-refresh').start()
+
+def _cached_get_json(endpoint: str, key_parts: dict, uri: str, build_params, error_label: str) -> list:
+    """
+    Devuelve la respuesta de la API pasando por la caché en disco.
+
+    - Más reciente que el TTL del endpoint: se usa la copia guardada, sin red.
+    - Caducada pero dentro de la ventana "stale": se devuelve la copia y se refresca en segundo plano.
+    - Más antigua (o inexistente): se pide a la API; si falla, se usa la copia caducada si la hay.
+
+    `build_params` es una función porque los parámetros (ej. la ventana de fechas) se calculan al pedir.
+    """
+    ttl = settings.API_CACHE_TTL.get(endpoint, 0)
+    path = _cache_path(endpoint, key_parts)
+    entry = _read_cache(path) if ttl > 0 else None
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age < ttl:
+            _count('cache_hits')
+            return entry['data']
+        if age < ttl + settings.API_CACHE_STALE.get(endpoint, 0):
+            _count('stale_hits')
+            _revalidate_in_background(path, uri, build_params, error_label)
+            return entry['data']
+
+    _count('cache_misses')
+    data = _fetch_and_store(path, uri, build_params, error_label)
+    if data is None:
+        if entry is not None:
+            print(f"Usando la copia guardada de The Odds API ({error_label}).", file=sys.stderr)
+            return entry['data']
         return []
-    
+    return data
+
+def _window_start(now: datetime) -> datetime:
+    """Inicio del tramo de `settings.API_CACHE_WINDOW_SECONDS` segundos al que pertenece `now`."""
+    timestamp = now.timestamp()
+    return datetime.fromtimestamp(timestamp - timestamp % settings.API_CACHE_WINDOW_SECONDS, timezone.utc)
+
+def odds_cache_key(league: str, regions: str, markets: str, hours_ahead: int, now: datetime = None) -> dict:
+    """Clave de caché de una consulta de cuotas hecha en `now` (None = ahora): incluye el tramo horario."""
+    window_start = _window_start(now or datetime.now(timezone.utc))
+    return {'league': league, 'regions': regions, 'markets': markets, 'hours_ahead': hours_ahead,
+            'window_start': window_start.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+def scores_cache_key(league: str, days_ago: int, now: datetime = None) -> dict:
+    """Clave de caché de una consulta de resultados hecha en `now` (None = ahora): incluye el día."""
+    return {'league': league, 'days_ago': days_ago, 'date': (now or datetime.now(timezone.utc)).strftime('%Y-%m-%d')}
+
+def get_future_odds_from_api(api_key: str, league: str, regions: str, markets: str, hours_ahead: int):
+    """Pide a The Odds API las cuotas para un rango de tiempo futuro."""
+    time_now = datetime.now(timezone.utc)
+    # La ventana de fechas se mueve cada segundo: la caché se guarda por tramos (`odds_cache_key`) y cada
+    # petición pide la ventana hasta el final de su tramo, así que la copia de un tramo vale para cualquier
+    # consulta hecha en él y los partidos que entran en la ventana aparecen en cuanto empieza el tramo siguiente
+    key_parts = odds_cache_key(league, regions, markets, hours_ahead, time_now)
+    window_end = _window_start(time_now) + timedelta(seconds=settings.API_CACHE_WINDOW_SECONDS, hours=hours_ahead)
+    def build_params():
+        commence_time_from = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        commence_time_to = window_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+        return {'apiKey': api_key, 'regions': regions, 'markets': markets, 'oddsFormat': 'decimal', 'commenceTimeFrom': commence_time_from, 'commenceTimeTo': commence_time_to}
+
+    uri = f"{settings.ODDS_API_URL}/sports/{league}/odds"
+    matches = _cached_get_json('odds', key_parts, uri, build_params, 'cuotas')
+    # Una copia guardada puede incluir partidos que ya han empezado, y la respuesta llega hasta el final del tramo
+    now = datetime.now(timezone.utc)
+    time_from, time_to = now.strftime('%Y-%m-%dT%H:%M:%SZ'), (now + timedelta(hours=hours_ahead)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return [m for m in matches if time_from <= m.get('commence_time', time_from) <= time_to]
+
+def get_recent_scores_from_api(api_key: str, league: str, days_ago: int = 3):
+    """Pide a The Odds API los resultados de partidos recientes."""
+    uri = f"{settings.ODDS_API_URL}/sports/{league}/scores"
+    # `daysFrom` cuenta desde hoy: una copia de ayer no cubre los mismos días
+    key_parts = scores_cache_key(league, days_ago)
+    return _cached_get_json('scores', key_parts, uri, lambda: {'apiKey': api_key, 'daysFrom': days_ago}, 'resultados')
+
+def _fetch_for_leagues(fetch, api_key: str, leagues: list, *args) -> dict:
+    """Lanza `fetch(api_key, league, ...)` para todas las ligas a la vez y devuelve {liga: resultado}."""
+    leagues = list(leagues)
+    if not leagues:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(settings.API_MAX_WORKERS, len(leagues))) as executor:
+        results = executor.map(lambda league: fetch(api_key, league, *args), leagues)
+        return dict(zip(leagues, results))
+
+def fetch_odds_for_leagues(api_key: str, leagues: list, regions: str, markets: str, hours_ahead: int) -> dict:
+    """
+    Pide las cuotas de todas las ligas en paralelo.
+
+    Returns:
+        dict: {clave de liga: lista de partidos}, en el mismo orden que `leagues`.
+    """
+    return _fetch_for_leagues(get_future_odds_from_api, api_key, leagues, regions, markets, hours_ahead)
+
+def fetch_scores_for_leagues(api_key: str, leagues: list, days_ago: int = 3) -> dict:
+    """
+    Pide los resultados recientes de todas las ligas en paralelo.
+
+    Returns:
+        dict: {clave de liga: lista de partidos}, en el mismo orden que `leagues`.
+    """
+    return _fetch_for_leagues(get_recent_scores_from_api, api_key, leagues, days_ago)
@@ -1,9 +1,25 @@
 # src/database_manager.py
 
+"""
+Almacén de partidos en SQLite (`settings.MATCH_DB_FILE`).
+
+Los CSV de football-data se importan una sola vez (y de nuevo solo si cambian) y los
+resultados nuevos se insertan con upserts en bloque, sin reescribir ningún archivo.
+Los nombres de los equipos se guardan ya normalizados, así que un mismo partido escrito
+con nombres distintos (CSV y The Odds API) ocupa una sola fila.
+"""
+
+import os
 import sqlite3
 from sqlite3 import Error
+import pandas as pd
+from config import settings
+from src.utils import REQUIRED_COLUMNS, read_and_prepare_csv
+from src.team_registry import normalize_team_column
+
+# Columnas que escribimos y leemos (el resto de la tabla es del formato antiguo de API-Football)
+MATCH_COLUMNS = ['league_code', 'utc_date', 'home_team_name', 'away_team_name', 'home_team_score', 'away_team_score', 'home_win_odds', 'draw_odds', 'away_win_odds']
 
-# ... (la función create_connection y create_table se quedan igual) ...
 def create_connection(db_file: str):
     conn = None
     try:
@@ -36,33 +52,200 @@ def create_table(conn: sqlite3.Connection):
     except Error as e:
         print(e)
 
+def create_indexes(conn: sqlite3.Connection):
+    """Crea la clave única de cada partido, los índices de consulta y la tabla de CSV importados."""
+    statements = [
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_key ON matches (league_code, utc_date, home_team_name, away_team_name)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_date ON matches (utc_date)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_home ON matches (home_team_name)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_away ON matches (away_team_name)",
+        "CREATE TABLE IF NOT EXISTS imported_files (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL)"
+    ]
+    try:
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+    except Error as e:
+        print(e)
+
+def open_match_db(db_file: str = None):
+    """Abre la base de datos de partidos y se asegura de que existan la tabla y los índices."""
+    db_file = db_file or settings.MATCH_DB_FILE
+    os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+    conn = create_connection(db_file)
+    if conn is not None:
+        create_table(conn)
+        create_indexes(conn)
+    return conn
+
+def _count_matches(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+def _match_rows(matches_df: pd.DataFrame) -> list:
+    """Convierte partidos en nuestro formato en filas para la tabla."""
+    df = matches_df[MATCH_COLUMNS].copy()
+    df['utc_date'] = pd.to_datetime(df['utc_date']).dt.strftime('%Y-%m-%d')
+    df['home_team_name'] = normalize_team_column(df['home_team_name']).astype(object)
+    df['away_team_name'] = normalize_team_column(df['away_team_name']).astype(object)
+    df['home_team_score'] = df['home_team_score'].astype(int)
+    df['away_team_score'] = df['away_team_score'].astype(int)
+    # NaN -> NULL
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+def _upsert_rows(conn: sqlite3.Connection, rows: list):
+    """Inserta o actualiza filas (sin confirmar la transacción)."""
+    conn.executemany(
+        f"""INSERT INTO matches (status, {', '.join(MATCH_COLUMNS)}) VALUES ('FT', {', '.join('?' * len(MATCH_COLUMNS))})
+            ON CONFLICT (league_code, utc_date, home_team_name, away_team_name) DO UPDATE SET
+                home_team_score = excluded.home_team_score,
+                away_team_score = excluded.away_team_score,
+                home_win_odds = COALESCE(excluded.home_win_odds, matches.home_win_odds),
+                draw_odds = COALESCE(excluded.draw_odds, matches.draw_odds),
+                away_win_odds = COALESCE(excluded.away_win_odds, matches.away_win_odds)""",
+        rows)
+
+def upsert_matches(conn: sqlite3.Connection, matches_df: pd.DataFrame) -> int:
+    """
+    Inserta (o actualiza) partidos en nuestro formato en una sola transacción.
+    Si el partido ya existe se actualiza el resultado; las cuotas guardadas solo se sustituyen por otras no nulas.
+
+    Returns:
+        int: El número de partidos nuevos.
+    """
+    if matches_df.empty:
+        return 0
+    rows = _match_rows(matches_df)
+    try:
+        with conn:
+            num_before = _count_matches(conn)
+            _upsert_rows(conn, rows)
+            return _count_matches(conn) - num_before
+    except Error as e:
+        print(f"Error al guardar los partidos en la base de datos: {e}")
+        return 0
+
+def upsert_results(conn: sqlite3.Connection, results_df: pd.DataFrame, league_code: str) -> int:
+    """
+    Como `upsert_matches`, pero con resultados en formato football-data ('Date', 'HomeTeam', 'FTHG'...),
+    como los que construyen `run_update` y `updater.py`.
+    """
+    matches_df = results_df.rename(columns=REQUIRED_COLUMNS).assign(league_code=league_code)
+    matches_df['utc_date'] = pd.to_datetime(matches_df['utc_date'], dayfirst=True)
+    return upsert_matches(conn, matches_df)
+
+def import_csv_files(conn: sqlite3.Connection, files: list) -> int:
+    """
+    Importa los CSV de football-data que aún no estén en la base de datos o que hayan cambiado
+    desde la última importación (según su mtime y tamaño).
+
+    Returns:
+        int: El número de partidos nuevos.
+    """
+    imported = {path: (mtime_ns, size) for path, mtime_ns, size in conn.execute("SELECT path, mtime_ns, size FROM imported_files")}
+    num_added = 0
+    for file_path in files:
+        if not os.path.exists(file_path):
+            continue
+        file_stat = os.stat(file_path)
+        key = os.path.normpath(file_path)
+        if imported.get(key) == (file_stat.st_mtime_ns, file_stat.st_size):
+            continue
+        try:
+            rows = _match_rows(read_and_prepare_csv(file_path, require_odds=False))
+            with conn:
+                num_before = _count_matches(conn)
+                _upsert_rows(conn, rows)
+                conn.execute("INSERT OR REPLACE INTO imported_files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                             (key, file_stat.st_mtime_ns, file_stat.st_size))
+                num_added += _count_matches(conn) - num_before
+        except Exception as e:
+            print(f"Error importando el archivo {file_path} a la base de datos: {e}")
+    return num_added
+
+def load_matches(conn: sqlite3.Connection, leagues: list = None, date_from=None, date_to=None) -> pd.DataFrame:
+    """
+    Lee partidos de la base de datos en el formato de `load_and_prepare_data`.
+
+    Args:
+        leagues (list): Códigos de liga ('SP1', 'E0'...). None = todas.
+        date_from: Primera fecha incluida. None = sin límite.
+        date_to: Fecha límite (excluida). None = sin límite.
+    """
+    if leagues is not None and len(leagues) == 0:
+        return pd.DataFrame()
+    conditions, params = ["home_team_score IS NOT NULL"], []
+    if leagues is not None:
+        conditions.append(f"league_code IN ({', '.join('?' * len(leagues))})")
+        params.extend(leagues)
+    if date_from is not None:
+        conditions.append("utc_date >= ?")
+        params.append(pd.Timestamp(date_from).strftime('%Y-%m-%d'))
+    if date_to is not None:
+        conditions.append("utc_date < ?")
+        params.append(pd.Timestamp(date_to).strftime('%Y-%m-%d'))
+    query = f"""SELECT utc_date, home_team_name, away_team_name, home_team_score, away_team_score,
+                       home_win_odds, draw_odds, away_win_odds, league_code
+                FROM matches WHERE {' AND '.join(conditions)} ORDER BY utc_date, id"""
+    try:
+        df = pd.read_sql_query(query, conn, params=params)
+    except Exception as e:
+        print(f"Error leyendo los partidos de la base de datos: {e}")
+        return pd.DataFrame()
+    if df.empty:
+        return pd.DataFrame()
+    # Las filas antiguas de API-Football guardan la hora; nos quedamos con el día, como en los CSV
+    df['utc_date'] = pd.to_datetime(df['utc_date'].str[:10])
+    df['home_team_name'] = normalize_team_column(df['home_team_name'])
+    df['away_team_name'] = normalize_team_column(df['away_team_name'])
+    return df
+
+def load_matches_from_db(files: list, leagues: list = None, date_from=None, date_to=None, db_file: str = None) -> pd.DataFrame:
+    """
+    Importa los CSV que falten y devuelve los partidos de las ligas y fechas pedidas.
+    Es la alternativa a `load_and_prepare_data` para los análisis.
+    """
+    conn = open_match_db(db_file)
+    if conn is None:
+        return pd.DataFrame()
+    try:
+        import_csv_files(conn, files)
+        return load_matches(conn, leagues, date_from, date_to)
+    finally:
+        conn.close()
+
 def insert_match(conn: sqlite3.Connection, match: dict, league_id: int):
     """
     Inserta un partido de API-Football en la tabla.
     """
+    insert_api_football_matches(conn, [match], league_id)
+
+def insert_api_football_matches(conn: sqlite3.Connection, matches: list, league_id: int):
+    """
+    Inserta partidos de API-Football en la tabla, todos en una sola transacción.
+    """
     # La tabla se queda igual, así que solo adaptamos la extracción de datos
     sql = '''INSERT OR IGNORE INTO matches(id, league_code, matchday, utc_date, status, home_team_name, away_team_name, home_team_score, away_team_score)
              VALUES(?,?,?,?,?,?,?,?,?)'''
 
-    cur = conn.cursor()
-
-    fixture = match.get('fixture', {})
-    teams = match.get('teams', {})
-    goals = match.get('goals', {})
-
-    # La tabla tiene columnas de cuotas, pero las dejaremos vacías (NULL)
-    match_data = (
-        fixture.get('id'),
-        league_id, # Usamos el ID de la liga
-        match.get('league', {}).get('round'),
-        fixture.get('date'),
-        fixture.get('status', {}).get('short'),
-        teams.get('home', {}).get('name'),
-        teams.get('away', {}).get('name'),
-        goals.get('home'),
-        goals.get('away')
-    )
+    rows = []
+    for match in matches:
+        fixture = match.get('fixture', {})
+        teams = match.get('teams', {})
+        goals = match.get('goals', {})
 
-    cur.execute(sql, match_data)
-    conn.commit()
+        # La tabla tiene columnas de cuotas, pero las dejaremos vacías (NULL)
+        rows.append((
+            fixture.get('id'),
+            league_id, # Usamos el ID de la liga
+            match.get('league', {}).get('round'),
+            fixture.get('date'),
+            fixture.get('status', {}).get('short'),
+            teams.get('home', {}).get('name'),
+            teams.get('away', {}).get('name'),
+            goals.get('home'),
+            goals.get('away')
+        ))
 
+    with conn:
+        conn.executemany(sql, rows)
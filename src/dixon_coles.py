@@ -0,0 +1,234 @@
+# src/dixon_coles.py
+
+"""
+Modelo de Poisson ajustado por máxima verosimilitud (Dixon-Coles).
+
+Para cada partido:
+    log(goles esperados local)     = intercepto + ventaja_local + ataque[local] + defensa[visitante]
+    log(goles esperados visitante) = intercepto + ataque[visitante] + defensa[local]
+
+opcionalmente con la corrección de Dixon-Coles (rho) para los marcadores 0-0, 0-1, 1-0 y 1-1
+y con pesos que decaen con la antigüedad de cada partido (exp(-xi * días)).
+
+La verosimilitud y su gradiente se calculan de forma analítica y vectorizada sobre todos los
+partidos a la vez, y se optimizan con L-BFGS. Un ajuste puede arrancar desde el anterior
+(`init`), así que reajustar cada día solo necesita unas pocas iteraciones.
+
+Las fuerzas resultantes se devuelven en el mismo formato que `calculate_team_strengths`
+(más la clave 'rho'), así que sirven tal cual para `predict_fixtures`, los backtests y los informes.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from config import settings
+from src.team_registry import get_team_ids, get_team_names
+
+RHO_BOUNDS = (-0.2, 0.2)
+
+def _negative_log_likelihood(params: np.ndarray, data: dict, num_teams: int, use_rho: bool, l2_penalty: float):
+    """Log-verosimilitud negativa (media ponderada) y su gradiente."""
+    intercept, home_advantage = params[0], params[1]
+    attack, defense = params[2:2 + num_teams], params[2 + num_teams:2 + 2 * num_teams]
+    rho = params[-1] if use_rho else 0.0
+    home, away, home_goals, away_goals, weights = data['home'], data['away'], data['home_goals'], data['away_goals'], data['weights']
+
+    log_home = intercept + home_advantage + attack[home] + defense[away]
+    log_away = intercept + attack[away] + defense[home]
+    lambda_home, lambda_away = np.exp(log_home), np.exp(log_away)
+
+    # Poisson (sin el término log(k!), que no depende de los parámetros)
+    log_likelihood = home_goals * log_home - lambda_home + away_goals * log_away - lambda_away
+    grad_log_home = home_goals - lambda_home
+    grad_log_away = away_goals - lambda_away
+    grad_rho = 0.0
+
+    if use_rho:
+        # tau solo es distinto de 1 en los cuatro marcadores bajos, así que solo se calcula para esos partidos
+        low, is_0_0, is_0_1, is_1_0 = data['low_score'], data['is_0_0'], data['is_0_1'], data['is_1_0']
+        low_home, low_away = lambda_home[low], lambda_away[low]
+        both = low_home * low_away
+        tau = np.where(is_0_0, 1 - both * rho, np.where(is_0_1, 1 + low_home * rho, np.where(is_1_0, 1 + low_away * rho, 1 - rho)))
+        tau = np.maximum(tau, 1e-10)
+        # Derivadas de tau respecto a log(lambda) y a rho
+        d_tau_home = np.where(is_0_0, -both * rho, np.where(is_0_1, low_home * rho, 0.0))
+        d_tau_away = np.where(is_0_0, -both * rho, np.where(is_1_0, low_away * rho, 0.0))
+        d_tau_rho = np.where(is_0_0, -both, np.where(is_0_1, low_home, np.where(is_1_0, low_away, -1.0)))
+        log_likelihood[low] += np.log(tau)
+        grad_log_home[low] += d_tau_home / tau
+        grad_log_away[low] += d_tau_away / tau
+        grad_rho = np.dot(weights[low], d_tau_rho / tau)
+
+    total_weight = data['total_weight']
+    grad_log_home = weights * grad_log_home
+    grad_log_away = weights * grad_log_away
+    grad = np.empty_like(params)
+    grad[0] = grad_log_home.sum() + grad_log_away.sum()
+    grad[1] = grad_log_home.sum()
+    grad[2:2 + num_teams] = np.bincount(home, grad_log_home, num_teams) + np.bincount(away, grad_log_away, num_teams)
+    grad[2 + num_teams:2 + 2 * num_teams] = np.bincount(away, grad_log_home, num_teams) + np.bincount(home, grad_log_away, num_teams)
+    if use_rho:
+        grad[-1] = grad_rho
+
+    # Media ponderada y una penalización L2 pequeña sobre ataque y defensa (fija el nivel de cada liga,
+    # que de otro modo no está identificado porque las ligas no se enfrentan entre sí)
+    team_params = params[2:2 + 2 * num_teams]
+    value = -np.dot(weights, log_likelihood) / total_weight + 0.5 * l2_penalty * np.dot(team_params, team_params)
+    grad = -grad / total_weight
+    grad[2:2 + 2 * num_teams] += l2_penalty * team_params
+    return value, grad
+
+def _initial_params(teams: np.ndarray, use_rho: bool, init: dict) -> np.ndarray:
+    """Parámetros iniciales: ceros o, si hay un ajuste anterior, sus valores (los equipos nuevos empiezan en 0)."""
+    num_teams = len(teams)
+    params = np.zeros(2 + 2 * num_teams + (1 if use_rho else 0))
+    params[0] = np.log(1.3)
+    params[1] = 0.2
+    if init:
+        params[0], params[1] = init['intercept'], init['home_advantage']
+        previous = pd.DataFrame({'attack': init['attack'], 'defense': init['defense']}, index=init['teams'])
+        aligned = previous.reindex(get_team_names(teams)).fillna(0.0)
+        params[2:2 + num_teams] = aligned['attack'].to_numpy()
+        params[2 + num_teams:2 + 2 * num_teams] = aligned['defense'].to_numpy()
+        if use_rho:
+            params[-1] = init.get('rho', 0.0)
+    return params
+
+def fit_dixon_coles(matches_df: pd.DataFrame, as_of=None, time_decay: float = None, use_rho: bool = None, init: dict = None):
+    """
+    Ajusta el modelo con los partidos anteriores (estrictamente) a `as_of`.
+
+    Args:
+        matches_df (pd.DataFrame): Partidos en el formato de `load_and_prepare_data`.
+        as_of: Fecha de referencia; None = todos los partidos (y la fecha del último).
+        time_decay (float): xi de los pesos exp(-xi * días). None = `settings.DC_TIME_DECAY`.
+        use_rho (bool): Si se ajusta la corrección de marcadores bajos. None = `settings.DC_USE_RHO`.
+        init (dict): Un ajuste anterior desde el que arrancar (warm start).
+
+    Returns:
+        dict | None: {'teams', 'team_ids' (ids del registro), 'attack', 'defense', 'intercept', 'home_advantage', 'rho', 'as_of',
+        'num_matches', 'time_decay', 'use_rho', 'iterations'} o None si no hay partidos.
+    """
+    time_decay = settings.DC_TIME_DECAY if time_decay is None else time_decay
+    use_rho = settings.DC_USE_RHO if use_rho is None else use_rho
+    dates = matches_df['utc_date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    if as_of is not None:
+        as_of = pd.Timestamp(as_of)
+        matches_df, dates = matches_df[dates < as_of], dates[dates < as_of]
+    if matches_df.empty:
+        return None
+    as_of = as_of if as_of is not None else dates.max()
+
+    # Índices compactos 0..n-1 de los equipos presentes
+    team_ids = np.concatenate([get_team_ids(matches_df['home_team_name']), get_team_ids(matches_df['away_team_name'])])
+    teams, team_index = np.unique(team_ids, return_inverse=True)
+    num_matches, num_teams = len(matches_df), len(teams)
+    home_goals = matches_df['home_team_score'].to_numpy(dtype=float)
+    away_goals = matches_df['away_team_score'].to_numpy(dtype=float)
+    weights = np.exp(-time_decay * (as_of - dates).dt.days.to_numpy(dtype=float))
+    low_score = np.flatnonzero((home_goals <= 1) & (away_goals <= 1))
+    data = {
+        'home': team_index[:num_matches], 'away': team_index[num_matches:],
+        'home_goals': home_goals, 'away_goals': away_goals, 'weights': weights, 'total_weight': weights.sum(),
+        # Partidos con marcador 0-0, 0-1, 1-0 o 1-1 y, para ellos, de cuál se trata
+        'low_score': low_score,
+        'is_0_0': (home_goals[low_score] == 0) & (away_goals[low_score] == 0),
+        'is_0_1': (home_goals[low_score] == 0) & (away_goals[low_score] == 1),
+        'is_1_0': (home_goals[low_score] == 1) & (away_goals[low_score] == 0)
+    }
+
+    # scipy solo se importa al ajustar: los informes con fuerzas ya guardadas no lo necesitan
+    from scipy.optimize import minimize
+    bounds = [(None, None)] * (2 + 2 * num_teams) + ([RHO_BOUNDS] if use_rho else [])
+    result = minimize(_negative_log_likelihood, _initial_params(teams, use_rho, init), args=(data, num_teams, use_rho, settings.DC_L2_PENALTY),
+                      jac=True, method='L-BFGS-B', bounds=bounds, options={'maxiter': 500, 'gtol': 1e-6})
+    if not result.success:
+        print(f"Aviso: el ajuste de Dixon-Coles no ha convergido del todo ({result.message}).")
+    params = result.x
+    return {
+        'teams': list(get_team_names(teams)),
+        'team_ids': teams,
+        'attack': params[2:2 + num_teams],
+        'defense': params[2 + num_teams:2 + 2 * num_teams],
+        'intercept': float(params[0]),
+        'home_advantage': float(params[1]),
+        'rho': float(params[-1]) if use_rho else 0.0,
+        'as_of': as_of,
+        'num_matches': num_matches,
+        'time_decay': time_decay,
+        'use_rho': use_rho,
+        'iterations': int(result.nit)
+    }
+
+def dixon_coles_strengths(fit: dict):
+    """
+    Convierte un ajuste en el formato de `calculate_team_strengths`.
+
+    Con las medias de la liga como exp(intercepto + ventaja) y exp(intercepto), y las fuerzas como
+    exp(ataque) y exp(defensa), la fórmula de siempre (ataque x defensa rival x media) da
+    exactamente los goles esperados del modelo ajustado.
+    """
+    if not fit:
+        return None
+    attack, defense = np.exp(fit['attack']), np.exp(fit['defense'])
+    team_strengths = {
+        team: {'attack_strength_home': a, 'defense_strength_home': d, 'attack_strength_away': a, 'defense_strength_away': d}
+        for team, a, d in zip(fit['teams'], attack.tolist(), defense.tolist())
+    }
+    return {
+        'league_avg_home_goals': float(np.exp(fit['intercept'] + fit['home_advantage'])),
+        'league_avg_away_goals': float(np.exp(fit['intercept'])),
+        'team_strengths': team_strengths,
+        'rho': fit['rho']
+    }
+
+def dixon_coles_expected_goals(fit: dict, home_ids: np.ndarray, away_ids: np.ndarray):
+    """
+    Goles esperados de muchos partidos directamente con los parámetros del ajuste y los ids del registro
+    (sin pasar por el diccionario de fuerzas). Mismo formato de salida que `calculate_expected_goals`.
+    """
+    num_ids = max(int(fit['team_ids'].max()), int(home_ids.max(initial=0)), int(away_ids.max(initial=0))) + 2
+    attack, defense = np.full(num_ids, np.nan), np.full(num_ids, np.nan)
+    attack[fit['team_ids']], defense[fit['team_ids']] = fit['attack'], fit['defense']
+    # El id -1 (nombre nulo) cae en la última posición, que siempre es NaN
+    expected_home = np.exp(fit['intercept'] + fit['home_advantage'] + attack[home_ids] + defense[away_ids])
+    expected_away = np.exp(fit['intercept'] + attack[away_ids] + defense[home_ids])
+    known = ~(np.isnan(expected_home) | np.isnan(expected_away))
+    return expected_home, expected_away, known
+
+def load_dixon_coles_fit(path: str = None):
+    """Carga el último ajuste guardado (o None)."""
+    path = path or settings.DC_FIT_FILE
+    if os.path.exists(path):
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            print(f"Error al cargar el ajuste de Dixon-Coles {path}: {e}")
+    return None
+
+def save_dixon_coles_fit(fit: dict, path: str = None):
+    """Guarda un ajuste en disco de forma atómica."""
+    path = path or settings.DC_FIT_FILE
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pd.to_pickle(fit, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error al guardar el ajuste de Dixon-Coles {path}: {e}")
+
+def sync_dixon_coles_fit(matches_df: pd.DataFrame, path: str = None):
+    """
+    Reajusta el modelo con todos los partidos arrancando desde el último ajuste guardado,
+    y guarda el nuevo. Si no hay partidos nuevos desde el último ajuste, lo devuelve tal cual.
+    """
+    previous = load_dixon_coles_fit(path)
+    if (previous is not None and previous['num_matches'] == len(matches_df) and previous['as_of'] == pd.to_datetime(matches_df['utc_date']).max()
+            and previous.get('time_decay') == settings.DC_TIME_DECAY and previous.get('use_rho') == settings.DC_USE_RHO):
+        return previous
+    fit = fit_dixon_coles(matches_df, init=previous)
+    if fit is not None:
+        save_dixon_coles_fit(fit, path)
+    return fit
@@ -36,9 +36,8 @@ def generar_analisis_completo(prediction: dict, value_bets: list, h2h_stats: dic
     # --- Sección 3: Interpretación del Valor ---
     valor_en_sorpresa = False
     for bet in value_bets:
-        if (favorito_modelo == 'home_win' and ("Empate" in bet or "Visitante" in bet)) or \
-           (favorito_modelo == 'away_win' and ("Empate" in bet or "Local" in bet)) or \
-           (favorito_modelo == 'draw' and ("Local" in bet or "Visitante" in bet)):
+        # Hay "sorpresa" si el valor está en un resultado 1X2 distinto del favorito
+        if bet.market == 'h2h' and bet.selection != favorito_modelo:
             valor_en_sorpresa = True
             break
     
@@ -0,0 +1,261 @@
+# src/instrumentation.py
+
+"""
+Tiempos por etapa (y perfilado opcional) de los análisis y los backtests.
+
+Las funciones de entrada de core_logic y del backtester van marcadas con `@traced`: cada llamada es
+una traza. Dentro, cada etapa se envuelve en `with span('nombre') as etapa:`; las etapas se anidan
+y pueden llevar contadores (`etapa.count('partidos', n)`). Si una función `@traced` se llama dentro
+de otra traza (ej. el backtest desde core_logic) cuenta como una etapa más.
+
+Al terminar, la traza se añade a `settings.TIMING_LOG_FILE` en formato JSON lines (una línea por
+etapa) y queda disponible con `get_last_trace()` en el hilo que la ejecutó, para que la app
+muestre la tabla de tiempos.
+
+Con `settings.TIMING_ENABLED = False`, o fuera de una traza, `span` devuelve un objeto vacío
+compartido: el coste es una consulta a una variable del hilo por etapa.
+
+`settings.PROFILE_MODE` activa además un perfil de cada traza completa en `settings.PROFILE_DIR`:
+'cprofile' (archivo .prof, se abre con pstats o snakeviz) o 'sampling' (muestras de la pila cada
+`settings.PROFILE_SAMPLING_INTERVAL` segundos en formato .folded, para flamegraph o speedscope).
+Es el valor por defecto del proceso: `with profiling(modo):` lo sustituye solo en el hilo actual
+(la app lo usa para que la elección de una sesión no afecte a las demás).
+
+Cuando el registro de tiempos pasa de `settings.TIMING_LOG_MAX_BYTES`, se renombra a '<archivo>.1'
+(sustituyendo al anterior) y se empieza uno nuevo: en disco nunca hay más del doble del límite.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from config import settings
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+class _NoopSpan:
+    """Etapa que no mide nada (instrumentación desactivada o fuera de una traza)."""
+    __slots__ = ()
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+    def count(self, counter: str, amount: int = 1):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    """Etapa en curso de una traza. Su registro se añade a la traza al entrar, para conservar el orden."""
+    __slots__ = ('trace', 'record', 'start')
+    def __init__(self, trace: dict, name: str, attrs: dict):
+        self.trace = trace
+        stack = trace['stack']
+        self.record = {'name': name, 'path': '/'.join([record['name'] for record in stack] + [name]), 'depth': len(stack),
+                       'start': None, 'seconds': None, 'status': 'running', 'counters': {}, 'attrs': attrs}
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.record['start'] = self.start - self.trace['perf_start']
+        self.trace['spans'].append(self.record)
+        self.trace['stack'].append(self.record)
+        return self
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record['seconds'] = time.perf_counter() - self.start
+        self.record['status'] = 'error' if exc_type else 'ok'
+        self.trace['stack'].pop()
+        return False
+    def count(self, counter: str, amount: int = 1):
+        """Suma `amount` al contador `counter` de la etapa (ej. partidos, peticiones, filas escritas)."""
+        counters = self.record['counters']
+        counters[counter] = counters.get(counter, 0) + int(amount)
+
+def span(name: str, **attrs):
+    """
+    Etapa de la traza en curso, para usar con `with`. Los `attrs` se guardan tal cual (ej. season='2023/2024').
+    Fuera de una traza no mide nada.
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name, attrs)
+
+# --- PERFILADO ---
+
+_PROCESS_DEFAULT = object()
+
+@contextmanager
+def profiling(mode):
+    """
+    Modo de perfilado (None, 'cprofile' o 'sampling') de las trazas que empiecen en este hilo dentro del `with`,
+    en lugar de `settings.PROFILE_MODE`. None desactiva el perfilado aunque el proceso lo tenga activado.
+    """
+    previous = getattr(_local, 'profile_mode', _PROCESS_DEFAULT)
+    _local.profile_mode = mode
+    try:
+        yield
+    finally:
+        _local.profile_mode = previous
+
+def current_profile_mode():
+    """El modo de perfilado del hilo actual (el de `profiling` o, si no hay, `settings.PROFILE_MODE`)."""
+    mode = getattr(_local, 'profile_mode', _PROCESS_DEFAULT)
+    return settings.PROFILE_MODE if mode is _PROCESS_DEFAULT else mode
+
+class _SamplingProfiler:
+    """Perfilador por muestreo: un hilo apunta cada `interval` segundos la pila del hilo perfilado."""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._run, daemon=True, name='sampling-profiler')
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+    def start(self):
+        self.sampler.start()
+    def stop(self, path: str):
+        self.stopped.set()
+        self.sampler.join()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class _CProfileProfiler:
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+    def start(self):
+        self.profile.enable()
+    def stop(self, path: str):
+        self.profile.disable()
+        self.profile.dump_stats(path)
+
+PROFILERS = {'cprofile': ('prof', _CProfileProfiler), 'sampling': ('folded', lambda: _SamplingProfiler(settings.PROFILE_SAMPLING_INTERVAL))}
+
+def _start_profiler(mode: str):
+    """Arranca el perfilador de `mode` en el hilo actual. Devuelve (perfilador, extensión) o (None, None) si no se puede."""
+    if mode not in PROFILERS:
+        if mode:
+            print(f"Modo de perfilado desconocido: {mode} (se admiten {', '.join(PROFILERS)}).")
+        return None, None
+    extension, create = PROFILERS[mode]
+    try:
+        profiler = create()
+        profiler.start()
+    except ValueError as e:
+        # cProfile solo admite un perfil activo a la vez (ej. dos backtests en segundo plano)
+        print(f"No se pudo iniciar el perfilado: {e}")
+        return None, None
+    return profiler, extension
+
+# --- TRAZAS ---
+
+def traced(func):
+    """
+    Marca una función de entrada: cada llamada es una traza (o una etapa, si ya hay una traza en curso).
+    Con la instrumentación y el perfilado desactivados, la función se llama sin más.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            with _Span(trace, func.__name__, {}):
+                return func(*args, **kwargs)
+        profile_mode = current_profile_mode()
+        if not settings.TIMING_ENABLED and not profile_mode:
+            return func(*args, **kwargs)
+        return _run_trace(func.__name__, func, args, kwargs, profile_mode)
+    return wrapper
+
+def _run_trace(name: str, func, args: tuple, kwargs: dict, profile_mode: str = None):
+    trace = {'trace_id': uuid.uuid4().hex[:12], 'name': name, 'started_at': datetime.now().isoformat(timespec='milliseconds'),
+             'perf_start': time.perf_counter(), 'seconds': None, 'status': 'running', 'profile_file': None, 'spans': [], 'stack': []}
+    profiler, extension = _start_profiler(profile_mode)
+    _local.trace = trace
+    try:
+        with _Span(trace, name, {}):
+            return func(*args, **kwargs)
+    finally:
+        _local.trace = None
+        if profiler is not None:
+            trace['profile_file'] = _save_profile(profiler, name, extension)
+        root = trace['spans'][0]
+        trace.update(seconds=root['seconds'], status=root['status'])
+        del trace['stack'], trace['perf_start']
+        _local.last_trace = trace
+        if settings.TIMING_ENABLED:
+            export_trace(trace)
+
+def _save_profile(profiler, name: str, extension: str):
+    """Guarda el perfil de una traza y devuelve la ruta (None si falla)."""
+    path = os.path.join(settings.PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.{extension}")
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiler.stop(path)
+        return path
+    except Exception as e:
+        print(f"No se pudo guardar el perfil {path}: {e}")
+        return None
+
+def get_last_trace():
+    """La última traza terminada en este hilo (None si no hay ninguna). Ver `_run_trace` para el formato."""
+    return getattr(_local, 'last_trace', None)
+
+def trace_json_lines(trace: dict) -> list:
+    """Una línea JSON por etapa, con el id, el nombre y la hora de inicio de la traza en cada una."""
+    header = {'trace_id': trace['trace_id'], 'trace': trace['name'], 'started_at': trace['started_at']}
+    lines = []
+    for record in trace['spans']:
+        entry = {**header, 'span': record['path'], 'depth': record['depth'], 'start': round(record['start'], 6),
+                 'seconds': round(record['seconds'], 6) if record['seconds'] is not None else None, 'status': record['status'],
+                 'counters': record['counters'], 'attrs': record['attrs']}
+        if record['depth'] == 0 and trace['profile_file']:
+            entry['profile_file'] = trace['profile_file']
+        lines.append(json.dumps(entry, ensure_ascii=False, default=str))
+    return lines
+
+def export_trace(trace: dict, path: str = None, max_bytes: int = None):
+    """
+    Añade la traza a `path` (None = `settings.TIMING_LOG_FILE`; si también es None no se escribe nada).
+    Si el archivo ya ocupa `max_bytes` (None = `settings.TIMING_LOG_MAX_BYTES`) o más, antes se renombra a '<path>.1'.
+    """
+    path = path or settings.TIMING_LOG_FILE
+    if not path:
+        return
+    max_bytes = settings.TIMING_LOG_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with _log_lock:
+            if max_bytes and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, path + '.1')
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(line + "\n" for line in trace_json_lines(trace))
+    except OSError as e:
+        print(f"No se pudo guardar el registro de tiempos {path}: {e}")
+
+def timing_rows(trace: dict) -> list:
+    """Filas de la tabla de tiempos de una traza: etapa (sangrada por nivel), ms, % del total y contadores."""
+    total = trace['seconds'] or 0.0
+    rows = []
+    for record in trace['spans']:
+        label = record['name'] + (f" ({', '.join(f'{key}={value}' for key, value in record['attrs'].items())})" if record['attrs'] else "")
+        seconds = record['seconds'] or 0.0
+        rows.append({'etapa': "   " * record['depth'] + label, 'ms': round(seconds * 1000, 1),
+                     '% del total': round(100 * seconds / total, 1) if total > 0 else 0.0,
+                     'contadores': ", ".join(f"{key}={value}" for key, value in record['counters'].items()),
+                     'estado': '❌' if record['status'] == 'error' else '✅'})
+    return rows
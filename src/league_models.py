@@ -0,0 +1,129 @@
+# src/league_models.py
+
+"""
+Modelos por liga.
+
+Cada liga (`league_code` de football-data) se ajusta por separado, con sus propias medias de
+goles, y los partidos se predicen con los parámetros de su liga. Las particiones son
+independientes, así que los ajustes costosos (Dixon-Coles, ver `settings.LEAGUE_FIT_PARALLEL_MODELS`)
+se calculan en paralelo en un pool de procesos: añadir divisiones (E1, SP2...) solo añade particiones,
+no hace más grande un único ajuste en serie. El modelo de medias tarda milisegundos por liga y va en serie.
+
+Las fuerzas actuales de cada liga salen de su propio almacén de sumas y de su propio último ajuste
+de Dixon-Coles (`settings.STRENGTH_STORE_FILE` y `settings.DC_FIT_FILE` con el código de la liga).
+
+El resultado es un diccionario {league_code: stats}, donde cada `stats` tiene el formato de
+`calculate_team_strengths`. Con `settings.PARTITION_BY_LEAGUE = False` se mantiene el modelo
+conjunto de siempre (todas las ligas apuntan a las mismas fuerzas).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+from config import settings
+from src.data_analyzer import calculate_team_strengths
+from src.dixon_coles import fit_dixon_coles, dixon_coles_strengths
+from src.prediction_model import predict_fixtures
+from src.strength_store import get_current_strengths
+
+# Modelo con el que se escribieron las filas de performance_log.csv y financial_log.csv anteriores a la columna 'model'
+LEGACY_MODEL_LABEL = 'ratios (conjunto)'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _num_workers(num_partitions: int) -> int:
+    return max(1, min(settings.LEAGUE_FIT_WORKERS or os.cpu_count() or 1, num_partitions))
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido (se crea la primera vez y se reutiliza, así el arranque solo se paga una vez)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # forkserver: los procesos no heredan los hilos de la app (caché de la API, tareas en segundo plano)
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+                _pool = ProcessPoolExecutor(max_workers=settings.LEAGUE_FIT_WORKERS or os.cpu_count() or 1, mp_context=context)
+    return _pool
+
+def map_partitions(func, partitions: list, parallel: bool = True) -> list:
+    """
+    Aplica `func(*args)` a cada partición y devuelve los resultados en el mismo orden.
+
+    Args:
+        func: Función de nivel de módulo (tiene que poder enviarse a otro proceso).
+        partitions (list): Tuplas de argumentos, una por partición.
+        parallel (bool): Si se usa el pool de procesos. Para trabajos de pocos milisegundos
+            (ej. el modelo de medias) sale más barato hacerlo en serie.
+    """
+    if not parallel or len(partitions) < 2 or _num_workers(len(partitions)) < 2:
+        return [func(*args) for args in partitions]
+    try:
+        return list(_get_pool().map(func, *zip(*partitions)))
+    except (BrokenProcessPool, OSError) as e:
+        print(f"El pool de procesos ha fallado ({e}); se calculan las ligas en serie.")
+        return [func(*args) for args in partitions]
+
+def model_label(model: str = None) -> str:
+    """Etiqueta de la configuración del modelo (ej. 'ratios (por liga)'), con la que se marcan las filas de los logs de backtest."""
+    return f"{model or settings.STRENGTH_MODEL} ({'por liga' if settings.PARTITION_BY_LEAGUE else 'conjunto'})"
+
+def split_by_league(matches_df: pd.DataFrame) -> dict:
+    """Devuelve {league_code: partidos de esa liga}."""
+    return {league_code: league_df for league_code, league_df in matches_df.groupby('league_code', sort=False)}
+
+def fit_strengths(matches_df: pd.DataFrame, model: str, as_of=None, league_code: str = None):
+    """
+    Ajusta un modelo sobre unos partidos (ej. los de una liga) y devuelve sus fuerzas.
+
+    Args:
+        model (str): 'ratios' o 'dixon_coles'.
+        as_of: Solo cuentan los partidos anteriores (estrictamente) a esta fecha. None = todos.
+        league_code (str): Liga de `matches_df`. Con `as_of=None` las fuerzas salen del almacén de la liga
+            o de su último ajuste de Dixon-Coles (`get_current_strengths`), que se ponen al día y se guardan.
+    """
+    if as_of is None and league_code is not None:
+        return get_current_strengths(matches_df, model, league_code)
+    if as_of is not None:
+        matches_df = matches_df[matches_df['utc_date'] < pd.Timestamp(as_of)]
+    if model == 'dixon_coles':
+        return dixon_coles_strengths(fit_dixon_coles(matches_df))
+    return calculate_team_strengths(matches_df.copy())
+
+def fit_league_models(matches_df: pd.DataFrame, model: str = None, as_of=None) -> dict:
+    """
+    Ajusta un modelo por liga. Los modelos de `settings.LEAGUE_FIT_PARALLEL_MODELS` se ajustan en el pool de
+    procesos; el resto (el de medias, que tarda milisegundos por liga) sale más barato en serie.
+
+    Returns:
+        dict: {league_code: stats} (solo las ligas en las que se pudieron calcular las fuerzas).
+    """
+    model = model or settings.STRENGTH_MODEL
+    leagues = split_by_league(matches_df)
+    partitions = [(league_df, model, as_of, league_code) for league_code, league_df in leagues.items()]
+    results = map_partitions(fit_strengths, partitions, parallel=model in settings.LEAGUE_FIT_PARALLEL_MODELS)
+    return {league_code: stats for league_code, stats in zip(leagues, results) if stats}
+
+def predict_fixtures_by_league(fixtures: pd.DataFrame, league_stats: dict, max_goals: int = 5) -> pd.DataFrame:
+    """
+    Como `predict_fixtures`, pero cada partido se predice con las fuerzas de su liga (columna 'league_code').
+    Los partidos de ligas sin modelo se descartan, igual que los equipos desconocidos.
+    """
+    predicted = [predict_fixtures(league_fixtures, league_stats[league_code], max_goals)
+                 for league_code, league_fixtures in fixtures.groupby('league_code', sort=False) if league_code in league_stats]
+    if not predicted:
+        return fixtures.iloc[0:0].assign(**{column: pd.Series(dtype=float) for column in ['expected_home', 'expected_away', 'home_win', 'draw', 'away_win']})
+    return pd.concat(predicted).sort_index()
+
+def get_current_league_strengths(matches_df: pd.DataFrame, model: str = None) -> dict:
+    """
+    Fuerzas actuales de cada liga: {league_code: stats}, desde el almacén y el último ajuste de cada liga.
+    Con `settings.PARTITION_BY_LEAGUE = False` todas las ligas comparten el modelo conjunto de `get_current_strengths`.
+    """
+    if settings.PARTITION_BY_LEAGUE:
+        return fit_league_models(matches_df, model)
+    stats = get_current_strengths(matches_df, model)
+    return {league_code: stats for league_code in matches_df['league_code'].unique()} if stats else {}
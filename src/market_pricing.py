@@ -0,0 +1,132 @@
+# src/market_pricing.py
+
+"""
+Precios del modelo para todas las líneas que ofrecen las casas.
+
+Cada partido tiene ya su matriz de marcadores (la de `calculate_match_markets`). De ahí se sacan,
+para todos los partidos a la vez, la distribución del total de goles y la de la diferencia de goles
+(local - visitante), y con ellas se liquida cada fila ofrecida de la tabla de cuotas:
+
+- 'totals': Más / Menos de cualquier línea (2.5, 3, 2.25...).
+- 'spreads': hándicap asiático; el local cubre el hándicap h si diferencia + h > 0.
+- 'double_chance': 1X, 12 y X2 a partir del 1X2 (hasta `OUTCOME_MAX_GOALS` goles, como el 1X2).
+
+Las líneas enteras pueden acabar en devolución y las de cuarto (x.25, x.75) se liquidan como dos
+medias apuestas a las líneas vecinas, con medio acierto o medio fallo. Por eso cada selección tiene dos
+pesos: 'model_prob' (la parte que se cobra a la cuota) y 'refund_prob' (la parte que se devuelve).
+En las líneas de .5 y en 1X2 la devolución es 0 y 'model_prob' es la probabilidad de siempre.
+
+La matriz está truncada (hasta `MARKET_MAX_GOALS` goles por equipo en `calculate_match_markets`). Para las
+líneas se normaliza a suma 1: así la masa que queda fuera no se apunta entera al "menos" ni al visitante,
+que se calculan como el resto de la probabilidad (más + menos + devolución = 1).
+"""
+
+import numpy as np
+import pandas as pd
+from src.prediction_model import outcome_probs_from_matrices, OUTCOME_MAX_GOALS
+from src.odds_table import PRICE_KEYS, price_summary, find_best_value_bets, value_bets_by_match
+
+DOUBLE_CHANCE_COLUMNS = {'1X': [0, 1], '12': [0, 2], 'X2': [1, 2]}
+
+def goal_distributions(score_matrices: np.ndarray) -> tuple:
+    """
+    Distribuciones del total de goles y de la diferencia de goles de cada partido.
+
+    Returns:
+        tuple: (totales (n, 2*max_goals+1) para 0..2*max_goals goles, diferencias (n, 2*max_goals+1)
+        para -max_goals..max_goals, valores de la diferencia).
+    """
+    num_matches, size = score_matrices.shape[0], score_matrices.shape[-1]
+    home_goals, away_goals = np.indices((size, size))
+    flat = score_matrices.reshape(num_matches, -1)
+    # Sumar las antidiagonales (o diagonales) es un producto por una matriz de ceros y unos
+    one_hot = np.eye(2 * size - 1)
+    totals = flat @ one_hot[(home_goals + away_goals).ravel()]
+    differences = flat @ one_hot[(home_goals - away_goals + size - 1).ravel()]
+    return totals, differences, np.arange(-(size - 1), size)
+
+def settle_over(distributions: np.ndarray, values: np.ndarray, lines: np.ndarray) -> tuple:
+    """
+    Pesos de la apuesta "X > línea" para cada fila.
+
+    Args:
+        distributions (np.ndarray): (m, k) probabilidad de cada valor de X, una fila por apuesta.
+        values (np.ndarray): (k,) valores de X.
+        lines (np.ndarray): (m,) línea de cada apuesta (.5, entera o de cuarto).
+
+    Returns:
+        tuple: (peso cobrado, peso devuelto), arrays (m,). El "menos" de la misma línea es
+        (1 - cobrado - devuelto, devuelto).
+    """
+    lines = np.asarray(lines, dtype=float)
+    # Las líneas de cuarto son media apuesta a cada línea vecina
+    quarter = np.round(lines * 4) % 2 == 1
+    halves = np.stack([lines - 0.25 * quarter, lines + 0.25 * quarter])[:, :, None]
+    win = (distributions * (values > halves)).sum(axis=-1).mean(axis=0)
+    push = (distributions * (values == halves)).sum(axis=-1).mean(axis=0)
+    return win, push
+
+def price_offered_markets(odds_df: pd.DataFrame, score_matrices: dict) -> pd.DataFrame:
+    """
+    Pone precio del modelo a todas las selecciones que ofrece alguna casa, en una sola pasada.
+
+    Args:
+        odds_df (pd.DataFrame): Salida de `build_odds_table`.
+        score_matrices (dict): {match_id: matriz de marcadores}; todas del mismo tamaño.
+
+    Returns:
+        pd.DataFrame: Columnas de `PRICE_KEYS` + 'model_prob' y 'refund_prob', una fila por selección
+        ofrecida de los partidos de `score_matrices`.
+    """
+    offered = odds_df[PRICE_KEYS].astype({'market': object, 'selection': object}).drop_duplicates()
+    offered = offered[offered['match_id'].isin(score_matrices.keys())].reset_index(drop=True)
+    if offered.empty:
+        return offered.assign(model_prob=pd.Series(dtype=float), refund_prob=pd.Series(dtype=float))
+    match_ids = pd.Index(list(score_matrices))
+    matrices = np.stack(list(score_matrices.values()))
+    fixture = match_ids.get_indexer(offered['match_id'])
+    market, selection, point = offered['market'].to_numpy(), offered['selection'].to_numpy(), offered['point'].to_numpy()
+    model_prob = np.full(len(offered), np.nan)
+    refund_prob = np.zeros(len(offered))
+
+    # 1X2 y doble oportunidad con la misma esquina de la matriz que `calculate_match_markets`
+    outcomes = outcome_probs_from_matrices(matrices[:, :OUTCOME_MAX_GOALS + 1, :OUTCOME_MAX_GOALS + 1])
+    for column, key in enumerate(['home_win', 'draw', 'away_win']):
+        rows = (market == 'h2h') & (selection == key)
+        model_prob[rows] = outcomes[fixture[rows], column]
+    for key, columns in DOUBLE_CHANCE_COLUMNS.items():
+        rows = (market == 'double_chance') & (selection == key)
+        model_prob[rows] = outcomes[fixture[rows]][:, columns].sum(axis=1)
+
+    totals, differences, difference_values = goal_distributions(matrices / matrices.sum(axis=(1, 2), keepdims=True))
+    line_bets = [
+        # (filas, distribución, valores, línea "X > línea", la selección es el lado de "más")
+        ((market == 'totals') & (selection == 'over'), totals, np.arange(totals.shape[1]), point, True),
+        ((market == 'totals') & (selection == 'under'), totals, np.arange(totals.shape[1]), point, False),
+        # Local con hándicap h: gana si diferencia > -h. Visitante con hándicap h: gana si diferencia < h
+        ((market == 'spreads') & (selection == 'home'), differences, difference_values, -point, True),
+        ((market == 'spreads') & (selection == 'away'), differences, difference_values, point, False),
+    ]
+    for rows, distributions, values, lines, is_over in line_bets:
+        if not rows.any():
+            continue
+        win, push = settle_over(distributions[fixture[rows]], values, lines[rows])
+        model_prob[rows] = win if is_over else 1 - win - push
+        refund_prob[rows] = push
+    return offered.assign(model_prob=model_prob, refund_prob=refund_prob).dropna(subset=['model_prob']).reset_index(drop=True)
+
+def find_value_bets_all_books(odds_df: pd.DataFrame, score_matrices: dict, max_odds: float = None) -> dict:
+    """
+    Busca valor en todos los partidos y líneas a la vez contra la mejor cuota de todas las casas.
+
+    Args:
+        odds_df (pd.DataFrame): Salida de `build_odds_table`.
+        score_matrices (dict): {match_id: matriz de marcadores de `calculate_match_markets`}.
+
+    Returns:
+        dict: {match_id: [ValueBet, ...]} (los partidos sin valor no aparecen).
+    """
+    if odds_df.empty or not score_matrices:
+        return {}
+    model_probs_df = price_offered_markets(odds_df, score_matrices)
+    return value_bets_by_match(find_best_value_bets(price_summary(odds_df), model_probs_df, max_odds))
@@ -0,0 +1,157 @@
+# src/odds_table.py
+
+"""
+Tabla de cuotas de todas las casas de apuestas.
+
+La respuesta de The Odds API (partidos -> casas -> mercados -> selecciones) se aplana una sola
+vez en una tabla por columnas, con una fila por cuota: (partido, casa, mercado, línea, selección,
+cuota, última actualización). Sobre ella se calculan, agrupando por (partido, mercado, línea,
+selección), la mejor cuota y la casa que la ofrece, la cuota mediana, la probabilidad de consenso
+sin margen (la media de las probabilidades de cada casa una vez quitado su margen) y la ventaja
+del modelo en cada casa.
+
+Así la búsqueda de valor se hace contra la mejor cuota disponible en todo el mercado, en una sola
+pasada para todos los partidos, en lugar de con la primera casa que aparece en la lista.
+"""
+
+import numpy as np
+import pandas as pd
+from src.prediction_model import ValueBet, calculate_kelly_criterion_batch
+
+ODDS_COLUMNS = ['match_id', 'bookmaker', 'market', 'point', 'selection', 'price', 'last_update']
+PRICE_KEYS = ['match_id', 'market', 'point', 'selection']
+
+# Selecciones de cada mercado completo (para quitar el margen solo con casas que ofrecen todas)
+MARKET_SELECTIONS = {'h2h': 3, 'totals': 2, 'spreads': 2, 'double_chance': 3}
+# Suma de las probabilidades justas de un mercado completo (en doble oportunidad cada resultado cuenta dos veces)
+MARKET_TOTAL_PROB = {'double_chance': 2.0}
+# Las líneas alternativas se tratan como el mercado principal
+MARKET_ALIASES = {'alternate_totals': 'totals', 'alternate_spreads': 'spreads'}
+
+def match_key(match: dict) -> str:
+    """Identificador de un partido de The Odds API (su id o, si no lo trae, fecha-local-visitante)."""
+    return match.get('id') or f"{match['commence_time']}-{match['home_team']}-{match['away_team']}"
+
+def _selection_key(market: str, name: str, home_team: str, away_team: str):
+    """Clave de una selección de The Odds API en un mercado (None si no la reconocemos)."""
+    if market == 'h2h':
+        return {home_team: 'home_win', away_team: 'away_win', 'Draw': 'draw'}.get(name)
+    if market == 'totals':
+        return {'Over': 'over', 'Under': 'under'}.get(name)
+    if market == 'spreads':
+        return {home_team: 'home', away_team: 'away'}.get(name)
+    if market == 'double_chance':
+        # 'Local/Draw', 'Local/Visitante', 'Draw/Visitante' (en cualquier orden)
+        sides = {home_team: '1', 'Draw': 'X', away_team: '2'}
+        key = ''.join(sorted((sides.get(part.strip(), '?') for part in (name or '').split('/')), key='1X2?'.index))
+        return key if key in ('1X', '12', 'X2') else None
+    return None
+
+def build_odds_table(matches: list) -> pd.DataFrame:
+    """
+    Aplana las cuotas de una lista de partidos de The Odds API.
+
+    Las selecciones se guardan con las claves del modelo: 'home_win', 'draw' y 'away_win' en 'h2h',
+    'over' / 'under' en 'totals', 'home' / 'away' en 'spreads' (hándicap asiático) y '1X', '12', 'X2'
+    en 'double_chance'. La línea va en 'point' (en 'spreads', el hándicap de esa selección; NaN en los
+    mercados sin línea).
+
+    Returns:
+        pd.DataFrame: Una fila por cuota, con las columnas de `ODDS_COLUMNS`.
+    """
+    rows = []
+    for match in matches:
+        match_id = match_key(match)
+        for bookmaker in match.get('bookmakers', []):
+            for market in bookmaker.get('markets', []):
+                market_key = MARKET_ALIASES.get(market['key'], market['key'])
+                last_update = market.get('last_update', bookmaker.get('last_update'))
+                for outcome in market.get('outcomes', []):
+                    selection = _selection_key(market_key, outcome.get('name'), match['home_team'], match['away_team'])
+                    if selection is not None and outcome.get('price'):
+                        rows.append((match_id, bookmaker['key'], market_key, outcome.get('point', np.nan), selection, outcome['price'], last_update))
+    odds_df = pd.DataFrame(rows, columns=ODDS_COLUMNS)
+    # Una casa puede repetir una cuota; nos quedamos con la primera
+    odds_df = odds_df.drop_duplicates(['match_id', 'bookmaker', 'market', 'point', 'selection']).reset_index(drop=True)
+    odds_df['point'] = odds_df['point'].astype(float)
+    odds_df['price'] = odds_df['price'].astype(float)
+    odds_df['last_update'] = pd.to_datetime(odds_df['last_update'], utc=True)
+    for column in ['bookmaker', 'market', 'selection']:
+        odds_df[column] = odds_df[column].astype('category')
+    return odds_df
+
+def price_summary(odds_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resumen de precios de cada selección en todas las casas.
+
+    Returns:
+        pd.DataFrame: Indexado por (match_id, market, point, selection), con 'best_price', 'best_bookmaker',
+        'median_price', 'num_books' y 'consensus_prob' (NaN si ninguna casa ofrece el mercado completo).
+    """
+    odds_df = odds_df.assign(market=odds_df['market'].astype(object), selection=odds_df['selection'].astype(object), implied=1.0 / odds_df['price'])
+    # En hándicap cada lado trae su propio signo; el mercado se agrupa por el hándicap del local
+    market_line = odds_df['point'].where((odds_df['market'] != 'spreads') | (odds_df['selection'] != 'away'), -odds_df['point'])
+    # Margen de cada casa en cada mercado: la suma de probabilidades implícitas pasa de 1 (o de 2 en doble oportunidad)
+    book_groups = odds_df.assign(market_line=market_line).groupby(['match_id', 'bookmaker', 'market', 'market_line'], observed=True, dropna=False, sort=False)['implied']
+    complete = book_groups.transform('size') == odds_df['market'].map(MARKET_SELECTIONS)
+    total_prob = odds_df['market'].map(MARKET_TOTAL_PROB).fillna(1.0)
+    fair_prob = (odds_df['implied'] / book_groups.transform('sum') * total_prob).where(complete)
+
+    groups = odds_df.assign(fair_prob=fair_prob).groupby(PRICE_KEYS, observed=True, dropna=False, sort=False)
+    summary = groups.agg(best_price=('price', 'max'), median_price=('price', 'median'), num_books=('price', 'size'), consensus_prob=('fair_prob', 'mean'))
+    summary['best_bookmaker'] = odds_df.loc[groups['price'].idxmax().to_numpy(), 'bookmaker'].astype(object).to_numpy()
+    return summary
+
+def model_probs_rows(match_id: str, markets: dict) -> list:
+    """Probabilidades del modelo de un partido (salida de `calculate_match_markets`) en filas (match_id, market, point, selection, model_prob)."""
+    rows = [(match_id, 'h2h', np.nan, selection, prob) for selection, prob in markets['1x2'].items()]
+    for key, prob in markets['totals'].items():
+        side, line = key.split('_', 1)
+        rows.append((match_id, 'totals', float(line), side, prob))
+    return rows
+
+def model_probs_table(rows: list) -> pd.DataFrame:
+    """Tabla de probabilidades del modelo a partir de las filas de `model_probs_rows` (sin devoluciones)."""
+    return pd.DataFrame(rows, columns=PRICE_KEYS + ['model_prob']).assign(refund_prob=0.0)
+
+def book_edges(odds_df: pd.DataFrame, model_probs_df: pd.DataFrame) -> pd.DataFrame:
+    """La tabla de cuotas con la ventaja del modelo en cada casa ('edge' = model_prob * price + refund_prob - 1)."""
+    edges = odds_df.assign(market=odds_df['market'].astype(object), selection=odds_df['selection'].astype(object)).merge(model_probs_df, on=PRICE_KEYS, how='inner')
+    edges['edge'] = edges['model_prob'] * edges['price'] + edges['refund_prob'] - 1
+    return edges
+
+def find_best_value_bets(summary: pd.DataFrame, model_probs_df: pd.DataFrame, max_odds: float = None) -> pd.DataFrame:
+    """
+    Busca valor de todos los partidos a la vez, contra la mejor cuota de cada selección.
+
+    En las líneas con devolución (hándicap asiático, líneas enteras y de cuarto) el modelo da dos pesos:
+    'model_prob', la parte de la apuesta que se cobra a la cuota, y 'refund_prob', la parte que se devuelve.
+    La ventaja es model_prob * cuota + refund_prob - 1 y el Kelly se calcula con la probabilidad equivalente
+    de una apuesta sin devolución con la misma ventaja (model_prob + refund_prob / cuota).
+
+    Args:
+        summary (pd.DataFrame): Salida de `price_summary`.
+        model_probs_df (pd.DataFrame): Salida de `model_probs_table` o de `price_offered_markets`.
+        max_odds (float): Si se indica, se ignoran las mejores cuotas iguales o superiores.
+
+    Returns:
+        pd.DataFrame: Las selecciones con valor, en el orden de `model_probs_df`, con 'best_price', 'best_bookmaker',
+        'model_prob', 'consensus_prob', 'edge' y 'kelly'.
+    """
+    value_df = model_probs_df.merge(summary.reset_index(), on=PRICE_KEYS, how='inner')
+    value_df['edge'] = value_df['model_prob'] * value_df['best_price'] + value_df['refund_prob'] - 1
+    is_value = value_df['edge'] > 0
+    if max_odds is not None:
+        is_value &= value_df['best_price'] < max_odds
+    value_df = value_df[is_value].reset_index(drop=True)
+    value_df['kelly'] = calculate_kelly_criterion_batch(value_df['model_prob'] + value_df['refund_prob'] / value_df['best_price'], value_df['best_price'])
+    return value_df
+
+def value_bets_by_match(value_df: pd.DataFrame) -> dict:
+    """Convierte la salida de `find_best_value_bets` en {match_id: [ValueBet, ...]}."""
+    value_bets = {}
+    for row in value_df.itertuples(index=False):
+        selection = f"{row.selection}_{row.point}" if row.market in ('totals', 'spreads') else row.selection
+        value_bets.setdefault(row.match_id, []).append(
+            ValueBet(row.market, selection, float(row.best_price), float(row.model_prob), float(row.edge), float(row.kelly), row.best_bookmaker))
+    return value_bets
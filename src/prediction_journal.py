@@ -0,0 +1,203 @@
+# src/prediction_journal.py
+
+"""
+Diario de predicciones en SQLite (`settings.PREDICTION_JOURNAL_FILE`).
+
+Cada predicción es una fila con clave `id` (fecha-local-visitante). Las predicciones de
+un análisis se guardan de una vez (las repetidas se ignoran gracias a la clave) y la
+revisión actualiza solo las filas revisadas, así que el coste no crece con el tamaño
+del diario. Las columnas son las del antiguo `predictions_log.csv`, que se importa
+automáticamente la primera vez que se abre un diario vacío.
+"""
+
+import os
+import sqlite3
+from sqlite3 import Error
+import numpy as np
+import pandas as pd
+from config import settings
+from src.team_registry import normalize_team_column
+
+JOURNAL_COLUMNS = ['id', 'date', 'home_team', 'away_team', 'predicted_outcome', 'model_confidence', 'status', 'actual_outcome', 'is_correct']
+
+def _create_journal_table(conn: sqlite3.Connection):
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id TEXT PRIMARY KEY,
+                date TEXT NOT NULL,
+                home_team TEXT NOT NULL,
+                away_team TEXT NOT NULL,
+                predicted_outcome TEXT NOT NULL,
+                model_confidence REAL,
+                status TEXT NOT NULL,
+                actual_outcome TEXT,
+                is_correct INTEGER
+            )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status)")
+
+def _import_legacy_log(conn: sqlite3.Connection, log_file: str):
+    """Copia el antiguo predictions_log.csv en un diario vacío."""
+    if not os.path.exists(log_file) or conn.execute("SELECT 1 FROM predictions LIMIT 1").fetchone():
+        return
+    try:
+        log_df = pd.read_csv(log_file, dtype={'predicted_outcome': str, 'actual_outcome': str})
+        log_df['is_correct'] = log_df['is_correct'].map({True: 1, False: 0, 'True': 1, 'False': 0})
+        log_df = log_df[JOURNAL_COLUMNS].astype(object).where(log_df[JOURNAL_COLUMNS].notna(), None)
+        with conn:
+            conn.executemany(f"INSERT OR IGNORE INTO predictions ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+                             log_df.itertuples(index=False, name=None))
+        print(f"Importadas {len(log_df)} predicciones de {log_file} al diario.")
+    except Exception as e:
+        print(f"Error importando el diario antiguo {log_file}: {e}")
+
+def open_journal(db_file: str = None):
+    """Abre el diario de predicciones, creándolo (e importando el CSV antiguo) si hace falta."""
+    db_file = db_file or settings.PREDICTION_JOURNAL_FILE
+    os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+    try:
+        conn = sqlite3.connect(db_file)
+        _create_journal_table(conn)
+    except Error as e:
+        print(f"Error abriendo el diario de predicciones: {e}")
+        return None
+    _import_legacy_log(conn, settings.LEGACY_PREDICTIONS_LOG)
+    return conn
+
+def prediction_entry(match: dict, prediction: dict) -> dict:
+    """Construye la fila del diario para un partido de The Odds API y su predicción 1X2."""
+    favorito_modelo = max(prediction, key=prediction.get)
+    if favorito_modelo == 'home_win': resultado_predicho = '1'
+    elif favorito_modelo == 'draw': resultado_predicho = 'X'
+    else: resultado_predicho = '2'
+    return {'id': f"{match['commence_time']}-{match['home_team']}-{match['away_team']}", 'date': match['commence_time'],
+            'home_team': match['home_team'], 'away_team': match['away_team'], 'predicted_outcome': resultado_predicho,
+            'model_confidence': float(prediction[favorito_modelo]), 'status': 'PENDIENTE', 'actual_outcome': None, 'is_correct': None}
+
+def save_predictions(entries: list, db_file: str = None) -> int:
+    """
+    Guarda varias predicciones en una sola transacción. Las que ya estaban en el diario no se tocan.
+
+    Returns:
+        int: El número de predicciones nuevas.
+    """
+    if not entries:
+        return 0
+    conn = open_journal(db_file)
+    if conn is None:
+        return 0
+    try:
+        with conn:
+            num_before = conn.total_changes
+            conn.executemany(f"INSERT OR IGNORE INTO predictions ({', '.join(JOURNAL_COLUMNS)}) VALUES ({', '.join(':' + column for column in JOURNAL_COLUMNS)})",
+                             entries)
+            return conn.total_changes - num_before
+    except Error as e:
+        print(f"Error al guardar predicciones: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def load_predictions(status: str = None, limit: int = None, db_file: str = None) -> pd.DataFrame:
+    """
+    Lee el diario en el orden en que se guardaron las predicciones.
+
+    Args:
+        status (str): Solo las predicciones con este estado ('PENDIENTE', 'REVISADO'). None = todas.
+        limit (int): Solo las `limit` más recientes. None = todas.
+    """
+    conn = open_journal(db_file)
+    if conn is None:
+        return pd.DataFrame(columns=JOURNAL_COLUMNS)
+    conditions, params = "", []
+    if status is not None:
+        conditions = "WHERE status = ?"
+        params.append(status)
+    query = f"SELECT rowid, {', '.join(JOURNAL_COLUMNS)} FROM predictions {conditions} ORDER BY rowid"
+    if limit is not None:
+        query = f"SELECT * FROM (SELECT rowid, {', '.join(JOURNAL_COLUMNS)} FROM predictions {conditions} ORDER BY rowid DESC LIMIT ?) ORDER BY rowid"
+        params.append(int(limit))
+    try:
+        log_df = pd.read_sql_query(query, conn, params=params).drop(columns='rowid')
+    except Exception as e:
+        print(f"Error leyendo el diario de predicciones: {e}")
+        return pd.DataFrame(columns=JOURNAL_COLUMNS)
+    finally:
+        conn.close()
+    log_df['is_correct'] = log_df['is_correct'].map({1: True, 0: False})
+    return log_df
+
+def _scores_table(scores: list) -> pd.DataFrame:
+    """Resultados finalizados de The Odds API en una tabla (equipos normalizados, día y marcador)."""
+    rows = []
+    for order, score in enumerate(scores):
+        if not score.get('completed') or not score.get('scores'):
+            continue
+        home_team, away_team = score.get('home_team', ''), score.get('away_team', '')
+        goals = {entry['name']: entry['score'] for entry in score['scores']}
+        if home_team not in goals or away_team not in goals:
+            continue
+        rows.append((order, home_team, away_team, score['commence_time'][:10], int(goals[home_team]), int(goals[away_team])))
+    scores_df = pd.DataFrame(rows, columns=['order', 'home_team', 'away_team', 'score_date', 'home_score', 'away_score'])
+    scores_df['home_team'] = normalize_team_column(scores_df['home_team']).astype(object)
+    scores_df['away_team'] = normalize_team_column(scores_df['away_team']).astype(object)
+    scores_df['score_date'] = pd.to_datetime(scores_df['score_date'])
+    # Un mismo partido puede llegar repetido; nos quedamos con el primero, como hacía la búsqueda lineal
+    return scores_df.drop_duplicates(['home_team', 'away_team', 'score_date'])
+
+def reconcile_predictions(pending_df: pd.DataFrame, scores: list, date_tolerance_days: int = 0) -> pd.DataFrame:
+    """
+    Cruza las predicciones pendientes con los resultados de The Odds API en una sola pasada.
+
+    El cruce es un join por (local normalizado, visitante normalizado); de los candidatos se
+    queda el resultado con la fecha más cercana dentro de `date_tolerance_days` días (0 = mismo día),
+    por si el partido se movió de fecha después de guardar la predicción.
+
+    Returns:
+        pd.DataFrame: Las predicciones encontradas, con las columnas 'actual_outcome' y 'is_correct' ya calculadas.
+    """
+    scores_df = _scores_table(scores)
+    if pending_df.empty or scores_df.empty:
+        return pending_df.iloc[0:0].assign(actual_outcome=pd.Series(dtype=object), is_correct=pd.Series(dtype=bool))
+
+    predictions = pending_df.drop(columns=['actual_outcome', 'is_correct'], errors='ignore').assign(
+        home_key=normalize_team_column(pending_df['home_team']).astype(object).to_numpy(),
+        away_key=normalize_team_column(pending_df['away_team']).astype(object).to_numpy(),
+        prediction_date=pd.to_datetime(pending_df['date'].str[:10]).to_numpy())
+    joined = predictions.merge(scores_df, how='inner', left_on=['home_key', 'away_key'], right_on=['home_team', 'away_team'], suffixes=('', '_score'))
+    day_gap = (joined['score_date'] - joined['prediction_date']).dt.days.abs()
+    joined = joined[day_gap <= date_tolerance_days].assign(day_gap=day_gap)
+    # Un resultado por predicción: el de fecha más cercana (y, a igualdad, el primero que devolvió la API)
+    joined = joined.sort_values(['day_gap', 'order'], kind='stable').drop_duplicates('id').sort_index()
+
+    joined['actual_outcome'] = np.select([joined['home_score'] > joined['away_score'], joined['home_score'] == joined['away_score']], ['1', 'X'], '2')
+    # Comparamos ambos valores como texto para evitar errores de tipo
+    joined['is_correct'] = joined['predicted_outcome'].astype(str) == joined['actual_outcome']
+    return joined[pending_df.columns.drop(['actual_outcome', 'is_correct'], errors='ignore').tolist() + ['actual_outcome', 'is_correct']]
+
+def update_prediction_results(results: list, db_file: str = None) -> int:
+    """
+    Marca predicciones como revisadas, en una sola transacción.
+
+    Args:
+        results (list): Tuplas (id, resultado real '1'/'X'/'2', acierto True/False).
+
+    Returns:
+        int: El número de filas actualizadas.
+    """
+    if not results:
+        return 0
+    conn = open_journal(db_file)
+    if conn is None:
+        return 0
+    try:
+        with conn:
+            num_before = conn.total_changes
+            conn.executemany("UPDATE predictions SET status = 'REVISADO', actual_outcome = ?, is_correct = ? WHERE id = ?",
+                             [(actual_outcome, int(is_correct), prediction_id) for prediction_id, actual_outcome, is_correct in results])
+            return conn.total_changes - num_before
+    except Error as e:
+        print(f"Error al actualizar el diario de predicciones: {e}")
+        return 0
+    finally:
+        conn.close()
@@ -2,11 +2,138 @@
 
 """
 Módulo para el modelo de predicción de partidos usando la distribución de Poisson.
+
+Toda la lógica de mercados se deriva de una única matriz de marcadores
+(goles local x goles visitante), construida una sola vez por partido.
 """
 
-from scipy.stats import poisson
+import numpy as np
+from dataclasses import dataclass
+
+# El 1X2 se lee de los marcadores de hasta 5 goles por equipo, como en `predict_outcome`, aunque la matriz
+# sea más grande (los mercados de goles necesitan la matriz completa)
+OUTCOME_MAX_GOALS = 5
+# Goles por equipo de la matriz de los mercados: con 12 la masa que queda fuera es despreciable incluso con
+# medias altas, así que las líneas altas y los hándicaps grandes se liquidan con la cola real de la distribución
+MARKET_MAX_GOALS = 12
+
+def poisson_pmf(goals, expected_goals) -> np.ndarray:
+    """
+    Probabilidad de Poisson de marcar `goals` goles con media `expected_goals` (con broadcasting).
+    Es exp(k·log(λ) - λ - log(k!)) en NumPy: da lo mismo que scipy.stats.poisson.pmf sin tener
+    que importar scipy.stats, que es lo que más tarda al arrancar los scripts.
+    """
+    goals = np.asarray(goals)
+    expected_goals = np.asarray(expected_goals, dtype=float)
+    log_factorial = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, goals.max() + 1)))])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_pmf = goals * np.log(expected_goals) - expected_goals - log_factorial[goals]
+    # Con media 0 el 0·log(0) sale NaN; la probabilidad de 0 goles es exp(-λ) en todos los casos
+    return np.where(goals == 0, np.exp(-expected_goals), np.exp(log_pmf))
+
+def dixon_coles_tau(home_expected_goals, away_expected_goals, rho: float) -> np.ndarray:
+    """
+    Factores de corrección de Dixon-Coles para los marcadores 0-0, 0-1, 1-0 y 1-1.
+
+    Returns:
+        np.ndarray: Array (..., 2, 2) que multiplica la esquina [0:2, 0:2] de la matriz de marcadores.
+    """
+    home = np.asarray(home_expected_goals, dtype=float)
+    away = np.asarray(away_expected_goals, dtype=float)
+    return np.stack([
+        np.stack([1 - home * away * rho, 1 + home * rho], axis=-1),
+        np.stack([1 + away * rho, np.broadcast_to(1 - rho, home.shape)], axis=-1)
+    ], axis=-2)
+
+def calculate_score_matrix(avg_home_goals: float, avg_away_goals: float, max_goals: int = 6, rho: float = 0.0) -> np.ndarray:
+    """
+    Construye la matriz de probabilidades de cada marcador exacto.
+
+    Args:
+        avg_home_goals (float): La media de goles del equipo que juega en casa.
+        avg_away_goals (float): La media de goles del equipo que juega fuera.
+        max_goals (int): El número máximo de goles a simular para cada equipo.
+        rho (float): Corrección de Dixon-Coles para los marcadores bajos (0 = Poisson independiente).
+
+    Returns:
+        np.ndarray: Matriz (max_goals+1) x (max_goals+1) donde la celda [i, j]
+        es la probabilidad de que el partido termine i-j.
+    """
+    goals = np.arange(max_goals + 1)
+    # Como los goles de cada equipo son independientes, la matriz es el producto exterior de ambas PMF
+    score_matrix = np.outer(poisson_pmf(goals, avg_home_goals), poisson_pmf(goals, avg_away_goals))
+    if rho:
+        score_matrix[:2, :2] *= dixon_coles_tau(avg_home_goals, avg_away_goals, rho)
+    return score_matrix
+
+def outcome_probs_from_matrix(score_matrix: np.ndarray) -> dict:
+    """
+    Calcula las probabilidades 1X2 a partir de una matriz de marcadores.
+    """
+    # Debajo de la diagonal gana el local, en la diagonal hay empate y encima gana el visitante
+    return {
+        'home_win': float(np.tril(score_matrix, -1).sum()),
+        'draw': float(np.trace(score_matrix)),
+        'away_win': float(np.triu(score_matrix, 1).sum())
+    }
+
+def over_under_probs_from_matrix(score_matrix: np.ndarray, line: float = 2.5) -> dict:
+    """
+    Calcula la probabilidad de Más/Menos de `line` goles a partir de una matriz de marcadores.
+    """
+    home_goals, away_goals = np.indices(score_matrix.shape)
+    over_prob = float(score_matrix[(home_goals + away_goals) > line].sum())
+    return {
+        f'over_{line}': over_prob,
+        f'under_{line}': 1 - over_prob
+    }
+
+def btts_probs_from_matrix(score_matrix: np.ndarray) -> dict:
+    """
+    Calcula la probabilidad de que ambos equipos marquen (BTTS) a partir de una matriz de marcadores.
+    """
+    btts_yes = float(score_matrix[1:, 1:].sum())
+    return {
+        'btts_yes': btts_yes,
+        'btts_no': 1 - btts_yes
+    }
+
+def correct_score_probs_from_matrix(score_matrix: np.ndarray, top_n: int = None) -> dict:
+    """
+    Devuelve las probabilidades de marcador exacto ('2-1': prob), ordenadas de mayor a menor.
+
+    Args:
+        score_matrix (np.ndarray): Matriz de marcadores.
+        top_n (int): Si se indica, solo se devuelven los `top_n` marcadores más probables.
+    """
+    flat_order = np.argsort(score_matrix, axis=None)[::-1]
+    if top_n is not None:
+        flat_order = flat_order[:top_n]
+    home_goals, away_goals = np.unravel_index(flat_order, score_matrix.shape)
+    return {f"{h}-{a}": float(score_matrix[h, a]) for h, a in zip(home_goals, away_goals)}
+
+def calculate_match_markets(avg_home_goals: float, avg_away_goals: float, max_goals: int = MARKET_MAX_GOALS, totals_lines: tuple = (2.5,), rho: float = 0.0,
+                            outcome_max_goals: int = OUTCOME_MAX_GOALS) -> dict:
+    """
+    Calcula todos los mercados de un partido a partir de una única matriz de marcadores.
+    El 1X2 sale de la esquina de la matriz de hasta `outcome_max_goals` goles por equipo.
 
-def predict_outcome(avg_home_goals: float, avg_away_goals: float, max_goals: int = 5) -> dict:
+    Returns:
+        dict: {'1x2': {...}, 'totals': {...}, 'btts': {...}, 'score_matrix': np.ndarray}.
+        El mercado de marcador exacto se obtiene con `correct_score_probs_from_matrix(markets['score_matrix'])`.
+    """
+    score_matrix = calculate_score_matrix(avg_home_goals, avg_away_goals, max_goals, rho)
+    totals = {}
+    for line in totals_lines:
+        totals.update(over_under_probs_from_matrix(score_matrix, line))
+    return {
+        '1x2': outcome_probs_from_matrix(score_matrix[:outcome_max_goals + 1, :outcome_max_goals + 1]),
+        'totals': totals,
+        'btts': btts_probs_from_matrix(score_matrix),
+        'score_matrix': score_matrix
+    }
+
+def predict_outcome(avg_home_goals: float, avg_away_goals: float, max_goals: int = 5, rho: float = 0.0) -> dict:
     """
     Calcula la probabilidad de victoria local, empate y victoria visitante.
 
@@ -14,72 +141,188 @@ def predict_outcome(avg_home_goals: float, avg_away_goals: float, max_goals: int
         avg_home_goals (float): La media de goles del equipo que juega en casa.
         avg_away_goals (float): La media de goles del equipo que juega fuera.
         max_goals (int): El número máximo de goles a simular para cada equipo.
+        rho (float): Corrección de Dixon-Coles (0 = Poisson independiente).
 
     Returns:
         dict: Un diccionario con las probabilidades de 'home_win', 'draw', 'away_win'.
     """
-    home_win_prob = 0
-    draw_prob = 0
-    away_win_prob = 0
-
-    # Itera sobre todos los posibles goles del equipo local (de 0 a max_goals)
-    for home_goals in range(max_goals + 1):
-        # Itera sobre todos los posibles goles del equipo visitante
-        for away_goals in range(max_goals + 1):
-            # Calcula la probabilidad de que se dé exactamente ese número de goles
-            prob_home = poisson.pmf(home_goals, avg_home_goals)
-            prob_away = poisson.pmf(away_goals, avg_away_goals)
-            
-            # La probabilidad del resultado (ej. 2-1) es la multiplicación de ambas
-            prob_scoreline = prob_home * prob_away
-            
-            # Acumula la probabilidad en la categoría correspondiente
-            if home_goals > away_goals:
-                home_win_prob += prob_scoreline
-            elif home_goals == away_goals:
-                draw_prob += prob_scoreline
-            else:
-                away_win_prob += prob_scoreline
-                
+    return outcome_probs_from_matrix(calculate_score_matrix(avg_home_goals, avg_away_goals, max_goals, rho))
+
+# --- API POR LOTES ---
+# Las mismas cuentas que arriba pero para n partidos a la vez: en lugar de una
+# matriz de marcadores por partido se construye un tensor (n, goles, goles).
+
+def calculate_score_matrices(home_expected_goals, away_expected_goals, max_goals: int = 6, rho: float = 0.0) -> np.ndarray:
+    """
+    Construye las matrices de marcadores de muchos partidos en una sola operación.
+
+    Args:
+        home_expected_goals (array-like): Goles esperados del local, uno por partido.
+        away_expected_goals (array-like): Goles esperados del visitante, uno por partido.
+        max_goals (int): El número máximo de goles a simular para cada equipo.
+        rho (float): Corrección de Dixon-Coles (0 = Poisson independiente).
+
+    Returns:
+        np.ndarray: Tensor de forma (n, max_goals+1, max_goals+1).
+    """
+    goals = np.arange(max_goals + 1)
+    home_expected_goals = np.asarray(home_expected_goals, dtype=float)
+    away_expected_goals = np.asarray(away_expected_goals, dtype=float)
+    home_pmf = poisson_pmf(goals[None, :], home_expected_goals[:, None])
+    away_pmf = poisson_pmf(goals[None, :], away_expected_goals[:, None])
+    score_matrices = home_pmf[:, :, None] * away_pmf[:, None, :]
+    if rho:
+        score_matrices[:, :2, :2] *= dixon_coles_tau(home_expected_goals, away_expected_goals, rho)
+    return score_matrices
+
+def outcome_probs_from_matrices(score_matrices: np.ndarray) -> np.ndarray:
+    """
+    Devuelve un array (n, 3) con las probabilidades [local, empate, visitante] de cada partido.
+    """
+    size = score_matrices.shape[-1]
+    home_goals, away_goals = np.indices((size, size))
+    return np.stack([
+        score_matrices[:, home_goals > away_goals].sum(axis=1),
+        score_matrices[:, home_goals == away_goals].sum(axis=1),
+        score_matrices[:, home_goals < away_goals].sum(axis=1)
+    ], axis=1)
+
+def over_under_probs_from_matrices(score_matrices: np.ndarray, line: float = 2.5) -> np.ndarray:
+    """
+    Devuelve un array (n, 2) con las probabilidades [más, menos] de `line` goles de cada partido.
+    """
+    size = score_matrices.shape[-1]
+    home_goals, away_goals = np.indices((size, size))
+    over_prob = score_matrices[:, (home_goals + away_goals) > line].sum(axis=1)
+    return np.stack([over_prob, 1 - over_prob], axis=1)
+
+def predict_outcomes_batch(home_expected_goals, away_expected_goals, max_goals: int = 5, rho: float = 0.0) -> np.ndarray:
+    """
+    Versión por lotes de `predict_outcome`.
+
+    Returns:
+        np.ndarray: Array (n, 3) con columnas [home_win, draw, away_win].
+    """
+    return outcome_probs_from_matrices(calculate_score_matrices(home_expected_goals, away_expected_goals, max_goals, rho))
+
+def calculate_markets_batch(home_expected_goals, away_expected_goals, max_goals: int = MARKET_MAX_GOALS, totals_lines: tuple = (2.5,), rho: float = 0.0,
+                            outcome_max_goals: int = OUTCOME_MAX_GOALS) -> dict:
+    """
+    Versión por lotes de `calculate_match_markets`.
+
+    Returns:
+        dict: {'1x2': array (n, 3), 'totals': {linea: array (n, 2) [más, menos]}, 'btts': array (n, 2) [sí, no]}.
+    """
+    score_matrices = calculate_score_matrices(home_expected_goals, away_expected_goals, max_goals, rho)
+    btts_yes = score_matrices[:, 1:, 1:].sum(axis=(1, 2))
     return {
-        'home_win': home_win_prob,
-        'draw': draw_prob,
-        'away_win': away_win_prob
+        '1x2': outcome_probs_from_matrices(score_matrices[:, :outcome_max_goals + 1, :outcome_max_goals + 1]),
+        'totals': {line: over_under_probs_from_matrices(score_matrices, line) for line in totals_lines},
+        'btts': np.stack([btts_yes, 1 - btts_yes], axis=1)
     }
 
-# Añade esta función al final de tu archivo src/prediction_model.py
+def predict_fixtures(fixtures: 'pd.DataFrame', stats: dict, max_goals: int = 5) -> 'pd.DataFrame':
+    """
+    Predice un DataFrame de partidos (columnas 'home_team_name' y 'away_team_name') de una vez.
+    Si `stats` trae 'rho' (modelo Dixon-Coles), se aplica la corrección de marcadores bajos.
+
+    Returns:
+        pd.DataFrame: Los partidos con equipos conocidos por el modelo, con las columnas añadidas
+        'expected_home', 'expected_away', 'home_win', 'draw' y 'away_win'.
+    """
+    # data_analyzer (y con él pandas) se importa aquí: el resto del módulo solo necesita NumPy y está en el arranque de todos los scripts
+    from src.data_analyzer import calculate_expected_goals
+    expected_home, expected_away, known = calculate_expected_goals(stats, fixtures['home_team_name'], fixtures['away_team_name'])
+    predicted = fixtures[known].copy()
+    predicted['expected_home'] = expected_home[known]
+    predicted['expected_away'] = expected_away[known]
+    predicted[['home_win', 'draw', 'away_win']] = predict_outcomes_batch(predicted['expected_home'], predicted['expected_away'], max_goals, stats.get('rho', 0.0))
+    return predicted
+
+# --- APUESTAS DE VALOR ---
+
+# Nombre legible de cada selección; solo se usa al generar los informes
+BET_LABELS = {'home_win': 'Victoria Local', 'draw': 'Empate', 'away_win': 'Victoria Visitante',
+              '1X': 'Doble Oportunidad 1X', '12': 'Doble Oportunidad 12', 'X2': 'Doble Oportunidad X2'}
 
-def find_value_bets(prediction: dict, odds: dict) -> list:
+@dataclass(slots=True)
+class ValueBet:
+    """
+    Una apuesta de valor detectada por el modelo.
+
+    Attributes:
+        market (str): Mercado de The Odds API ('h2h', 'totals', 'spreads' o 'double_chance').
+        selection (str): Clave de la selección, la misma que en las probabilidades del modelo
+            ('home_win', 'draw', 'away_win', 'over_2.5', 'under_2.5', 'home_-0.75', '1X'...).
+        odds (float): Cuota decimal ofrecida.
+        model_prob (float): Probabilidad que le da el modelo.
+        edge (float): Ventaja esperada (model_prob * odds - 1).
+        kelly (float): Fracción del bankroll según el Criterio de Kelly.
+        bookmaker (str): Casa que ofrece la cuota (None si no se sabe).
+    """
+    market: str
+    selection: str
+    odds: float
+    model_prob: float
+    edge: float
+    kelly: float
+    bookmaker: str = None
+
+    @classmethod
+    def from_prediction(cls, market: str, selection: str, odds: float, model_prob: float, bookmaker: str = None) -> 'ValueBet':
+        """Crea la apuesta calculando su edge y su fracción de Kelly."""
+        return cls(market, selection, float(odds), float(model_prob), float(model_prob * odds - 1), calculate_kelly_criterion(model_prob, odds), bookmaker)
+
+    @property
+    def label(self) -> str:
+        """Nombre legible de la apuesta (ej. 'Victoria Local', 'Más de 2.5 Goles' o 'Hándicap Asiático Local -0.75')."""
+        if self.selection in BET_LABELS:
+            return BET_LABELS[self.selection]
+        side, line = self.selection.split('_', 1)
+        if self.market == 'spreads':
+            return f"Hándicap Asiático {'Local' if side == 'home' else 'Visitante'} {float(line):+g}"
+        return f"{'Más' if side == 'over' else 'Menos'} de {line} Goles"
+
+    def __str__(self) -> str:
+        return f"{self.label} @{self.odds:.2f} (Modelo: {self.model_prob:.2%})"
+
+def find_value_bets(prediction: dict, odds: dict, max_odds: float = None) -> list:
     """
     Compara las probabilidades del modelo con las cuotas para encontrar apuestas de valor.
 
     Args:
         prediction (dict): Probabilidades del modelo {'home_win', 'draw', 'away_win'}.
         odds (dict): Cuotas del partido {'home_odds', 'draw_odds', 'away_odds'}.
+        max_odds (float): Si se indica, se ignoran las cuotas iguales o superiores.
 
     Returns:
-        list: Una lista de strings describiendo las apuestas de valor encontradas.
+        list: Una lista de `ValueBet` con las apuestas de valor encontradas.
     """
     value_bets = []
+    for selection, odds_key in (('home_win', 'home_odds'), ('draw', 'draw_odds'), ('away_win', 'away_odds')):
+        selection_odds = odds.get(odds_key)
+        if not selection_odds or (max_odds is not None and selection_odds >= max_odds):
+            continue
+        if prediction[selection] * selection_odds > 1.0:
+            value_bets.append(ValueBet.from_prediction('h2h', selection, selection_odds, prediction[selection]))
+    return value_bets
 
-    # Comprobar valor en la victoria local
-    if odds.get('home_odds') and prediction['home_win'] * odds['home_odds'] > 1.0:
-        value_bets.append(
-            f"Victoria Local @{odds['home_odds']:.2f} (Modelo: {prediction['home_win']:.2%})"
-        )
-
-    # Comprobar valor en el empate
-    if odds.get('draw_odds') and prediction['draw'] * odds['draw_odds'] > 1.0:
-        value_bets.append(
-            f"Empate @{odds['draw_odds']:.2f} (Modelo: {prediction['draw']:.2%})"
-        )
+def find_totals_value_bets(over_under_probs: dict, over_odds: float, under_odds: float, line: float = 2.5) -> list:
+    """
+    Busca valor en el mercado de goles (Más/Menos de `line`).
 
-    # Comprobar valor en la victoria visitante
-    if odds.get('away_odds') and prediction['away_win'] * odds['away_odds'] > 1.0:
-        value_bets.append(
-            f"Victoria Visitante @{odds['away_odds']:.2f} (Modelo: {prediction['away_win']:.2%})"
-        )
+    Args:
+        over_under_probs (dict): Probabilidades del modelo {'over_<line>', 'under_<line>'}.
+        over_odds (float): Cuota de Más (o None si no se ofrece).
+        under_odds (float): Cuota de Menos (o None si no se ofrece).
 
+    Returns:
+        list: Una lista de `ValueBet`.
+    """
+    value_bets = []
+    for selection, selection_odds in ((f'over_{line}', over_odds), (f'under_{line}', under_odds)):
+        if selection_odds and over_under_probs[selection] * selection_odds > 1.0:
+            value_bets.append(ValueBet.from_prediction('totals', selection, selection_odds, over_under_probs[selection]))
     return value_bets
 
 def calculate_kelly_criterion(model_prob: float, odds: float) -> float:
@@ -95,20 +338,18 @@ def calculate_kelly_criterion(model_prob: float, odds: float) -> float:
     # Solo devolvemos valores positivos (si no, no hay valor)
     return max(0, kelly_percentage)
 
-def calculate_over_under_probs(avg_home_goals: float, avg_away_goals: float, max_goals: int = 6):
+def calculate_kelly_criterion_batch(model_probs, odds) -> np.ndarray:
     """
-    Calcula la probabilidad de que haya más o menos de 2.5 goles.
+    Versión por lotes de `calculate_kelly_criterion` (cuotas <= 1 o sin valor devuelven 0).
     """
-    over_2_5_prob = 0
-    # Iteramos sobre todos los posibles marcadores
-    for home_g in range(max_goals + 1):
-        for away_g in range(max_goals + 1):
-            prob_scoreline = poisson.pmf(home_g, avg_home_goals) * poisson.pmf(away_g, avg_away_goals)
-            # Si la suma de goles es 3 o más, la añadimos a la probabilidad de "Más de 2.5"
-            if (home_g + away_g) > 2.5:
-                over_2_5_prob += prob_scoreline
+    model_probs, odds = np.asarray(model_probs, dtype=float), np.asarray(odds, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kelly_percentage = ((model_probs * odds) - 1) / (odds - 1)
+    return np.where(odds > 1.0, np.maximum(0, np.nan_to_num(kelly_percentage)), 0.0)
 
-    return {
-        'over_2.5': over_2_5_prob,
-        'under_2.5': 1 - over_2_5_prob
-    }
\ No newline at end of file
+def calculate_over_under_probs(avg_home_goals: float, avg_away_goals: float, max_goals: int = 6, line: float = 2.5):
+    """
+    Calcula la probabilidad de que haya más o menos de `line` goles.
+    Para líneas enteras o de cuarto (con devolución) ver `src.market_pricing`.
+    """
+    return over_under_probs_from_matrix(calculate_score_matrix(avg_home_goals, avg_away_goals, max_goals), line)
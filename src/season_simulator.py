@@ -0,0 +1,169 @@
+# src/season_simulator.py
+
+"""
+Simulador Monte Carlo de la temporada en curso.
+
+A partir de los partidos ya jugados (la clasificación actual), de los que faltan y de las
+fuerzas del modelo, se juegan muchas temporadas a la vez: los goles de cada partido pendiente
+se muestrean con Poisson de NumPy en bloques de (simulaciones x partidos), los puntos y goles de
+cada equipo se suman con un producto de matrices y la clasificación de cada simulación sale de
+un único argsort. De ahí se obtienen la distribución de posiciones de cada equipo, las
+probabilidades de título, de plazas altas y de descenso y los puntos esperados.
+
+Los partidos pendientes salen de `settings.SEASON_FIXTURE_FILES` (CSV con Date, HomeTeam y
+AwayTeam) o, si una liga no tiene calendario, de la doble vuelta completa entre los equipos que
+ya han jugado esta temporada, quitando los cruces ya disputados.
+"""
+
+import numpy as np
+import pandas as pd
+from config import settings
+from src.data_analyzer import calculate_expected_goals
+from src.team_registry import normalize_team_column
+from src.league_models import map_partitions
+
+def season_matches(matches_df: pd.DataFrame, league_code: str) -> pd.DataFrame:
+    """Partidos de la temporada más reciente de una liga (la temporada empieza el 1 de julio)."""
+    league_df = matches_df[matches_df['league_code'] == league_code]
+    if league_df.empty:
+        return league_df
+    last_date = league_df['utc_date'].max()
+    season_start_year = last_date.year if last_date.month >= 7 else last_date.year - 1
+    return league_df[league_df['utc_date'] >= f'{season_start_year}-07-01']
+
+def load_fixture_list(file_path: str) -> pd.DataFrame:
+    """Lee un calendario en formato football-data (Date, HomeTeam, AwayTeam). Devuelve un DataFrame vacío si falla."""
+    try:
+        fixtures_df = pd.read_csv(file_path, usecols=['HomeTeam', 'AwayTeam'])
+    except Exception as e:
+        print(f"Error leyendo el calendario {file_path}: {e}")
+        return pd.DataFrame(columns=['home_team_name', 'away_team_name'])
+    return pd.DataFrame({'home_team_name': normalize_team_column(fixtures_df['HomeTeam']).astype(object),
+                         'away_team_name': normalize_team_column(fixtures_df['AwayTeam']).astype(object)}).dropna()
+
+def remaining_fixtures(played_df: pd.DataFrame, fixtures_df: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Partidos que faltan por jugar.
+
+    Args:
+        played_df (pd.DataFrame): Partidos ya jugados de la temporada.
+        fixtures_df (pd.DataFrame): Calendario completo ('home_team_name', 'away_team_name').
+            None = doble vuelta entre los equipos de `played_df`.
+    """
+    if fixtures_df is None:
+        teams = np.union1d(played_df['home_team_name'].astype(object), played_df['away_team_name'].astype(object))
+        home, away = np.meshgrid(teams, teams, indexing='ij')
+        not_self = home != away
+        fixtures_df = pd.DataFrame({'home_team_name': home[not_self], 'away_team_name': away[not_self]})
+    played_keys = pd.MultiIndex.from_arrays([played_df['home_team_name'].astype(object), played_df['away_team_name'].astype(object)])
+    fixture_keys = pd.MultiIndex.from_arrays([fixtures_df['home_team_name'].astype(object), fixtures_df['away_team_name'].astype(object)])
+    return fixtures_df[~fixture_keys.isin(played_keys)].reset_index(drop=True)
+
+def _team_matrix(team_index: pd.Index, home_teams, away_teams) -> tuple:
+    """Matrices (partidos x equipos) con un 1 en la columna del local y del visitante de cada partido."""
+    home_matrix = np.zeros((len(home_teams), len(team_index)))
+    away_matrix = np.zeros((len(away_teams), len(team_index)))
+    home_matrix[np.arange(len(home_teams)), team_index.get_indexer(home_teams)] = 1.0
+    away_matrix[np.arange(len(away_teams)), team_index.get_indexer(away_teams)] = 1.0
+    return home_matrix, away_matrix
+
+def simulate_season(played_df: pd.DataFrame, stats: dict, fixtures_df: pd.DataFrame = None, num_simulations: int = None,
+                    seed=None, top_places: int = None, relegation_places: int = 3) -> dict:
+    """
+    Simula el resto de la temporada de una liga `num_simulations` veces.
+
+    El desempate es puntos, diferencia de goles, goles a favor y, si todo coincide, sorteo.
+    La corrección rho de Dixon-Coles no se aplica al muestrear (goles Poisson independientes).
+    Los equipos sin fuerzas en el modelo juegan con las medias de la liga.
+
+    Args:
+        played_df (pd.DataFrame): Partidos ya jugados de la temporada (la clasificación de partida).
+        stats (dict): Fuerzas de la liga, en el formato de `calculate_team_strengths`.
+        fixtures_df (pd.DataFrame): Calendario completo. None = doble vuelta entre los equipos que ya han jugado.
+        seed: Semilla (int o np.random.SeedSequence). Con la misma semilla el resultado es idéntico.
+        top_places (int): Plazas altas (ej. Champions). None = `settings.SEASON_SIM_TOP_PLACES`.
+        relegation_places (int): Plazas de descenso.
+
+    Returns:
+        dict: {'num_simulations', 'num_remaining', 'table' (DataFrame por equipo con 'played', 'points',
+        'expected_points', 'title', 'top', 'relegation'), 'positions' (DataFrame equipo x posición con
+        la probabilidad de acabar en cada puesto)}.
+    """
+    num_simulations = num_simulations or settings.SEASON_SIM_NUM_SIMULATIONS
+    top_places = top_places or settings.SEASON_SIM_TOP_PLACES
+    remaining_df = remaining_fixtures(played_df, fixtures_df)
+    played_home, played_away = played_df['home_team_name'].astype(object), played_df['away_team_name'].astype(object)
+    team_index = pd.Index(np.union1d(np.union1d(played_home, played_away),
+                                     np.union1d(remaining_df['home_team_name'], remaining_df['away_team_name'])))
+    num_teams = len(team_index)
+
+    # Clasificación actual
+    home_goals, away_goals = played_df['home_team_score'].to_numpy(float), played_df['away_team_score'].to_numpy(float)
+    home_matrix, away_matrix = _team_matrix(team_index, played_home, played_away)
+    home_points = np.where(home_goals > away_goals, 3.0, (home_goals == away_goals).astype(float))
+    away_points = np.where(away_goals > home_goals, 3.0, (home_goals == away_goals).astype(float))
+    base_points = home_points @ home_matrix + away_points @ away_matrix
+    base_goal_diff = (home_goals - away_goals) @ (home_matrix - away_matrix)
+    base_goals_for = home_goals @ home_matrix + away_goals @ away_matrix
+    played = home_matrix.sum(axis=0) + away_matrix.sum(axis=0)
+
+    # Goles esperados de los partidos pendientes (medias de la liga para los equipos sin fuerzas)
+    expected_home, expected_away, known = calculate_expected_goals(stats, remaining_df['home_team_name'], remaining_df['away_team_name'])
+    expected_home = np.where(known, expected_home, stats['league_avg_home_goals'])
+    expected_away = np.where(known, expected_away, stats['league_avg_away_goals'])
+    home_matrix, away_matrix = _team_matrix(team_index, remaining_df['home_team_name'], remaining_df['away_team_name'])
+    goal_diff_matrix = home_matrix - away_matrix
+
+    rng = np.random.default_rng(seed)
+    position_counts = np.zeros(num_teams * num_teams, dtype=np.int64)
+    points_sum = np.zeros(num_teams)
+    team_offsets = np.arange(num_teams) * num_teams
+    batch_size = max(1, settings.SEASON_SIM_BATCH_SIZE)
+    for batch_start in range(0, num_simulations, batch_size):
+        batch = min(batch_size, num_simulations - batch_start)
+        sim_home = rng.poisson(expected_home, size=(batch, len(remaining_df))).astype(float)
+        sim_away = rng.poisson(expected_away, size=(batch, len(remaining_df))).astype(float)
+        draws = (sim_home == sim_away).astype(float)
+        points = base_points + (3.0 * (sim_home > sim_away) + draws) @ home_matrix + (3.0 * (sim_away > sim_home) + draws) @ away_matrix
+        goal_diff = base_goal_diff + (sim_home - sim_away) @ goal_diff_matrix
+        goals_for = base_goals_for + sim_home @ home_matrix + sim_away @ away_matrix
+        # Una sola clave ordena por puntos, diferencia de goles y goles a favor; la parte decimal es el sorteo
+        sort_key = (points * 2000 + goal_diff + 1000) * 1000 + goals_for + rng.random((batch, num_teams))
+        standings = np.argsort(-sort_key, axis=1) # standings[s, p] = equipo en el puesto p
+        position_counts += np.bincount((team_offsets[standings] + np.arange(num_teams)).ravel(), minlength=num_teams * num_teams)
+        points_sum += points.sum(axis=0)
+
+    position_probs = position_counts.reshape(num_teams, num_teams) / num_simulations
+    positions = pd.DataFrame(position_probs, index=team_index.rename('team'), columns=np.arange(1, num_teams + 1))
+    table = pd.DataFrame({
+        'played': played.astype(int),
+        'points': base_points.astype(int),
+        'expected_points': points_sum / num_simulations,
+        'title': position_probs[:, 0],
+        'top': position_probs[:, :top_places].sum(axis=1),
+        'relegation': position_probs[:, num_teams - relegation_places:].sum(axis=1) if relegation_places else 0.0
+    }, index=positions.index).sort_values(['expected_points', 'points'], ascending=False)
+    return {'num_simulations': num_simulations, 'num_remaining': len(remaining_df), 'table': table, 'positions': positions.loc[table.index]}
+
+def _simulate_league(played_df: pd.DataFrame, stats: dict, fixtures_df, num_simulations: int, seed, relegation_places: int) -> dict:
+    return simulate_season(played_df, stats, fixtures_df, num_simulations, seed, relegation_places=relegation_places)
+
+def simulate_leagues(matches_df: pd.DataFrame, league_stats: dict, num_simulations: int = None, seed=None, parallel: bool = True) -> dict:
+    """
+    Simula la temporada en curso de cada liga de `league_stats`, una liga por proceso.
+    Cada liga recibe su propia semilla derivada de `seed`, así que el resultado no depende
+    de si se simula en paralelo o en serie.
+
+    Returns:
+        dict: {league_code: salida de `simulate_season`} (solo las ligas con partidos de esta temporada).
+    """
+    seed = settings.SEASON_SIM_SEED if seed is None else seed
+    league_codes = [league_code for league_code in league_stats if not season_matches(matches_df, league_code).empty]
+    seeds = np.random.SeedSequence(seed).spawn(len(league_codes))
+    partitions = []
+    for league_code, league_seed in zip(league_codes, seeds):
+        fixture_file = settings.SEASON_FIXTURE_FILES.get(league_code)
+        fixtures_df = load_fixture_list(fixture_file) if fixture_file else None
+        relegation_places = settings.SEASON_SIM_RELEGATION_PLACES.get(league_code, 3)
+        partitions.append((season_matches(matches_df, league_code), league_stats[league_code], fixtures_df, num_simulations, league_seed, relegation_places))
+    return dict(zip(league_codes, map_partitions(_simulate_league, partitions, parallel=parallel)))
@@ -0,0 +1,239 @@
+# src/strength_store.py
+
+"""
+Almacén persistente de las fuerzas de los equipos.
+
+En lugar de recalcular medias sobre todo el histórico en cada ejecución, guardamos
+por equipo las sumas de goles marcados/encajados y el número de partidos como local
+y como visitante. Añadir resultados nuevos solo cuesta O(partidos nuevos) y las fuerzas
+actuales se obtienen directamente de esas sumas.
+
+Para poder consultar las fuerzas "a fecha de" cualquier día (backtests), también se
+guarda un libro de contribuciones por partido y equipo, ordenado por fecha.
+
+Si alguna vez se corrige un resultado ya guardado, basta con borrar el archivo del
+almacén para que se reconstruya desde los CSV en la siguiente ejecución.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from config import settings
+from src.utils import REQUIRED_COLUMNS, league_file_path
+from src.team_registry import normalize_team_column, get_team_ids
+from src.dixon_coles import sync_dixon_coles_fit, dixon_coles_strengths
+
+SUM_COLUMNS = ['home_scored', 'home_conceded', 'home_matches', 'away_scored', 'away_conceded', 'away_matches']
+
+def create_strength_store() -> dict:
+    """Crea un almacén vacío."""
+    ledger = pd.DataFrame({'utc_date': pd.Series(dtype='datetime64[ns]'), 'team': pd.Series(dtype=object)})
+    for column in SUM_COLUMNS:
+        ledger[column] = pd.Series(dtype=float)
+    return {
+        'ledger': ledger,
+        'totals': pd.DataFrame(columns=SUM_COLUMNS, dtype=float).rename_axis('team'),
+        'match_keys': set()
+    }
+
+def _ledger_rows(df: pd.DataFrame, home_teams: pd.Series, away_teams: pd.Series) -> pd.DataFrame:
+    """Convierte partidos en dos filas de contribución (una por equipo, identificado por nombre o por id)."""
+    utc_date = pd.to_datetime(df['utc_date']).astype('datetime64[ns]').to_numpy()
+    home_score = df['home_team_score'].to_numpy(dtype=float)
+    away_score = df['away_team_score'].to_numpy(dtype=float)
+    zeros, ones = np.zeros_like(home_score), np.ones_like(home_score)
+    home_rows = pd.DataFrame({'utc_date': utc_date, 'team': home_teams.to_numpy(),
+                              'home_scored': home_score, 'home_conceded': away_score, 'home_matches': ones,
+                              'away_scored': zeros, 'away_conceded': zeros, 'away_matches': zeros})
+    away_rows = pd.DataFrame({'utc_date': utc_date, 'team': away_teams.to_numpy(),
+                              'home_scored': zeros, 'home_conceded': zeros, 'home_matches': zeros,
+                              'away_scored': away_score, 'away_conceded': home_score, 'away_matches': ones})
+    return pd.concat([home_rows, away_rows], ignore_index=True).sort_values('utc_date', kind='stable')
+
+def update_strength_store(store: dict, matches_df: pd.DataFrame) -> int:
+    """
+    Añade al almacén los partidos de `matches_df` que todavía no contiene.
+
+    Args:
+        store (dict): El almacén (se modifica en el sitio).
+        matches_df (pd.DataFrame): Partidos en el formato de `load_and_prepare_data`.
+
+    Returns:
+        int: El número de partidos nuevos añadidos.
+    """
+    if matches_df.empty:
+        return 0
+    df = matches_df.dropna(subset=['utc_date', 'home_team_name', 'away_team_name', 'home_team_score', 'away_team_score'])
+    # El libro guarda los nombres (no los ids) para que el archivo no dependa del registro en memoria
+    home_teams = normalize_team_column(df['home_team_name']).astype(object)
+    away_teams = normalize_team_column(df['away_team_name']).astype(object)
+    # Un equipo no juega dos veces el mismo día, así que (día, local, visitante) identifica el partido
+    keys = pd.Index(list(zip(pd.to_datetime(df['utc_date']).dt.normalize(), home_teams, away_teams)))
+    is_new = ~keys.duplicated() & ~keys.isin(store['match_keys'])
+    if not is_new.any():
+        return 0
+
+    new_rows = _ledger_rows(df[is_new], home_teams[is_new], away_teams[is_new])
+    ledger = store['ledger']
+    needs_sort = not ledger.empty and new_rows['utc_date'].iloc[0] < ledger['utc_date'].iloc[-1]
+    ledger = pd.concat([ledger, new_rows], ignore_index=True) if not ledger.empty else new_rows.reset_index(drop=True)
+    store['ledger'] = ledger.sort_values('utc_date', kind='stable', ignore_index=True) if needs_sort else ledger
+    store['totals'] = store['totals'].add(new_rows.groupby('team')[SUM_COLUMNS].sum(), fill_value=0).rename_axis('team')
+    store['match_keys'].update(keys[is_new])
+    return int(is_new.sum())
+
+def strengths_from_sums(sums: pd.DataFrame):
+    """
+    Calcula las fuerzas de ataque y defensa a partir de las sumas por equipo.
+    Devuelve el mismo formato que `calculate_team_strengths`.
+    """
+    total_matches = sums['home_matches'].sum() if not sums.empty else 0
+    if total_matches == 0:
+        return None
+    avg_home_goals = sums['home_scored'].sum() / total_matches
+    avg_away_goals = sums['away_scored'].sum() / total_matches
+
+    # Igual que antes: solo equipos con partidos tanto de local como de visitante
+    teams = sums[(sums['home_matches'] > 0) & (sums['away_matches'] > 0)]
+    if teams.empty:
+        return None
+    team_strengths = pd.DataFrame({
+        'avg_scored_home': teams['home_scored'] / teams['home_matches'],
+        'avg_conceded_home': teams['home_conceded'] / teams['home_matches'],
+        'avg_scored_away': teams['away_scored'] / teams['away_matches'],
+        'avg_conceded_away': teams['away_conceded'] / teams['away_matches']
+    })
+    team_strengths['attack_strength_home'] = team_strengths['avg_scored_home'] / avg_home_goals
+    team_strengths['defense_strength_home'] = team_strengths['avg_conceded_home'] / avg_away_goals
+    team_strengths['attack_strength_away'] = team_strengths['avg_scored_away'] / avg_away_goals
+    team_strengths['defense_strength_away'] = team_strengths['avg_conceded_away'] / avg_home_goals
+
+    return {'league_avg_home_goals': avg_home_goals, 'league_avg_away_goals': avg_away_goals, 'team_strengths': team_strengths.to_dict('index')}
+
+def get_team_strengths(store: dict, as_of=None):
+    """
+    Devuelve las fuerzas de los equipos en el formato de `calculate_team_strengths`.
+
+    Args:
+        store (dict): El almacén.
+        as_of: Si se indica, solo cuentan los partidos anteriores (estrictamente) a esa fecha.
+    """
+    if as_of is None:
+        return strengths_from_sums(store['totals'])
+    ledger = store['ledger']
+    end = ledger['utc_date'].searchsorted(pd.Timestamp(as_of), side='left')
+    return strengths_from_sums(ledger.iloc[:end].groupby('team')[SUM_COLUMNS].sum())
+
+def calculate_walk_forward_expected_goals(matches_df: pd.DataFrame):
+    """
+    Calcula los goles esperados de cada partido usando solo los partidos jugados antes de su fecha,
+    como si el modelo se hubiera actualizado después de cada jornada.
+
+    Todo se hace con sumas acumuladas por equipo y día (sin reajustar el modelo partido a partido):
+    para cada partido se toman las sumas del equipo hasta el día anterior.
+
+    Args:
+        matches_df (pd.DataFrame): Partidos en el formato de `load_and_prepare_data`.
+
+    Returns:
+        tuple: (goles esperados local, goles esperados visitante, máscara de partidos con ambos equipos conocidos),
+        alineados con las filas de `matches_df`, igual que `calculate_expected_goals`.
+    """
+    # Aquí todo se agrupa por el id entero de cada equipo
+    home_teams = pd.Series(get_team_ids(matches_df['home_team_name']), index=matches_df.index)
+    away_teams = pd.Series(get_team_ids(matches_df['away_team_name']), index=matches_df.index)
+    match_day = pd.to_datetime(matches_df['utc_date']).dt.normalize()
+    home_score = matches_df['home_team_score'].astype(float)
+    away_score = matches_df['away_team_score'].astype(float)
+
+    # Sumas por equipo y día, acumuladas y sin contar el propio día
+    rows = _ledger_rows(matches_df.assign(utc_date=match_day), home_teams, away_teams)
+    daily = rows.groupby(['team', 'utc_date'])[SUM_COLUMNS].sum()
+    before = daily.groupby(level='team').cumsum() - daily
+    home_before = before.reindex(pd.MultiIndex.from_arrays([home_teams, match_day])).to_numpy()
+    away_before = before.reindex(pd.MultiIndex.from_arrays([away_teams, match_day])).to_numpy()
+    col = {name: i for i, name in enumerate(SUM_COLUMNS)}
+
+    # Medias de la liga hasta el día anterior
+    league_daily = pd.DataFrame({'home_goals': home_score, 'away_goals': away_score, 'matches': 1.0}).groupby(match_day.to_numpy()).sum()
+    league_before = (league_daily.cumsum() - league_daily).reindex(match_day.to_numpy()).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_home_goals = league_before[:, 0] / league_before[:, 2]
+        avg_away_goals = league_before[:, 1] / league_before[:, 2]
+        home_avg_scored = home_before[:, col['home_scored']] / home_before[:, col['home_matches']]
+        home_avg_conceded = home_before[:, col['home_conceded']] / home_before[:, col['home_matches']]
+        away_avg_scored = away_before[:, col['away_scored']] / away_before[:, col['away_matches']]
+        away_avg_conceded = away_before[:, col['away_conceded']] / away_before[:, col['away_matches']]
+        # ataque_local * defensa_visitante * media_liga, con las fuerzas ya divididas por la media
+        expected_home = home_avg_scored * away_avg_conceded / avg_home_goals
+        expected_away = away_avg_scored * home_avg_conceded / avg_away_goals
+
+    # Como en el modelo congelado: ambos equipos deben haber jugado ya de local y de visitante
+    known = ((home_before[:, col['home_matches']] > 0) & (home_before[:, col['away_matches']] > 0) &
+             (away_before[:, col['home_matches']] > 0) & (away_before[:, col['away_matches']] > 0) &
+             np.isfinite(expected_home) & np.isfinite(expected_away))
+    return expected_home, expected_away, known
+
+def load_strength_store(path: str = None) -> dict:
+    """Carga el almacén desde disco; si no existe (o está dañado) devuelve uno vacío."""
+    path = path or settings.STRENGTH_STORE_FILE
+    if os.path.exists(path):
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            print(f"Error al cargar el almacén de fuerzas {path}: {e}")
+    return create_strength_store()
+
+def save_strength_store(store: dict, path: str = None):
+    """Guarda el almacén en disco de forma atómica."""
+    path = path or settings.STRENGTH_STORE_FILE
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pd.to_pickle(store, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error al guardar el almacén de fuerzas {path}: {e}")
+
+def sync_strength_store(matches_df: pd.DataFrame, path: str = None) -> dict:
+    """
+    Carga el almacén, le añade los partidos de `matches_df` que falten y lo guarda si ha cambiado.
+    """
+    store = load_strength_store(path)
+    if update_strength_store(store, matches_df):
+        save_strength_store(store, path)
+    return store
+
+def get_current_strengths(matches_df: pd.DataFrame, model: str = None, league_code: str = None):
+    """
+    Fuerzas actuales con el modelo configurado, en el formato de `calculate_team_strengths`.
+
+    Args:
+        model (str): 'ratios' (almacén de sumas) o 'dixon_coles' (ajuste por máxima verosimilitud,
+            arrancando desde el último guardado). None = `settings.STRENGTH_MODEL`.
+        league_code (str): Si se indica, `matches_df` son los partidos de esa liga y se usan su almacén
+            y su último ajuste (`league_file_path`). None = el modelo conjunto de todas las ligas.
+    """
+    if (model or settings.STRENGTH_MODEL) == 'dixon_coles':
+        return dixon_coles_strengths(sync_dixon_coles_fit(matches_df, league_file_path(settings.DC_FIT_FILE, league_code)))
+    return get_team_strengths(sync_strength_store(matches_df, league_file_path(settings.STRENGTH_STORE_FILE, league_code)))
+
+def add_results_to_strength_store(results_df: pd.DataFrame, league_code: str = None, path: str = None) -> int:
+    """
+    Añade al almacén resultados nuevos en formato football-data ('Date', 'HomeTeam', 'FTHG'...),
+    como los que escriben `run_update` y `updater.py`.
+
+    Con `settings.PARTITION_BY_LEAGUE` los resultados van al almacén de su liga (`league_code`),
+    que es el que leen las fuerzas actuales; si no, al almacén conjunto.
+
+    Returns:
+        int: El número de partidos nuevos añadidos.
+    """
+    path = path or league_file_path(settings.STRENGTH_STORE_FILE, league_code if settings.PARTITION_BY_LEAGUE else None)
+    matches_df = results_df.rename(columns=REQUIRED_COLUMNS)
+    matches_df['utc_date'] = pd.to_datetime(matches_df['utc_date'], dayfirst=True)
+    store = load_strength_store(path)
+    num_added = update_strength_store(store, matches_df)
+    if num_added:
+        save_strength_store(store, path)
+    return num_added
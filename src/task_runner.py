@@ -0,0 +1,70 @@
+# src/task_runner.py
+
+"""
+Tareas largas (backtests, barridos) en segundo plano para la app de Streamlit.
+
+Streamlit vuelve a ejecutar el script entero en cada interacción; si un backtest se
+ejecuta dentro del script, la interfaz se queda bloqueada hasta que termina. Aquí las
+tareas se lanzan en un hilo del proceso y la app solo consulta su estado y su progreso.
+El registro de tareas es de todo el proceso, así que sobrevive a los reruns.
+Cada tarea se perfila (o no) según el modo de perfilado de quien la lanzó, no el de otras sesiones.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.instrumentation import get_last_trace, current_profile_mode, profiling
+
+# Un par de hilos: los backtests usan NumPy y no tiene sentido lanzar muchos a la vez
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='task')
+_tasks = {}
+_tasks_lock = threading.Lock()
+
+def _run_task(task: dict, func, kwargs: dict):
+    def progress(fraction: float, message: str):
+        task.update(progress=fraction, message=message)
+    previous_trace = get_last_trace()
+    try:
+        with profiling(task['profile_mode']):
+            task['result'] = func(progress=progress, **kwargs)
+        task.update(status='done', progress=1.0)
+    except Exception as e:
+        task.update(status='error', error=str(e))
+    finally:
+        # Los tiempos por etapa de la tarea (si la función está instrumentada y la medición activada)
+        trace = get_last_trace()
+        task['trace'] = trace if trace is not previous_trace else None
+        task['finished_at'] = time.time()
+
+def submit_task(name: str, func, **kwargs) -> dict:
+    """
+    Lanza `func(progress=..., **kwargs)` en segundo plano con el nombre `name`, con el modo de perfilado
+    del hilo que la lanza (ver `src.instrumentation.profiling`).
+    Si ya hay una tarea con ese nombre en marcha, no se lanza otra y se devuelve la existente.
+
+    Returns:
+        dict: La tarea: {'name', 'status' ('running', 'done' o 'error'), 'progress' (0-1), 'message',
+        'result', 'error', 'trace' (tiempos por etapa, ver `src.instrumentation`), 'profile_mode', 'started_at', 'finished_at'}.
+    """
+    with _tasks_lock:
+        task = _tasks.get(name)
+        if task is not None and task['status'] == 'running':
+            return task
+        task = {'name': name, 'status': 'running', 'progress': 0.0, 'message': 'En cola...',
+                'result': None, 'error': None, 'trace': None, 'profile_mode': current_profile_mode(),
+                'started_at': time.time(), 'finished_at': None}
+        _tasks[name] = task
+    _executor.submit(_run_task, task, func, kwargs)
+    return task
+
+def get_task(name: str):
+    """Devuelve la tarea con ese nombre (o None si no se ha lanzado nunca)."""
+    return _tasks.get(name)
+
+def pop_task(name: str):
+    """Quita una tarea terminada del registro y la devuelve (None si no existe o sigue en marcha)."""
+    with _tasks_lock:
+        task = _tasks.get(name)
+        if task is None or task['status'] == 'running':
+            return None
+        return _tasks.pop(name)
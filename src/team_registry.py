@@ -0,0 +1,98 @@
+# src/team_registry.py
+
+"""
+Registro de equipos: nombre estándar, id entero estable y todas las variantes conocidas.
+
+Se carga una sola vez desde `settings.TEAM_REGISTRY_FILE` (un CSV con las columnas
+team_id, team, alias). Las columnas de equipos se normalizan de golpe (cada nombre
+distinto se busca una sola vez) y se guardan como categóricas cuyos códigos son los
+ids del registro, así que `serie.cat.codes` da directamente los ids de los equipos.
+
+Los equipos que no están en el archivo se añaden al registro en memoria con ids nuevos
+(a continuación del último); esos ids solo son estables dentro de la misma ejecución.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from config import settings
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def load_team_registry(path: str = None) -> dict:
+    """
+    Lee el archivo del registro.
+
+    Returns:
+        dict: {'aliases': {variante: nombre estándar}, 'team_ids': {nombre estándar: id},
+        'teams': [nombres estándar ordenados por id]}.
+    """
+    path = path or settings.TEAM_REGISTRY_FILE
+    teams, team_ids, aliases = [], {}, {}
+    try:
+        registry_df = pd.read_csv(path, encoding='utf-8', dtype={'team': str, 'alias': str})
+    except FileNotFoundError:
+        print(f"No se encontró el registro de equipos {path}; se usarán los nombres tal cual.")
+        return {'aliases': aliases, 'team_ids': team_ids, 'teams': teams}
+
+    for team_id, team in registry_df.drop_duplicates('team_id').sort_values('team_id')[['team_id', 'team']].itertuples(index=False):
+        if team_id != len(teams):
+            print(f"Aviso: los ids del registro de equipos no son consecutivos (se esperaba {len(teams)} y hay {team_id}).")
+        team_ids[team] = len(teams)
+        teams.append(team)
+    aliases = dict(zip(registry_df['alias'], registry_df['team']))
+    aliases.update({team: team for team in teams})
+    return {'aliases': aliases, 'team_ids': team_ids, 'teams': teams}
+
+def get_team_registry() -> dict:
+    """Devuelve el registro, cargándolo la primera vez."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_team_registry()
+    return _registry
+
+def _register_teams(names) -> np.ndarray:
+    """Devuelve los ids de unos nombres ya normalizados, dando de alta los que falten."""
+    registry = get_team_registry()
+    team_ids = registry['team_ids']
+    missing = [name for name in names if name not in team_ids]
+    if missing:
+        with _registry_lock:
+            for name in missing:
+                if name not in team_ids:
+                    team_ids[name] = len(registry['teams'])
+                    registry['teams'].append(name)
+    return np.array([team_ids[name] for name in names], dtype=np.int64)
+
+def normalize_team_name(name: str) -> str:
+    """Devuelve el nombre estándar de un equipo (o el original si no está en el registro)."""
+    return get_team_registry()['aliases'].get(name, name)
+
+def normalize_team_column(values) -> pd.Series:
+    """
+    Normaliza una columna entera de nombres de equipos.
+
+    Args:
+        values (array-like): Nombres de equipos (cualquier variante). Los valores nulos se mantienen.
+
+    Returns:
+        pd.Series: Columna categórica con los nombres estándar; sus códigos son los ids del registro.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    codes, uniques = pd.factorize(series)
+    aliases = get_team_registry()['aliases']
+    unique_ids = _register_teams([aliases.get(name, name) for name in uniques])
+    ids = np.where(codes >= 0, unique_ids[np.maximum(codes, 0)] if len(unique_ids) else -1, -1)
+    categorical = pd.Categorical.from_codes(ids, categories=list(get_team_registry()['teams']))
+    return pd.Series(categorical, index=series.index, name=series.name)
+
+def get_team_ids(values) -> np.ndarray:
+    """Devuelve el id del registro de cada nombre de equipo (-1 para los nulos)."""
+    return normalize_team_column(values).cat.codes.to_numpy(dtype=np.int64)
+
+def get_team_names(team_ids) -> np.ndarray:
+    """Devuelve los nombres estándar de unos ids del registro."""
+    return np.asarray(get_team_registry()['teams'], dtype=object)[np.asarray(team_ids, dtype=np.int64)]
@@ -1,82 +1,120 @@
 # src/utils.py (Versión Final Ampliada)
 import pandas as pd
+import hashlib
+import glob
 import os
+import threading
+from config import settings
+# El registro de equipos vive en su propio módulo; normalize_team_name se sigue importando desde aquí
+from src.team_registry import normalize_team_name, normalize_team_column
 
-def load_and_prepare_data(files: list) -> pd.DataFrame:
-    all_seasons_df = []
-    for file_path in files:
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_csv(file_path, encoding='latin1')
-                # Extraemos el código de la liga del nombre del archivo (ej. 'SP1' de 'data/SP1_2022_2023.csv')
-                league_code = os.path.basename(file_path).split('_')[0]
-                df['league_code'] = league_code
+# Columnas de football-data.co.uk que usamos y su nombre interno
+REQUIRED_COLUMNS = {'Date': 'utc_date', 'HomeTeam': 'home_team_name', 'AwayTeam': 'away_team_name', 'FTHG': 'home_team_score', 'FTAG': 'away_team_score', 'B365H': 'home_win_odds', 'B365D': 'draw_odds', 'B365A': 'away_win_odds'}
 
-                required_cols = {'Date': 'utc_date', 'HomeTeam': 'home_team_name', 'AwayTeam': 'away_team_name', 'FTHG': 'home_team_score', 'FTAG': 'away_team_score', 'B365H': 'home_win_odds', 'B365D': 'draw_odds', 'B365A': 'away_win_odds', 'league_code': 'league_code'}
-                df = df[list(required_cols.keys())].rename(columns=required_cols)
-                df['utc_date'] = pd.to_datetime(df['utc_date'], dayfirst=True)
-                df.dropna(inplace=True)
-                all_seasons_df.append(df)
-            except Exception as e:
-                print(f"Error procesando el archivo {file_path}: {e}")
-    return pd.concat(all_seasons_df, ignore_index=True) if all_seasons_df else pd.DataFrame()
+def _cache_prefix(file_path: str) -> str:
+    """Prefijo del fichero de caché de un CSV: nombre del CSV + hash de su ruta absoluta."""
+    path_hash = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:10]
+    return os.path.join(settings.DATA_CACHE_DIR, f"{os.path.splitext(os.path.basename(file_path))[0]}-{path_hash}")
+
+def _cache_path(file_path: str) -> str:
+    """
+    Ruta del fichero Feather que cachea un CSV ya preparado.
+    La clave incluye el mtime y el tamaño del CSV, así que si el archivo cambia la caché deja de coincidir.
+    """
+    file_stat = os.stat(file_path)
+    return f"{_cache_prefix(file_path)}-{file_stat.st_mtime_ns}-{file_stat.st_size}.feather"
+
+def read_and_prepare_csv(file_path: str, require_odds: bool = True) -> pd.DataFrame:
+    """
+    Lee un CSV de football-data (solo las columnas que usamos) y lo deja en nuestro formato.
+    Con `require_odds=False` se conservan los partidos sin cuotas (ej. los añadidos por el actualizador).
+    """
+    # Los CSV de football-data suelen venir en UTF-8, pero algunos antiguos están en latin1
+    try:
+        df = pd.read_csv(file_path, encoding='utf-8', usecols=list(REQUIRED_COLUMNS.keys()))
+    except UnicodeDecodeError:
+        df = pd.read_csv(file_path, encoding='latin1', usecols=list(REQUIRED_COLUMNS.keys()))
+    df = df[list(REQUIRED_COLUMNS.keys())].rename(columns=REQUIRED_COLUMNS)
+    # Extraemos el código de la liga del nombre del archivo (ej. 'SP1' de 'data/SP1_2022_2023.csv')
+    df['league_code'] = os.path.basename(file_path).split('_')[0]
+    df['utc_date'] = pd.to_datetime(df['utc_date'], dayfirst=True)
+    df.dropna(subset=None if require_odds else ['utc_date', 'home_team_name', 'away_team_name', 'home_team_score', 'away_team_score'], inplace=True)
+    return df.reset_index(drop=True)
 
-def normalize_team_name(name: str) -> str:
+def _load_prepared_csv(file_path: str) -> pd.DataFrame:
     """
-    Función definitiva que usa un diccionario para estandarizar cualquier nombre de equipo.
+    Devuelve un CSV ya preparado, leyéndolo de la caché columnar si está al día.
+    Si pyarrow no está disponible o la caché falla, se lee el CSV como siempre.
     """
-    # Clave: Cualquier variación posible. Valor: El nombre estándar que usaremos siempre.
-    name_map = {
-        # Premier League
-        'West Ham': 'West Ham', 'West Ham United': 'West Ham',
-        'Wolves': 'Wolves', 'Wolverhampton Wanderers': 'Wolves',
-        'Nott\'m Forest': 'Nottingham Forest', 'Nottingham Forest': 'Nottingham Forest',
-        'Man United': 'Man United', 'Manchester United': 'Man United',
-        'Newcastle': 'Newcastle', 'Newcastle United': 'Newcastle',
-        'Tottenham': 'Tottenham', 'Tottenham Hotspur': 'Tottenham',
-        'Brighton': 'Brighton', 'Brighton & Hove Albion': 'Brighton',
-        'Leeds': 'Leeds', 'Leeds United': 'Leeds',
-        'Leicester': 'Leicester', 'Leicester City': 'Leicester',
-        'Arsenal': 'Arsenal', 'Everton': 'Everton', 'Liverpool': 'Liverpool',
-        'Chelsea': 'Chelsea', 'Crystal Palace': 'Crystal Palace', 'Brentford': 'Brentford',
-        'Aston Villa': 'Aston Villa', 'Bournemouth': 'Bournemouth', 'Fulham': 'Fulham',
-        'Man City': 'Man City', 'Manchester City': 'Man City',
+    cache_path = _cache_path(file_path)
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_feather(cache_path)
+        except Exception:
+            pass
 
-        # La Liga
-        'Athletic Bilbao': 'Athletic Bilbao', 'Athletic Club': 'Athletic Bilbao',
-        'Mallorca': 'Mallorca', 'RCD Mallorca': 'Mallorca',
-        'Osasuna': 'Osasuna', 'CA Osasuna': 'Osasuna',
-        'Espanol': 'Espanyol', 'RCD Espanyol': 'Espanyol', 'RCD Espanyol Barcelona': 'Espanyol',
-        'Cadiz': 'Cadiz', 'Cádiz CF': 'Cadiz',
-        'Atletico Madrid': 'Atletico Madrid', 'Atlético Madrid': 'Atletico Madrid',
-        'Almeria': 'Almeria', 'UD Almería': 'Almeria',
-        'Celta Vigo': 'Celta Vigo', 'RC Celta': 'Celta Vigo',
-        'Elche': 'Elche', 'Elche CF': 'Elche',
-        'Betis': 'Real Betis', 'Real Betis': 'Real Betis', 'Real Betis Balompié': 'Real Betis',
-        'Real Madrid': 'Real Madrid', 'Sevilla': 'Sevilla', 'Valencia': 'Valencia',
-        'Girona': 'Girona', 'Getafe': 'Getafe', 'Real Sociedad': 'Real Sociedad',
-        'Villarreal': 'Villarreal', 'Rayo Vallecano': 'Rayo Vallecano', 'Las Palmas': 'Las Palmas',
-        'Alaves': 'Alaves', 'Levante': 'Levante', 'Oviedo': 'Oviedo',
+    df = read_and_prepare_csv(file_path)
+    try:
+        os.makedirs(settings.DATA_CACHE_DIR, exist_ok=True)
+        # Borramos las versiones antiguas de este mismo CSV antes de escribir la nueva
+        for stale_path in glob.glob(f"{glob.escape(_cache_prefix(file_path))}-*.feather"):
+            os.remove(stale_path)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        df.to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        pass
+    return df
 
-        # --- NUEVOS EQUIPOS ---
-        # Bundesliga (Alemania)
-        'Bayern Munich': 'Bayern Munich',
-        'Bayer Leverkusen': 'Leverkusen', 'Leverkusen': 'Leverkusen',
-        'Dortmund': 'Dortmund', 'Borussia Dortmund': 'Dortmund',
-        'Ein Frankfurt': 'Eintracht Frankfurt', 'Eintracht Frankfurt': 'Eintracht Frankfurt',
-        'RB Leipzig': 'RB Leipzig', 'Leipzig': 'RB Leipzig',
-        'FC Koln': 'FC Koln', 'Koln': 'FC Koln',
+# Copias en memoria de lo ya cargado, por lista de archivos (válidas mientras no cambie ningún archivo)
+_prepared_data_cache = {}
+_prepared_data_lock = threading.Lock()
 
-        # Serie A (Italia)
-        'Inter': 'Inter', 'Inter Milan': 'Inter',
-        'AC Milan': 'AC Milan', 'Milan': 'AC Milan',
-        'Juventus': 'Juventus', 'Roma': 'Roma', 'Napoli': 'Napoli', 'Lazio': 'Lazio',
-        'Atalanta': 'Atalanta', 'Fiorentina': 'Fiorentina',
-        
-        # Ligue 1 (Francia)
-        'Paris SG': 'Paris SG', 'Paris Saint-Germain': 'Paris SG',
-        'Marseille': 'Marseille', 'Lyon': 'Lyon', 'Monaco': 'Monaco', 'Lille': 'Lille', 'Rennes': 'Rennes'
-    }
-    
-    # Si el nombre está en nuestro mapa, devolvemos el estándar. Si no, el original.
-    return name_map.get(name, name)
\ No newline at end of file
+def league_file_path(path: str, league_code: str = None) -> str:
+    """Archivo propio de una liga: 'data/cache/team_strengths.pkl' -> 'data/cache/team_strengths_E0.pkl'. None = el archivo conjunto."""
+    if league_code is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}_{league_code}{extension}"
+
+def files_signature(files: list) -> tuple:
+    """Ruta, mtime y tamaño de cada archivo (None si no existe). Sirve de clave para las cachés en memoria."""
+    signature = []
+    for file_path in files:
+        try:
+            file_stat = os.stat(file_path)
+            signature.append((file_path, file_stat.st_mtime_ns, file_stat.st_size))
+        except OSError:
+            signature.append((file_path, None, None))
+    return tuple(signature)
+
+def load_and_prepare_data(files: list) -> pd.DataFrame:
+    """
+    Carga y unifica los CSV de football-data.
+    Dentro del mismo proceso (ej. la app de Streamlit) el resultado se guarda en memoria y se reutiliza
+    mientras los archivos no cambien; siempre se devuelve una copia, así que se puede modificar sin miedo.
+    """
+    signature = files_signature(files)
+    cached = _prepared_data_cache.get(signature)
+    if cached is not None:
+        return cached.copy()
+
+    all_seasons_df = []
+    for file_path in files:
+        if os.path.exists(file_path):
+            try:
+                all_seasons_df.append(_load_prepared_csv(file_path))
+            except Exception as e:
+                print(f"Error procesando el archivo {file_path}: {e}")
+    if not all_seasons_df:
+        return pd.DataFrame()
+    df = pd.concat(all_seasons_df, ignore_index=True)
+    # Nombres estándar como categóricas: sus códigos son los ids del registro de equipos
+    df['home_team_name'] = normalize_team_column(df['home_team_name'])
+    df['away_team_name'] = normalize_team_column(df['away_team_name'])
+    with _prepared_data_lock:
+        # Solo guardamos la versión más reciente de cada lista de archivos
+        for old_signature in [key for key in _prepared_data_cache if [path for path, _, _ in key] == list(files)]:
+            del _prepared_data_cache[old_signature]
+        _prepared_data_cache[signature] = df
+    return df.copy()
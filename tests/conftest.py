@@ -0,0 +1,15 @@
+# tests/conftest.py
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import team_registry
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    """Registro de equipos recién cargado desde el archivo, como en un proceso nuevo."""
+    monkeypatch.setattr(team_registry, '_registry', team_registry.load_team_registry())
+    return team_registry.get_team_registry()
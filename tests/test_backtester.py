@@ -0,0 +1,135 @@
+# tests/test_backtester.py
+
+import os
+import re
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from src.utils import load_and_prepare_data
+from src.prediction_model import calculate_kelly_criterion
+from src.backtester import (select_value_bets, simulate_kelly_bankroll, simulate_flat_bankroll, run_financial_backtest_by_league,
+                            run_backtest_sequential, _predict_pooled_season, OUTCOME_COLUMNS, ODDS_COLUMNS)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORICAL_FILES = [os.path.join(PROJECT_DIR, path) for path in settings.HISTORICAL_DATA_FILES]
+
+def _random_bets(seed: int, num_matches: int = 400):
+    rng = np.random.default_rng(seed)
+    probs = rng.dirichlet([4, 2.5, 3], num_matches)
+    odds = 1 / probs * rng.uniform(0.8, 1.25, (num_matches, 3))
+    odds[rng.random((num_matches, 3)) < 0.05] = np.nan
+    outcomes = np.array([rng.choice(3, p=p) for p in probs])
+    return probs, odds, outcomes
+
+def _loop_select(probs: np.ndarray, odds: np.ndarray, min_edge: float):
+    """Selección de referencia partido a partido: la primera apuesta de valor (local, empate, visitante) con edge suficiente."""
+    selection, bet_odds, model_prob = [], [], []
+    for match_probs, match_odds in zip(probs, odds):
+        value = [k for k in range(3) if not np.isnan(match_odds[k]) and match_probs[k] * match_odds[k] > 1.0]
+        if value and match_probs[value[0]] * match_odds[value[0]] - 1 >= min_edge:
+            selection.append(value[0])
+            bet_odds.append(match_odds[value[0]])
+            model_prob.append(match_probs[value[0]])
+        else:
+            selection.append(-1)
+    return np.array(selection), bet_odds, model_prob
+
+def _loop_kelly(selection, bet_odds, model_prob, outcomes, initial_bankroll: float, kelly_fraction: float):
+    """El bucle del backtest original: la apuesta sale del bankroll y, si acierta, vuelve multiplicada por la cuota."""
+    bankroll, total_staked, bets_placed = initial_bankroll, 0.0, 0
+    for choice, odds, prob, outcome in zip(selection, bet_odds, model_prob, outcomes):
+        if choice < 0:
+            continue
+        stake = bankroll * calculate_kelly_criterion(prob, odds) * kelly_fraction
+        if stake > 0:
+            bets_placed += 1
+            total_staked += stake
+            bankroll -= stake
+            if choice == outcome:
+                bankroll += stake * odds
+    return bankroll, total_staked, bets_placed
+
+@pytest.mark.parametrize('seed, min_edge, kelly_fraction', [(0, 0.0, 0.5), (1, 0.05, 0.25), (2, 0.1, 1.0)])
+def test_kelly_bankroll_matches_loop(seed, min_edge, kelly_fraction):
+    probs, odds, outcomes = _random_bets(seed)
+    selection, bet_odds, model_prob = select_value_bets(probs, odds, min_edge)
+    expected_selection, _, _ = _loop_select(probs, odds, min_edge)
+    np.testing.assert_array_equal(selection, expected_selection)
+    assert (selection >= 0).sum() > 20
+    final, staked, placed = simulate_kelly_bankroll(selection, bet_odds, model_prob, outcomes, 100.0, kelly_fraction)
+    expected = _loop_kelly(selection, bet_odds, model_prob, outcomes, 100.0, kelly_fraction)
+    assert final == pytest.approx(expected[0], rel=1e-10)
+    assert staked == pytest.approx(expected[1], rel=1e-10)
+    assert placed == expected[2]
+
+def test_flat_bankroll_matches_loop():
+    probs, odds, outcomes = _random_bets(3)
+    selection, bet_odds, _ = select_value_bets(probs, odds, 0.05)
+    final, staked, placed = simulate_flat_bankroll(selection, bet_odds, outcomes, 100.0, 2.0)
+    bankroll = 100.0
+    for choice, price, outcome in zip(selection, bet_odds, outcomes):
+        if choice >= 0:
+            bankroll += 2.0 * price - 2.0 if choice == outcome else -2.0
+    assert final == pytest.approx(bankroll, rel=1e-12)
+    assert (staked, placed) == (2.0 * (selection >= 0).sum(), (selection >= 0).sum())
+
+def test_all_three_outcomes_can_be_bet():
+    # El backtest original solo podía apostar al empate (las cuotas de local y visitante no llegaban con su nombre)
+    probs = np.array([[0.6, 0.25, 0.15], [0.3, 0.4, 0.3], [0.2, 0.25, 0.55], [0.5, 0.3, 0.2]])
+    odds = np.array([[2.0, 3.5, 6.0], [3.0, 3.0, 3.0], [5.0, 3.6, 2.0], [1.9, 3.2, 4.5]])
+    selection, bet_odds, _ = select_value_bets(probs, odds, 0.05)
+    assert selection.tolist() == [0, 1, 2, -1]
+    np.testing.assert_array_equal(bet_odds[:3], [2.0, 3.0, 2.0])
+
+@pytest.fixture(scope='module')
+def season_2024():
+    full_df = load_and_prepare_data(HISTORICAL_FILES)
+    test_df = full_df[(full_df['utc_date'] >= '2024-08-01') & (full_df['utc_date'] <= '2025-07-31')].copy()
+    return full_df, test_df
+
+def test_legacy_rules_reproduce_the_original_kelly_figures(season_2024):
+    # Con las reglas antiguas (un solo modelo para todas las ligas, solo empates, probabilidad redondeada a
+    # 2 decimales del porcentaje) el núcleo da los bankrolls que guardó el backtest original en financial_log.csv
+    full_df, test_df = season_2024
+    predicted = _predict_pooled_season(full_df, test_df, 2024, walk_forward=False).sort_values(by='utc_date', kind='stable')
+    probs, odds = predicted[OUTCOME_COLUMNS].to_numpy(), predicted[ODDS_COLUMNS].to_numpy(dtype=float, copy=True)
+    odds[:, [0, 2]] = np.nan
+    draw_prob = np.round(probs[:, 1], 4)
+    selection = np.where((probs[:, 1] * odds[:, 1] > 1.0) & (draw_prob * odds[:, 1] - 1 >= 0.05), 1, -1)
+    outcomes = np.sign(predicted['away_team_score'].to_numpy() - predicted['home_team_score'].to_numpy()) + 1
+    original = {'SP1': 57.89372325181076, 'E0': 83.27387774213858, 'F1': 49.23228966830117, 'I1': 76.51880518131117, 'D1': 99.51636163077903}
+    for league_code, bankroll in original.items():
+        league = (predicted['league_code'] == league_code).to_numpy()
+        final, _, _ = simulate_kelly_bankroll(selection[league], odds[league, 1], draw_prob[league], outcomes[league], 100.0, 0.5)
+        assert final == pytest.approx(bankroll, rel=1e-9), league_code
+
+def test_corrected_kelly_backtest_figures(season_2024, tmp_path, monkeypatch):
+    # Con las tres apuestas, un modelo por liga y la probabilidad completa, los bankrolls de 2024/25 cambian mucho:
+    # La Liga pasa de 57.89 a 6.93 y la Premier de 83.27 a 1.49. Esta prueba fija las cifras corregidas
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, 'PARTITION_BY_LEAGUE', True)
+    report = run_financial_backtest_by_league(HISTORICAL_FILES, 2024, walk_forward=False, model='ratios')
+    finals = dict(re.findall(r"--- (.+?) \| Temporada 2024/2025 ---\n  - Resultado: Bankroll Final: ([\d.]+)", report))
+    assert finals == {'La Liga': '6.93', 'Premier League': '1.49', 'Ligue 1': '22.23', 'Serie A': '94.80', 'Bundesliga': '9.26'}
+    log_df = pd.read_csv(tmp_path / 'financial_log.csv').set_index('league')
+    assert log_df.loc['La Liga', 'final_bankroll'] == pytest.approx(6.93, abs=0.005)
+    assert log_df.loc['Premier League', 'final_bankroll'] == pytest.approx(1.49, abs=0.005)
+
+def test_backtest_logs_keep_each_model_apart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Un log de antes de la columna 'model' (el modelo conjunto de medias)
+    pd.DataFrame([{'timestamp': '2025-08-26 14:28:40', 'season_tested': '2024/2025', 'accuracy': 51.49863760217984, 'hc_accuracy': 63.925233644859816}]
+                 ).to_csv(tmp_path / 'performance_log.csv', index=False)
+    monkeypatch.setattr(settings, 'PARTITION_BY_LEAGUE', True)
+    run_backtest_sequential(HISTORICAL_FILES, [2024], model='ratios')
+    log_df = pd.read_csv(tmp_path / 'performance_log.csv').set_index('model')
+    # Un modelo por liga sube la precisión de 2024/25 del 51.50% al 52.52%, sin pisar la fila del modelo conjunto
+    assert log_df['accuracy'].round(2).to_dict() == {'ratios (conjunto)': 51.50, 'ratios (por liga)': 52.52}
+
+    # Volver al modelo conjunto sustituye su propia fila, no la del modelo por liga
+    monkeypatch.setattr(settings, 'PARTITION_BY_LEAGUE', False)
+    run_backtest_sequential(HISTORICAL_FILES, [2024], model='ratios')
+    log_df = pd.read_csv(tmp_path / 'performance_log.csv')
+    assert sorted(log_df['model']) == ['ratios (conjunto)', 'ratios (por liga)']
+    assert log_df.set_index('model').loc['ratios (conjunto)', 'accuracy'] == pytest.approx(51.49863760217984, rel=1e-12)
@@ -0,0 +1,28 @@
+# tests/test_data_analyzer.py
+
+import numpy as np
+from src.data_analyzer import calculate_expected_goals
+
+STRENGTH_COLUMNS = ['attack_strength_home', 'defense_strength_home', 'attack_strength_away', 'defense_strength_away']
+
+def _stats(team_strengths: dict) -> dict:
+    return {'league_avg_home_goals': 1.5, 'league_avg_away_goals': 1.2,
+            'team_strengths': {team: dict.fromkeys(STRENGTH_COLUMNS, value) for team, value in team_strengths.items()}}
+
+def test_expected_goals_with_unregistered_teams(fresh_registry):
+    # Fuerzas de un almacén cargado en un proceso nuevo: dos ascendidos que aún no están en el registro
+    assert 'Ascendido Uno' not in fresh_registry['team_ids']
+    stats = _stats({'Arsenal': 1.0, 'Chelsea': 0.5, 'Ascendido Uno': 0.8, 'Ascendido Dos': 1.2})
+    expected_home, expected_away, known = calculate_expected_goals(stats, ['Arsenal', None], ['Chelsea', 'Arsenal'])
+    np.testing.assert_allclose(expected_home[0], 1.0 * 0.5 * 1.5)
+    np.testing.assert_allclose(expected_away[0], 0.5 * 1.0 * 1.2)
+    # Un nombre nulo nunca se da por conocido
+    assert known.tolist() == [True, False]
+    assert np.isnan(expected_home[1])
+
+def test_expected_goals_with_one_unregistered_team(fresh_registry):
+    # Con un solo equipo nuevo, su fila no puede ser la reservada a los nombres nulos
+    stats = _stats({'Arsenal': 1.0, 'Chelsea': 0.5, 'Ascendido Tres': 0.9})
+    expected_home, _, known = calculate_expected_goals(stats, [None, 'Arsenal'], ['Arsenal', 'Chelsea'])
+    assert known.tolist() == [False, True]
+    assert np.isnan(expected_home[0])
@@ -0,0 +1,111 @@
+# tests/test_data_fetcher.py
+
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from config import settings
+from src import data_fetcher
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class _FrozenDatetime(datetime):
+    frozen = None
+    @classmethod
+    def now(cls, tz=None):
+        return cls.frozen
+
+@pytest.fixture
+def api_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'API_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(settings, 'API_CACHE_TTL', {'odds': 600, 'scores': 600})
+    monkeypatch.setattr(settings, 'API_CACHE_STALE', {'odds': 3600, 'scores': 3600})
+    monkeypatch.setattr(settings, 'API_CACHE_WINDOW_SECONDS', 3600)
+    monkeypatch.setattr(data_fetcher, 'datetime', _FrozenDatetime)
+    requests = []
+    def fake_get_json(uri, params, error_label):
+        requests.append(params)
+        start = datetime.strptime(params['commenceTimeFrom'], '%Y-%m-%dT%H:%M:%SZ')
+        # Un partido cada hora dentro de la ventana pedida
+        return [{'id': str(hour), 'commence_time': (start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%SZ')}
+                for hour in range(1, 80)
+                if (start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%SZ') <= params['commenceTimeTo']]
+    monkeypatch.setattr(data_fetcher, '_get_json', fake_get_json)
+    return requests
+
+def test_odds_key_changes_with_the_window(api_cache):
+    moment = datetime(2025, 9, 1, 10, 5, tzinfo=timezone.utc)
+    key = data_fetcher.odds_cache_key('soccer_epl', 'eu', 'h2h', 72, moment)
+    assert data_fetcher.odds_cache_key('soccer_epl', 'eu', 'h2h', 72, moment + timedelta(minutes=50)) == key
+    assert data_fetcher.odds_cache_key('soccer_epl', 'eu', 'h2h', 72, moment + timedelta(minutes=55)) != key
+
+def test_matches_entering_the_window_are_fetched(api_cache):
+    _FrozenDatetime.frozen = datetime(2025, 9, 1, 10, 5, tzinfo=timezone.utc)
+    first = data_fetcher.get_future_odds_from_api('key', 'soccer_epl', 'eu', 'h2h', 72)
+    # La petición cubre la ventana de cualquier consulta del tramo
+    assert api_cache[0]['commenceTimeTo'] == '2025-09-04T11:00:00Z'
+    assert max(match['commence_time'] for match in first) <= '2025-09-04T10:05:00Z'
+
+    # Dentro del mismo tramo se usa la copia, sin perder partidos de la ventana
+    _FrozenDatetime.frozen = datetime(2025, 9, 1, 10, 50, tzinfo=timezone.utc)
+    same_window = data_fetcher.get_future_odds_from_api('key', 'soccer_epl', 'eu', 'h2h', 72)
+    assert len(api_cache) == 1
+    assert max(match['commence_time'] for match in same_window) == '2025-09-04T10:05:00Z'
+
+    # En el tramo siguiente se vuelve a pedir aunque la copia siga dentro del TTL
+    _FrozenDatetime.frozen = datetime(2025, 9, 1, 11, 1, tzinfo=timezone.utc)
+    data_fetcher.get_future_odds_from_api('key', 'soccer_epl', 'eu', 'h2h', 72)
+    assert len(api_cache) == 2
+    assert api_cache[1]['commenceTimeTo'] == '2025-09-04T12:00:00Z'
+
+def test_background_refresh_finishes_before_exit(tmp_path):
+    # Un script que recibe una copia caducada (dentro de la ventana "stale") y termina enseguida
+    key_parts = data_fetcher.scores_cache_key('soccer_epl', 3)
+    script = f"""
+import time
+from config import settings
+from src import data_fetcher
+settings.API_CACHE_DIR = {str(tmp_path)!r}
+path = data_fetcher._cache_path('scores', {key_parts!r})
+data_fetcher._write_json_atomic(path, {{'fetched_at': time.time() - settings.API_CACHE_TTL['scores'] - 1, 'data': ['vieja']}})
+def slow_get_json(uri, params, error_label):
+    time.sleep(0.5)
+    return ['nueva']
+data_fetcher._get_json = slow_get_json
+assert data_fetcher.get_recent_scores_from_api('key', 'soccer_epl', 3) == ['vieja']
+"""
+    subprocess.run([sys.executable, '-c', script], cwd=PROJECT_DIR, check=True, timeout=60)
+    cache_files = os.listdir(tmp_path)
+    assert len(cache_files) == 1
+    with open(os.path.join(tmp_path, cache_files[0]), encoding='utf-8') as f:
+        assert json.load(f)['data'] == ['nueva']
+
+def test_background_refresh_keeps_stdout_clean(tmp_path):
+    # El refresco termina después de que el script haya impreso su JSON: stdout solo debe tener el JSON
+    key_parts = data_fetcher.scores_cache_key('soccer_epl', 3)
+    script = f"""
+import json
+import time
+from config import settings
+from src import data_fetcher
+settings.API_CACHE_DIR = {str(tmp_path)!r}
+path = data_fetcher._cache_path('scores', {key_parts!r})
+data_fetcher._write_json_atomic(path, {{'fetched_at': time.time() - settings.API_CACHE_TTL['scores'] - 1, 'data': ['vieja']}})
+class SlowResponse:
+    headers = {{'x-requests-remaining': '42'}}
+    def raise_for_status(self):
+        pass
+    def json(self):
+        return ['nueva']
+class SlowSession:
+    def get(self, uri, params=None, timeout=None):
+        time.sleep(0.5)
+        return SlowResponse()
+data_fetcher._session = SlowSession()
+print(json.dumps(data_fetcher.get_recent_scores_from_api('key', 'soccer_epl', 3)))
+"""
+    result = subprocess.run([sys.executable, '-c', script], cwd=PROJECT_DIR, check=True, timeout=60, capture_output=True, text=True)
+    assert json.loads(result.stdout) == ['vieja']
+    assert 'Peticiones restantes a The Odds API: 42' in result.stderr
@@ -0,0 +1,89 @@
+# tests/test_dixon_coles.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import poisson
+from src.dixon_coles import _negative_log_likelihood, fit_dixon_coles, dixon_coles_strengths, dixon_coles_expected_goals
+from src.data_analyzer import calculate_expected_goals
+from src.team_registry import get_team_ids
+
+NUM_TEAMS = 6
+
+def _likelihood_data(seed: int = 0, num_matches: int = 200) -> dict:
+    """Datos en el formato interno de `fit_dixon_coles`, con bastantes marcadores bajos y pesos distintos."""
+    rng = np.random.default_rng(seed)
+    home = rng.integers(0, NUM_TEAMS, num_matches)
+    away = (home + rng.integers(1, NUM_TEAMS, num_matches)) % NUM_TEAMS
+    home_goals = rng.poisson(1.4, num_matches).astype(float)
+    away_goals = rng.poisson(1.1, num_matches).astype(float)
+    weights = np.exp(-0.01 * rng.integers(0, 300, num_matches))
+    low = np.flatnonzero((home_goals <= 1) & (away_goals <= 1))
+    return {'home': home, 'away': away, 'home_goals': home_goals, 'away_goals': away_goals, 'weights': weights,
+            'total_weight': weights.sum(), 'low_score': low,
+            'is_0_0': (home_goals[low] == 0) & (away_goals[low] == 0),
+            'is_0_1': (home_goals[low] == 0) & (away_goals[low] == 1),
+            'is_1_0': (home_goals[low] == 1) & (away_goals[low] == 0)}
+
+def _random_params(use_rho: bool, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    params = np.concatenate([[np.log(1.3), 0.25], rng.normal(0, 0.3, 2 * NUM_TEAMS)])
+    return np.append(params, -0.08) if use_rho else params
+
+@pytest.mark.parametrize('use_rho', [False, True])
+def test_gradient_matches_finite_differences(use_rho):
+    data, params = _likelihood_data(), _random_params(use_rho)
+    _, grad = _negative_log_likelihood(params, data, NUM_TEAMS, use_rho, 1e-3)
+    step = 1e-6
+    numeric = np.empty_like(params)
+    for i in range(len(params)):
+        shift = np.zeros_like(params)
+        shift[i] = step
+        numeric[i] = (_negative_log_likelihood(params + shift, data, NUM_TEAMS, use_rho, 1e-3)[0]
+                      - _negative_log_likelihood(params - shift, data, NUM_TEAMS, use_rho, 1e-3)[0]) / (2 * step)
+    np.testing.assert_allclose(grad, numeric, rtol=1e-5, atol=1e-8)
+
+def test_value_matches_direct_likelihood():
+    data, params = _likelihood_data(), _random_params(use_rho=True)
+    value, _ = _negative_log_likelihood(params, data, NUM_TEAMS, True, 0.0)
+    intercept, home_advantage, rho = params[0], params[1], params[-1]
+    attack, defense = params[2:2 + NUM_TEAMS], params[2 + NUM_TEAMS:2 + 2 * NUM_TEAMS]
+    total, constant = 0.0, 0.0
+    for h, a, hg, ag, w in zip(data['home'], data['away'], data['home_goals'], data['away_goals'], data['weights']):
+        lambda_home = np.exp(intercept + home_advantage + attack[h] + defense[a])
+        lambda_away = np.exp(intercept + attack[a] + defense[h])
+        tau = {(0, 0): 1 - lambda_home * lambda_away * rho, (0, 1): 1 + lambda_home * rho,
+               (1, 0): 1 + lambda_away * rho, (1, 1): 1 - rho}.get((hg, ag), 1.0)
+        total += w * (poisson.logpmf(hg, lambda_home) + poisson.logpmf(ag, lambda_away) + np.log(tau))
+        # El modelo no incluye log(k!), que no depende de los parámetros
+        constant += w * (poisson.logpmf(hg, 1.0) + poisson.logpmf(ag, 1.0) + 2.0)
+    assert value == pytest.approx(-(total - constant) / data['total_weight'], rel=1e-10)
+
+def _simulated_matches(seed: int = 2) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    teams = ['Arsenal', 'Chelsea', 'Liverpool', 'Everton', 'Fulham', 'Brentford']
+    attack = dict(zip(teams, [0.4, 0.2, 0.3, -0.3, -0.2, -0.4]))
+    defense = dict(zip(teams, [-0.3, -0.2, -0.3, 0.2, 0.3, 0.3]))
+    rows = []
+    for season in range(6):
+        for home in teams:
+            for away in teams:
+                if home != away:
+                    rows.append({'utc_date': pd.Timestamp('2020-08-01') + pd.Timedelta(days=7 * len(rows) // 15),
+                                 'home_team_name': home, 'away_team_name': away,
+                                 'home_team_score': rng.poisson(np.exp(0.1 + 0.3 + attack[home] + defense[away])),
+                                 'away_team_score': rng.poisson(np.exp(0.1 + attack[away] + defense[home]))})
+    return pd.DataFrame(rows)
+
+def test_fit_recovers_parameters_and_strengths_reproduce_expected_goals():
+    matches = _simulated_matches()
+    fit = fit_dixon_coles(matches, time_decay=0.0, use_rho=True)
+    assert fit['home_advantage'] == pytest.approx(0.3, abs=0.1)
+    attack = dict(zip(fit['teams'], fit['attack']))
+    assert attack['Arsenal'] > attack['Everton'] and attack['Liverpool'] > attack['Brentford']
+    # Las fuerzas en el formato de siempre dan los mismos goles esperados que el ajuste
+    home, away = ['Arsenal', 'Fulham', 'Chelsea'], ['Brentford', 'Liverpool', 'Everton']
+    from_strengths = calculate_expected_goals(dixon_coles_strengths(fit), home, away)
+    from_fit = dixon_coles_expected_goals(fit, get_team_ids(home), get_team_ids(away))
+    for left, right in zip(from_strengths, from_fit):
+        np.testing.assert_allclose(left, right, rtol=1e-12)
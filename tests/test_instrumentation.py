@@ -0,0 +1,72 @@
+# tests/test_instrumentation.py
+
+import json
+import threading
+import time
+from config import settings
+from src import instrumentation
+from src.instrumentation import traced, span, profiling, current_profile_mode, get_last_trace, export_trace
+from src.task_runner import submit_task, get_task
+
+@traced
+def _traced_stage(progress=None):
+    with span('etapa') as stage:
+        stage.count('filas', 3)
+    return current_profile_mode()
+
+def test_spans_are_recorded(monkeypatch):
+    monkeypatch.setattr(settings, 'TIMING_LOG_FILE', None)
+    _traced_stage()
+    trace = get_last_trace()
+    assert [record['path'] for record in trace['spans']] == ['_traced_stage', '_traced_stage/etapa']
+    assert trace['spans'][1]['counters'] == {'filas': 3}
+
+def test_profile_mode_is_per_thread(monkeypatch):
+    monkeypatch.setattr(settings, 'PROFILE_MODE', None)
+    seen = {}
+    inside = threading.Event()
+    release = threading.Event()
+    def other_session():
+        inside.wait()
+        seen['other'] = current_profile_mode()
+        release.set()
+    thread = threading.Thread(target=other_session)
+    thread.start()
+    with profiling('sampling'):
+        inside.set()
+        release.wait()
+        seen['own'] = current_profile_mode()
+    thread.join()
+    assert seen == {'own': 'sampling', 'other': None}
+    assert current_profile_mode() is None
+    # None desactiva el perfilado aunque el proceso lo tenga activado
+    monkeypatch.setattr(settings, 'PROFILE_MODE', 'cprofile')
+    with profiling(None):
+        assert current_profile_mode() is None
+    assert current_profile_mode() == 'cprofile'
+
+def test_task_keeps_the_submitter_profile_mode(monkeypatch):
+    monkeypatch.setattr(settings, 'PROFILE_MODE', None)
+    monkeypatch.setattr(settings, 'TIMING_LOG_FILE', None)
+    monkeypatch.setattr(instrumentation, '_start_profiler', lambda mode: (None, None))
+    with profiling('cprofile'):
+        submit_task('perfilada', _traced_stage)
+    submit_task('sin perfilar', _traced_stage)
+    for name in ['perfilada', 'sin perfilar']:
+        while get_task(name)['status'] == 'running':
+            time.sleep(0.01)
+    assert get_task('perfilada')['result'] == 'cprofile'
+    assert get_task('sin perfilar')['result'] is None
+    assert get_task('perfilada')['trace']['name'] == '_traced_stage'
+
+def test_timing_log_is_rotated(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'TIMING_LOG_FILE', None)
+    path = str(tmp_path / 'timings.jsonl')
+    _traced_stage()
+    trace = get_last_trace()
+    for _ in range(20):
+        export_trace(trace, path, max_bytes=1000)
+    assert (tmp_path / 'timings.jsonl').stat().st_size < 1000 + 1000
+    assert (tmp_path / 'timings.jsonl.1').stat().st_size < 1000 + 1000
+    lines = (tmp_path / 'timings.jsonl').read_text(encoding='utf-8').splitlines()
+    assert json.loads(lines[0])['span'] == '_traced_stage'
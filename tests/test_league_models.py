@@ -0,0 +1,68 @@
+# tests/test_league_models.py
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from src import dixon_coles
+from src.data_analyzer import calculate_team_strengths
+from src.league_models import get_current_league_strengths
+from src.strength_store import add_results_to_strength_store, load_strength_store
+
+def _league(league_code: str, seed: int, num_teams: int = 6) -> pd.DataFrame:
+    """Doble vuelta entre equipos inventados de una liga, con goles Poisson."""
+    rng = np.random.default_rng(seed)
+    teams = [f'{league_code} Team {i}' for i in range(num_teams)]
+    fixtures = [(home, away) for home in teams for away in teams if home != away]
+    dates = pd.date_range('2024-08-10', periods=len(fixtures), freq='D')
+    return pd.DataFrame({'utc_date': dates, 'home_team_name': [home for home, _ in fixtures],
+                         'away_team_name': [away for _, away in fixtures],
+                         'home_team_score': rng.poisson(1.5, len(fixtures)).astype(float),
+                         'away_team_score': rng.poisson(1.1, len(fixtures)).astype(float), 'league_code': league_code})
+
+@pytest.fixture
+def league_cache(tmp_path, monkeypatch, fresh_registry):
+    monkeypatch.setattr(settings, 'STRENGTH_STORE_FILE', str(tmp_path / 'team_strengths.pkl'))
+    monkeypatch.setattr(settings, 'DC_FIT_FILE', str(tmp_path / 'dixon_coles_fit.pkl'))
+    monkeypatch.setattr(settings, 'PARTITION_BY_LEAGUE', True)
+    # Los procesos del pool no ven los settings del test
+    monkeypatch.setattr(settings, 'LEAGUE_FIT_PARALLEL_MODELS', [])
+    return tmp_path
+
+def test_ratios_come_from_each_league_store(league_cache):
+    matches_df = pd.concat([_league('E0', 0), _league('SP1', 1)], ignore_index=True)
+    league_stats = get_current_league_strengths(matches_df, 'ratios')
+    assert sorted(os.listdir(league_cache)) == ['team_strengths_E0.pkl', 'team_strengths_SP1.pkl']
+    for league_code, league_df in matches_df.groupby('league_code'):
+        expected = calculate_team_strengths(league_df.copy())
+        assert league_stats[league_code]['league_avg_home_goals'] == pytest.approx(expected['league_avg_home_goals'])
+        pd.testing.assert_frame_equal(pd.DataFrame(league_stats[league_code]['team_strengths']).sort_index(axis=1),
+                                      pd.DataFrame(expected['team_strengths']).sort_index(axis=1), check_like=True)
+
+def test_new_results_reach_the_store_the_model_reads(league_cache):
+    league_df = _league('E0', 2)
+    get_current_league_strengths(league_df, 'ratios')
+    new_results = pd.DataFrame([{'Date': '01/03/2025', 'HomeTeam': 'E0 Team 0', 'AwayTeam': 'E0 Team 1', 'FTHG': 7, 'FTAG': 0,
+                                 'B365H': None, 'B365D': None, 'B365A': None}])
+    assert add_results_to_strength_store(new_results, 'E0') == 1
+    assert not os.path.exists(settings.STRENGTH_STORE_FILE)
+    assert len(load_strength_store(str(league_cache / 'team_strengths_E0.pkl'))['match_keys']) == len(league_df) + 1
+
+def test_dixon_coles_starts_from_the_league_fit(league_cache, monkeypatch):
+    inits = []
+    fit_dixon_coles = dixon_coles.fit_dixon_coles
+    def recording_fit(matches_df, *args, init=None, **kwargs):
+        inits.append((matches_df['league_code'].iloc[0], None if init is None else init['teams']))
+        return fit_dixon_coles(matches_df, *args, init=init, **kwargs)
+    monkeypatch.setattr(dixon_coles, 'fit_dixon_coles', recording_fit)
+    leagues = {'E0': _league('E0', 3), 'SP1': _league('SP1', 4)}
+    get_current_league_strengths(pd.concat(leagues.values(), ignore_index=True), 'dixon_coles')
+    assert inits == [('E0', None), ('SP1', None)]
+    assert os.path.exists(league_cache / 'dixon_coles_fit_E0.pkl') and os.path.exists(league_cache / 'dixon_coles_fit_SP1.pkl')
+
+    # Un partido nuevo en E0: E0 se reajusta desde su último ajuste y SP1 reutiliza el suyo sin reajustar
+    extra = leagues['E0'].iloc[[0]].assign(utc_date=pd.Timestamp('2025-06-01'))
+    leagues['E0'] = pd.concat([leagues['E0'], extra], ignore_index=True)
+    get_current_league_strengths(pd.concat(leagues.values(), ignore_index=True), 'dixon_coles')
+    assert inits[2:] == [('E0', sorted(set(leagues['E0']['home_team_name'])))]
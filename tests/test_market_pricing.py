@@ -0,0 +1,114 @@
+# tests/test_market_pricing.py
+
+import numpy as np
+import pytest
+from scipy.stats import poisson, skellam
+from src.prediction_model import calculate_score_matrix, calculate_match_markets, outcome_probs_from_matrix
+from src.odds_table import build_odds_table
+from src.market_pricing import price_offered_markets
+
+HANDICAPS = [-2.0, -1.75, -1.5, -1.25, -1.0, -0.75, -0.5, -0.25, 0.0, 0.25, 0.5, 0.75, 1.0, 1.25]
+TOTALS = [0.5, 0.75, 1.75, 2.0, 2.25, 2.5, 2.75, 3.0, 3.25]
+
+def _settle(margin: int, line: float) -> tuple:
+    """
+    Liquidación de referencia, marcador a marcador: la apuesta gana si margin > line. Las líneas de cuarto
+    son dos medias apuestas a las líneas vecinas. Devuelve (parte cobrada, parte devuelta).
+    """
+    halves = [line - 0.25, line + 0.25] if round(line * 4) % 2 == 1 else [line]
+    won = sum(margin > half for half in halves) / len(halves)
+    pushed = sum(margin == half for half in halves) / len(halves)
+    return won, pushed
+
+def _reference_prices(matrix: np.ndarray) -> dict:
+    prices = {}
+    for home_goals, away_goals in np.ndindex(matrix.shape):
+        prob = matrix[home_goals, away_goals]
+        difference, total = home_goals - away_goals, home_goals + away_goals
+        for handicap in HANDICAPS:
+            # Local con hándicap h: gana si diferencia > -h; visitante con -h: gana si -diferencia > -(-h)
+            for key, margin, line in [(('spreads', handicap, 'home'), difference, -handicap), (('spreads', -handicap, 'away'), -difference, handicap)]:
+                won, pushed = _settle(margin, line)
+                prices.setdefault(key, np.zeros(2))[:] += prob * np.array([won, pushed])
+        for line in TOTALS:
+            for key, margin, settle_line in [(('totals', line, 'over'), total, line), (('totals', line, 'under'), -total, -line)]:
+                won, pushed = _settle(margin, settle_line)
+                prices.setdefault(key, np.zeros(2))[:] += prob * np.array([won, pushed])
+    return prices
+
+def _odds_match() -> dict:
+    spreads = [{'name': 'Local', 'price': 1.9, 'point': h} for h in HANDICAPS] + [{'name': 'Visitante', 'price': 1.9, 'point': -h} for h in HANDICAPS]
+    totals = [{'name': side, 'price': 1.9, 'point': line} for line in TOTALS for side in ['Over', 'Under']]
+    double_chance = [{'name': name, 'price': 1.3} for name in ['Local/Draw', 'Local/Visitante', 'Draw/Visitante']]
+    return {'id': 'm1', 'home_team': 'Local', 'away_team': 'Visitante', 'commence_time': '2025-09-01T18:00:00Z',
+            'bookmakers': [{'key': 'casa', 'last_update': '2025-09-01T10:00:00Z', 'markets': [
+                {'key': 'alternate_spreads', 'outcomes': spreads}, {'key': 'alternate_totals', 'outcomes': totals},
+                {'key': 'double_chance', 'outcomes': double_chance}]}]}
+
+def _price(priced, market: str, selection: str, point: float = None) -> tuple:
+    rows = priced[(priced['market'] == market) & (priced['selection'] == selection) & ((priced['point'] == point) if point is not None else priced['point'].isna())]
+    assert len(rows) == 1
+    return float(rows['model_prob'].iloc[0]), float(rows['refund_prob'].iloc[0])
+
+@pytest.mark.parametrize('home, away, rho', [(1.6, 1.1, 0.0), (0.7, 2.4, -0.08)])
+def test_line_settlement_matches_score_by_score_reference(home, away, rho):
+    # Matriz normalizada: el lado de "menos" y el visitante se calculan como el resto de la probabilidad
+    matrix = calculate_score_matrix(home, away, max_goals=10, rho=rho)
+    matrix /= matrix.sum()
+    priced = price_offered_markets(build_odds_table([_odds_match()]), {'m1': matrix})
+    for (market, point, selection), (won, pushed) in _reference_prices(matrix).items():
+        model_prob, refund_prob = _price(priced, market, selection, point)
+        assert model_prob == pytest.approx(won, abs=1e-12), (market, point, selection)
+        assert refund_prob == pytest.approx(pushed, abs=1e-12), (market, point, selection)
+
+def test_quarter_line_examples():
+    # Local -0.75: ganar por uno es medio cobro y media devolución; por dos o más, cobro completo
+    assert _settle(1, 0.75) == (0.5, 0.5)
+    assert _settle(2, 0.75) == (1.0, 0.0)
+    assert _settle(0, 0.75) == (0.0, 0.0)
+    # Más de 2.25 con dos goles: media apuesta perdida y media devuelta
+    assert _settle(2, 2.25) == (0.0, 0.5)
+    matrix = np.zeros((4, 4))
+    matrix[1, 0] = 1.0 # El local gana 1-0 seguro
+    priced = price_offered_markets(build_odds_table([_odds_match()]), {'m1': matrix})
+    assert _price(priced, 'spreads', 'home', -0.75) == (0.5, 0.5)
+    assert _price(priced, 'spreads', 'away', 0.75) == (0.0, 0.5)
+    assert _price(priced, 'spreads', 'home', -1.25) == (0.0, 0.5)
+    assert _price(priced, 'spreads', 'away', 1.25) == (0.5, 0.5)
+    assert _price(priced, 'spreads', 'home', 0.25) == (1.0, 0.0)
+    assert _price(priced, 'totals', 'over', 0.5) == (1.0, 0.0)
+    assert _price(priced, 'totals', 'under', 0.5) == (0.0, 0.0)
+    assert _price(priced, 'totals', 'over', 1.75) == (0.0, 0.0)
+    assert _price(priced, 'totals', 'under', 1.75) == (1.0, 0.0)
+    assert _price(priced, 'totals', 'over', 0.75) == (0.5, 0.5)
+
+def test_double_chance_uses_the_1x2():
+    matrix = calculate_score_matrix(1.6, 1.1)
+    priced = price_offered_markets(build_odds_table([_odds_match()]), {'m1': matrix})
+    outcome = outcome_probs_from_matrix(matrix[:6, :6])
+    assert _price(priced, 'double_chance', '1X')[0] == pytest.approx(outcome['home_win'] + outcome['draw'], rel=1e-12)
+    assert _price(priced, 'double_chance', '12')[0] == pytest.approx(outcome['home_win'] + outcome['away_win'], rel=1e-12)
+    assert _price(priced, 'double_chance', 'X2')[0] == pytest.approx(outcome['draw'] + outcome['away_win'], rel=1e-12)
+
+def test_high_scoring_fixture_keeps_the_tail_out_of_under_and_away():
+    # Con medias altas la matriz truncada pierde masa: no puede acabar en el "menos" ni en el visitante
+    home, away = 4.0, 3.0
+    matrix = calculate_match_markets(home, away)['score_matrix']
+    lines = [2.5, 3.0, 4.75, 6.5, 8.0, 9.5, 11.25]
+    match = {'id': 'm1', 'home_team': 'Local', 'away_team': 'Visitante', 'commence_time': '2025-09-01T18:00:00Z',
+             'bookmakers': [{'key': 'casa', 'last_update': '2025-09-01T10:00:00Z', 'markets': [
+                 {'key': 'alternate_totals', 'outcomes': [{'name': side, 'price': 1.9, 'point': line} for line in lines for side in ['Over', 'Under']]},
+                 {'key': 'alternate_spreads', 'outcomes': [{'name': 'Visitante', 'price': 1.9, 'point': h} for h in [1.5, 2.5, 4.5]]}]}]}
+    priced = price_offered_markets(build_odds_table([match]), {'m1': matrix})
+    for line in lines:
+        over, push = _price(priced, 'totals', 'over', line)
+        under, under_push = _price(priced, 'totals', 'under', line)
+        assert under_push == push
+        assert over + under + push == pytest.approx(1.0, abs=1e-12), line
+    # Con rho = 0 el total es Poisson(home + away) y la diferencia es Skellam(home, away)
+    for line in [6.5, 8.0, 9.5]:
+        under, push = _price(priced, 'totals', 'under', line)
+        assert under == pytest.approx(poisson.cdf(np.ceil(line) - 1, home + away), abs=1e-3), line
+    for handicap in [1.5, 2.5, 4.5]:
+        away_prob, _ = _price(priced, 'spreads', 'away', handicap)
+        assert away_prob == pytest.approx(skellam.cdf(np.floor(handicap), home, away), abs=1e-3), handicap
@@ -0,0 +1,48 @@
+# tests/test_prediction_journal.py
+
+import pandas as pd
+import pytest
+from src.prediction_journal import JOURNAL_COLUMNS, prediction_entry, reconcile_predictions
+
+def _pending(*matches) -> pd.DataFrame:
+    """Predicciones pendientes: (hora de inicio, local, visitante, favorito)."""
+    probs = {'1': {'home_win': 0.5, 'draw': 0.3, 'away_win': 0.2}, 'X': {'home_win': 0.3, 'draw': 0.4, 'away_win': 0.3},
+             '2': {'home_win': 0.2, 'draw': 0.3, 'away_win': 0.5}}
+    entries = [prediction_entry({'commence_time': start, 'home_team': home, 'away_team': away}, probs[favourite])
+               for start, home, away, favourite in matches]
+    return pd.DataFrame(entries, columns=JOURNAL_COLUMNS)
+
+def _score(start: str, home: str, away: str, home_goals: int, away_goals: int, completed: bool = True) -> dict:
+    return {'commence_time': start, 'home_team': home, 'away_team': away, 'completed': completed,
+            'scores': [{'name': home, 'score': str(home_goals)}, {'name': away, 'score': str(away_goals)}]}
+
+@pytest.mark.parametrize('tolerance, expected', [(0, ['same-day']), (1, ['same-day', 'moved-one-day']), (2, ['same-day', 'moved-one-day', 'moved-two-days'])])
+def test_date_tolerance(tolerance, expected):
+    pending = _pending(('2025-09-13T14:00:00Z', 'Arsenal', 'Chelsea', '1'),
+                       ('2025-09-13T16:30:00Z', 'Everton', 'Fulham', 'X'),
+                       ('2025-09-13T19:00:00Z', 'Brentford', 'Burnley', '2'))
+    pending['id'] = ['same-day', 'moved-one-day', 'moved-two-days']
+    scores = [_score('2025-09-13T18:00:00Z', 'Arsenal', 'Chelsea', 2, 0),
+              _score('2025-09-14T13:00:00Z', 'Everton', 'Fulham', 1, 1),
+              _score('2025-09-15T19:00:00Z', 'Brentford', 'Burnley', 0, 1)]
+    reviewed = reconcile_predictions(pending, scores, date_tolerance_days=tolerance)
+    assert reviewed['id'].tolist() == expected
+    assert reviewed['is_correct'].all()
+
+def test_closest_date_wins_and_names_are_normalized():
+    pending = _pending(('2025-09-13T14:00:00Z', 'West Ham United', 'Chelsea', '1'))
+    # Dos resultados del mismo cruce: gana el de la fecha más cercana, aunque la API lo devuelva después
+    scores = [_score('2025-09-12T20:00:00Z', 'West Ham', 'Chelsea', 0, 3),
+              _score('2025-09-13T20:00:00Z', 'West Ham', 'Chelsea', 1, 0),
+              _score('2025-09-13T20:00:00Z', 'Chelsea', 'West Ham', 5, 0)]
+    reviewed = reconcile_predictions(pending, scores, date_tolerance_days=1)
+    assert reviewed[['actual_outcome', 'is_correct']].values.tolist() == [['1', True]]
+
+def test_equal_gap_uses_api_order_and_unfinished_matches_are_ignored():
+    pending = _pending(('2025-09-13T14:00:00Z', 'Arsenal', 'Chelsea', '2'), ('2025-09-13T14:00:00Z', 'Everton', 'Fulham', '1'))
+    scores = [_score('2025-09-14T12:00:00Z', 'Arsenal', 'Chelsea', 0, 1),
+              _score('2025-09-12T12:00:00Z', 'Arsenal', 'Chelsea', 1, 0),
+              _score('2025-09-13T14:00:00Z', 'Everton', 'Fulham', 1, 0, completed=False)]
+    reviewed = reconcile_predictions(pending, scores, date_tolerance_days=1)
+    assert reviewed[['home_team', 'actual_outcome', 'is_correct']].values.tolist() == [['Arsenal', '2', True]]
+    assert reconcile_predictions(pending, [], date_tolerance_days=1).empty
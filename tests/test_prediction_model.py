@@ -0,0 +1,56 @@
+# tests/test_prediction_model.py
+
+import numpy as np
+import pytest
+from scipy.stats import poisson
+from src.prediction_model import (calculate_match_markets, calculate_markets_batch, predict_outcome, calculate_score_matrix,
+                                  calculate_score_matrices, correct_score_probs_from_matrix)
+
+def _loop_outcome(avg_home_goals: float, avg_away_goals: float, max_goals: int) -> dict:
+    """El cálculo original de `predict_outcome`: doble bucle con scipy."""
+    probs = {'home_win': 0.0, 'draw': 0.0, 'away_win': 0.0}
+    for home_goals in range(max_goals + 1):
+        for away_goals in range(max_goals + 1):
+            prob = poisson.pmf(home_goals, avg_home_goals) * poisson.pmf(away_goals, avg_away_goals)
+            key = 'home_win' if home_goals > away_goals else 'draw' if home_goals == away_goals else 'away_win'
+            probs[key] += prob
+    return probs
+
+@pytest.mark.parametrize('home, away', [(1.4, 1.1), (2.9, 0.4), (0.3, 3.5)])
+def test_markets_1x2_matches_predict_outcome(home, away):
+    # El 1X2 de los informes se lee hasta 5 goles, como antes, aunque la matriz llegue a 6
+    expected = _loop_outcome(home, away, max_goals=5)
+    assert calculate_match_markets(home, away)['1x2'] == pytest.approx(expected, rel=1e-12)
+    assert predict_outcome(home, away) == pytest.approx(expected, rel=1e-12)
+    np.testing.assert_allclose(calculate_markets_batch([home], [away])['1x2'][0], list(expected.values()), rtol=1e-12)
+
+@pytest.mark.parametrize('home, away, rho', [(1.4, 1.1, 0.0), (2.9, 0.4, -0.1), (0.3, 3.5, 0.05), (0.0, 1.2, 0.0)])
+def test_score_matrix_matches_scipy(home, away, rho):
+    goals = np.arange(7)
+    expected = np.outer(poisson.pmf(goals, home), poisson.pmf(goals, away))
+    expected[0, 0] *= 1 - home * away * rho
+    expected[0, 1] *= 1 + home * rho
+    expected[1, 0] *= 1 + away * rho
+    expected[1, 1] *= 1 - rho
+    np.testing.assert_allclose(calculate_score_matrix(home, away, rho=rho), expected, rtol=1e-12, atol=1e-300)
+    np.testing.assert_allclose(calculate_score_matrices([home], [away], rho=rho)[0], expected, rtol=1e-12, atol=1e-300)
+
+def test_markets_are_consistent_with_the_matrix():
+    rng = np.random.default_rng(0)
+    home, away = rng.uniform(0.2, 3.5, 50), rng.uniform(0.2, 3.5, 50)
+    batch = calculate_markets_batch(home, away, max_goals=20, totals_lines=(1.5, 2.5, 3.5), outcome_max_goals=20)
+    for i in range(len(home)):
+        markets = calculate_match_markets(home[i], away[i], max_goals=20, totals_lines=(1.5, 2.5, 3.5), outcome_max_goals=20)
+        matrix = markets['score_matrix']
+        # Con 20 goles la matriz recoge casi toda la probabilidad
+        assert matrix.sum() == pytest.approx(1.0, abs=1e-8)
+        assert sum(markets['1x2'].values()) == pytest.approx(matrix.sum(), rel=1e-12)
+        np.testing.assert_allclose(batch['1x2'][i], list(markets['1x2'].values()), rtol=1e-12)
+        # Más/menos: las probabilidades de "más" bajan al subir la línea
+        overs = [markets['totals'][f'over_{line}'] for line in (1.5, 2.5, 3.5)]
+        assert overs[0] >= overs[1] >= overs[2]
+        assert markets['totals']['over_2.5'] == pytest.approx(1 - poisson.cdf(2, home[i] + away[i]), abs=1e-8)
+        np.testing.assert_allclose(batch['totals'][2.5][i], [markets['totals']['over_2.5'], markets['totals']['under_2.5']], rtol=1e-12)
+        assert markets['btts']['btts_yes'] == pytest.approx((1 - np.exp(-home[i])) * (1 - np.exp(-away[i])), abs=1e-8)
+        scores = correct_score_probs_from_matrix(matrix, top_n=3)
+        assert list(scores.values()) == sorted(scores.values(), reverse=True)
@@ -0,0 +1,70 @@
+# tests/test_season_simulator.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.season_simulator import remaining_fixtures, simulate_season
+
+# Resultados elegidos para que cada criterio de desempate decida al menos un puesto:
+# T supera a A por puntos con peor diferencia de goles, A a B por diferencia de goles con menos goles
+# a favor, C a D por goles a favor y D, G y H empatan en todo (sorteo)
+RESULTS = [('A', 'E', 2, 0), ('B', 'F', 4, 3), ('C', 'E', 3, 3), ('D', 'F', 1, 1),
+           ('G', 'H', 1, 1), ('T', 'U', 1, 0), ('U', 'T', 0, 1)]
+
+def _played(results) -> pd.DataFrame:
+    return pd.DataFrame(results, columns=['home_team_name', 'away_team_name', 'home_team_score', 'away_team_score'])
+
+def _stats(teams) -> dict:
+    return {'league_avg_home_goals': 1.5, 'league_avg_away_goals': 1.2,
+            'team_strengths': {team: {'attack_strength_home': 1.0, 'defense_strength_home': 1.0,
+                                      'attack_strength_away': 1.0, 'defense_strength_away': 1.0} for team in teams}}
+
+def _reference_groups(results) -> list:
+    """Clasificación partido a partido, agrupada por equipos empatados en (puntos, diferencia, goles a favor)."""
+    table = {}
+    for home, away, home_goals, away_goals in results:
+        for team, goals_for, goals_against in ((home, home_goals, away_goals), (away, away_goals, home_goals)):
+            points, goal_diff, total_for = table.get(team, (0, 0, 0))
+            points += 3 if goals_for > goals_against else 1 if goals_for == goals_against else 0
+            table[team] = (points, goal_diff + goals_for - goals_against, total_for + goals_for)
+    keys = sorted(set(table.values()), reverse=True)
+    return [sorted(team for team, key in table.items() if key == group_key) for group_key in keys]
+
+def test_reference_covers_every_tiebreak():
+    assert _reference_groups(RESULTS) == [['T'], ['A'], ['B'], ['C'], ['D', 'G', 'H'], ['F'], ['E'], ['U']]
+
+def test_finished_season_follows_the_tiebreak_key(fresh_registry):
+    played = _played(RESULTS)
+    teams = sorted(set(played['home_team_name']) | set(played['away_team_name']))
+    # Con el calendario igual a los partidos jugados no queda nada por simular: solo cuenta el desempate
+    result = simulate_season(played, _stats(teams), fixtures_df=played[['home_team_name', 'away_team_name']],
+                             num_simulations=6000, seed=7)
+    assert result['num_remaining'] == 0
+    positions = result['positions']
+    first = 1
+    for group in _reference_groups(RESULTS):
+        places = list(range(first, first + len(group)))
+        block = positions.loc[group, places].to_numpy()
+        # Todo el peso del grupo cae en sus puestos y el sorteo los reparte por igual
+        assert np.allclose(positions.loc[group].sum(axis=1), block.sum(axis=1))
+        np.testing.assert_allclose(block, 1.0 / len(group), atol=0.03)
+        first += len(group)
+
+def test_simulated_season_properties(fresh_registry):
+    played = _played(RESULTS)
+    teams = sorted(set(played['home_team_name']) | set(played['away_team_name']))
+    stats = _stats(teams)
+    stats['team_strengths']['T'].update(attack_strength_home=1.6, attack_strength_away=1.6)
+    result = simulate_season(played, stats, num_simulations=3000, seed=11, relegation_places=2)
+    assert result['num_remaining'] == len(remaining_fixtures(played))
+    positions, table = result['positions'], result['table']
+    # Cada equipo acaba en algún puesto y cada puesto lo ocupa un solo equipo
+    np.testing.assert_allclose(positions.sum(axis=1), 1.0)
+    np.testing.assert_allclose(positions.sum(axis=0), 1.0)
+    assert (table['expected_points'] >= table['points']).all()
+    assert table['title'].sum() == pytest.approx(1.0)
+    assert table['relegation'].sum() == pytest.approx(2.0)
+    assert table.index[0] == 'T'
+    # Misma semilla, mismo resultado
+    again = simulate_season(played, stats, num_simulations=3000, seed=11, relegation_places=2)
+    pd.testing.assert_frame_equal(again['positions'], positions)
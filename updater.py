@@ -1,37 +1,35 @@
 # updater.py
-import requests
 import pandas as pd
 from config import settings
+from src.strength_store import add_results_to_strength_store
+from src.data_fetcher import fetch_scores_for_leagues
+from src.database_manager import open_match_db, import_csv_files, upsert_results
 from datetime import datetime
 
-def get_recent_scores_from_api(api_key: str, league: str, days_ago: int = 3):
-    """Obtiene los resultados de partidos recientes desde The Odds API."""
-    uri = f"https://api.the-odds-api.com/v4/sports/{league}/scores"
-    params = {'apiKey': api_key, 'daysFrom': days_ago}
-    try:
-        response = requests.get(uri, params=params)
-        response.raise_for_status()
-        print(f"Peticiones restantes a The Odds API: {response.headers.get('x-requests-remaining')}")
-        return response.json()
-    except Exception as e:
-        print(f"Error obteniendo resultados: {e}")
-        return []
-
 def main():
     """
-    Actualiza los archivos CSV con los últimos resultados de los partidos.
+    Añade a la base de datos de partidos los últimos resultados.
     """
     print("--- 🧠 Iniciando Sistema de Aprendizaje (Actualizador de Datos) ---")
 
-    # Mapeo de claves de API a nombres de archivo y columnas
+    # Mapeo de claves de API a códigos de liga
     league_map = {
-        'soccer_spain_la_liga': {'file': 'data/SP1_2025_2026.csv', 'name': 'La Liga'},
-        'soccer_epl': {'file': 'data/E0_2025_2026.csv', 'name': 'Premier League'}
+        'soccer_spain_la_liga': {'league_code': 'SP1', 'name': 'La Liga'},
+        'soccer_epl': {'league_code': 'E0', 'name': 'Premier League'}
     }
 
+    conn = open_match_db()
+    if conn is None:
+        print("❌ No se pudo abrir la base de datos de partidos.")
+        return
+    # Nos aseguramos de que los CSV ya estén importados antes de añadir resultados
+    import_csv_files(conn, settings.HISTORICAL_DATA_FILES + settings.CURRENT_SEASON_FILES)
+
+    # Pedimos los resultados de todas las ligas a la vez
+    scores_by_league = fetch_scores_for_leagues(settings.ODDS_API_KEY, league_map.keys())
     for league_key, info in league_map.items():
         print(f"\n🔄 Buscando nuevos resultados para {info['name']}...")
-        scores = get_recent_scores_from_api(settings.ODDS_API_KEY, league_key)
+        scores = scores_by_league[league_key]
 
         new_results = []
         for game in scores:
@@ -52,21 +50,14 @@ def main():
             print("No se encontraron nuevos resultados finalizados.")
             continue
 
-        try:
-            # Intentamos leer el archivo existente, si no, creamos uno nuevo
-            try:
-                df = pd.read_csv(info['file'])
-            except FileNotFoundError:
-                df = pd.DataFrame()
-
-            new_df = pd.DataFrame(new_results)
-            # Usamos los IDs de los juegos para evitar duplicados
-            updated_df = pd.concat([df, new_df]).drop_duplicates(subset=['Date', 'HomeTeam', 'AwayTeam'])
-            updated_df.to_csv(info['file'], index=False)
-            print(f"✅ ¡Hecho! Se han añadido {len(updated_df) - len(df)} nuevos partidos a {info['file']}.")
+        new_df = pd.DataFrame(new_results)
+        # Upsert en bloque: la clave única (liga, fecha, local, visitante) evita duplicados
+        num_added = upsert_results(conn, new_df, info['league_code'])
+        # Las fuerzas de los equipos se actualizan solo con los partidos nuevos
+        add_results_to_strength_store(new_df, info['league_code'])
+        print(f"✅ ¡Hecho! Se han añadido {num_added} nuevos partidos a la base de datos ({info['league_code']}).")
 
-        except Exception as e:
-            print(f"❌ Error al guardar los datos en el archivo CSV: {e}")
+    conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file